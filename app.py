@@ -36,7 +36,10 @@ langchain_processor = LangchainProcessor()
 
 def refresh_resources():
     """Helper function to refresh the resources list"""
-    return db_manager.get_all_resource_paths()
+    try:
+        return db_manager.get_all_resource_paths()
+    finally:
+        db_manager.close()
 
 # Initialize session state
 if 'available_sources' not in st.session_state:
@@ -48,6 +51,7 @@ subsections = db_manager.get_subsections()
 categories = db_manager.get_categories()
 learning_types = db_manager.get_learning_types()
 permissions = db_manager.get_permissions()
+db_manager.close()  # Release this run's connection back to the pool
 
 # Main title with emoji
 st.title("📚 Document Management System")
@@ -65,8 +69,8 @@ with tab1:
     with col1:
         uploaded_file = st.file_uploader(
             "Upload a Document",
-            type=["pdf", "docx", "txt", "pptx", "mp4", "jpg", "jpeg", "png"],
-            help="Supported formats: PDF, Word, Text, PowerPoint, Video, and Images"
+            type=["pdf", "docx", "txt", "pptx", "mp4", "mp3", "wav", "m4a", "jpg", "jpeg", "png"],
+            help="Supported formats: PDF, Word, Text, PowerPoint, Video, Audio, and Images"
         )
     
     with col2:
@@ -177,6 +181,11 @@ with tab2:
         selected_category_filter = st.selectbox("Category Filter", ["Any"] + list(categories.keys()))
         selected_subsection_filter = st.selectbox("Subsection Filter", ["Any"] + list(subsections.keys()))
         selected_learning_type_filter = st.selectbox("Learning Type Filter", ["Any"] + list(learning_types.keys()))
+        selected_search_mode = st.selectbox("Search Mode", ["vector", "hybrid"], help="Hybrid adds full-text matching of exact terms and acronyms")
+        selected_chunk_type_filter = st.selectbox("Chunk Type", ["Any", "summary", "body"], help="Search summary chunks, original text chunks, or both")
+        # MMR compares chunk vectors, which hybrid's full-text matches don't have
+        diversity_options = ["Off", "MMR", "One per resource"] if selected_search_mode == "vector" else ["Off", "One per resource"]
+        selected_diversity = st.selectbox("Diversify Results", diversity_options, help="Avoid near-identical chunks from the same resource (MMR: vector mode only)")
 
     # Main search area
     st.subheader("🔎 Search Documents")
@@ -196,6 +205,8 @@ with tab2:
         langchain_filters["sub_section_id"] = {"$eq": subsections[selected_subsection_filter]}
     if selected_learning_type_filter != "Any":
         langchain_filters["learning_type_id"] = {"$eq": learning_types[selected_learning_type_filter]}
+    if selected_chunk_type_filter != "Any":
+        langchain_filters["summary"] = {"$eq": selected_chunk_type_filter == "summary"}
 
     # Search button
     if st.button("🔍 Search", use_container_width=True):
@@ -213,6 +224,11 @@ with tab2:
                     category_id=categories[selected_category_filter] if selected_category_filter != "Any" else None,
                     sub_section_id=subsections[selected_subsection_filter] if selected_subsection_filter != "Any" else None,
                     learning_type_id=learning_types[selected_learning_type_filter] if selected_learning_type_filter != "Any" else None,
+                    chunk_type=selected_chunk_type_filter if selected_chunk_type_filter != "Any" else None,
+                    mode=selected_search_mode,
+                    mmr_lambda=0.5 if selected_diversity == "MMR" and selected_search_mode == "vector" else None,
+                    max_per_resource=2 if selected_diversity == "MMR" else None,
+                    collapse=selected_diversity == "One per resource",
                 )
                 doc_retriever_time = time.time() - doc_retriever_start
 
@@ -237,7 +253,10 @@ with tab2:
                                 st.markdown(f"### Result {idx}")
                                 st.markdown(f"**Content:** {result['content']}")
                                 st.markdown(f"**Resource:** {result['resource_name']}")
-                                st.markdown(f"**Relevance Score:** {result['distance']}")
+                                if "score" in result:
+                                    st.markdown(f"**Fused Score:** {result['score']:.4f}")
+                                if result.get("similarity") is not None:
+                                    st.markdown(f"**Similarity:** {result['similarity']:.4f}")
                                 st.divider()
                     else:
                         st.info("No results found in DocumentRetriever.")
@@ -251,7 +270,7 @@ with tab2:
                                 st.markdown(f"### Result {idx}")
                                 st.markdown(f"**Content:** {doc.page_content}")
                                 st.markdown(f"**Resource:** {doc.metadata.get('resource_name', 'N/A')}")
-                                st.markdown(f"**Relevance Score:** {score}")
+                                st.markdown(f"**Similarity:** {score:.4f}")
                                 st.divider()
                     else:
                         st.info("No results found in LangchainProcessor.")
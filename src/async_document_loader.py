@@ -0,0 +1,271 @@
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+
+import httpx
+import openai
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from src.document_loader import IMAGE_EXTENSIONS, MEDIA_EXTENSIONS, UniversalDocumentProcessor
+from src.embeddings import OpenAIEmbeddingBackend
+from src.image_preprocessor import prepare_image
+from src.transcription import WhisperTranscriptionBackend, stitch_transcript
+
+load_dotenv()
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+def retry_after_seconds(error):
+    """Read the server's requested wait from a rate-limit response, if it sent one."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            return None
+    return None
+
+
+class AsyncUniversalDocumentProcessor(UniversalDocumentProcessor):
+    """asyncio-native variant of UniversalDocumentProcessor.
+
+    Chat, embedding and transcription calls go through one shared AsyncOpenAI client
+    (pooled keep-alive connections), limited to `max_concurrency` requests in flight.
+    Failed calls are retried with jittered exponential backoff; a rate-limit response
+    pauses every caller until the server's retry-after has elapsed. Blocking work
+    (file parsing, audio extraction) runs in threads so the event loop stays free.
+    """
+
+    def __init__(self, max_concurrency=8, max_retries=5, base_delay=1.0, max_delay=30.0, client=None,
+                 embedding_backend=None, embedding_batch_size=100, embedding_max_batch_tokens=250_000,
+                 transcription_backend=None, transcription_segment_seconds=600, image_detail="low"):
+        super().__init__(
+            embedding_backend=embedding_backend,
+            embedding_batch_size=embedding_batch_size,
+            embedding_max_batch_tokens=embedding_max_batch_tokens,
+            transcription_backend=transcription_backend,
+            transcription_segment_seconds=transcription_segment_seconds,
+            image_detail=image_detail,
+        )
+        self.client = client or AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,  # Retries are scheduled here, across all callers
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+            ),
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._resume_at = 0.0
+
+    async def _call(self, request):
+        """Await `request()` under the concurrency limit, retrying transient failures."""
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                # Checked after acquiring, so callers queued on the semaphore when a 429 arrived wait too
+                while (pause := self._resume_at - time.monotonic()) > 0:
+                    await asyncio.sleep(pause)
+                try:
+                    return await request()
+                except RETRYABLE_ERRORS as error:
+                    if attempt == self.max_retries:
+                        raise
+                    backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                    retry_after = retry_after_seconds(error) if isinstance(error, openai.RateLimitError) else None
+                    if retry_after is not None:
+                        # Hold back every caller, not only this one, until the limit resets
+                        self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+                    delay = max(backoff, retry_after or 0)
+            await asyncio.sleep(delay)
+
+    async def ask_gpt(self, text, image=None, mime_type="image/jpeg"):
+        response = await self._call(lambda: self.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=self.build_messages(text, image, mime_type)
+        ))
+        answer = response.choices[0].message.content
+        return answer, response.usage.prompt_tokens, response.usage.completion_tokens
+
+    async def get_embeddings(self, texts):
+        """Embed texts in token/size-bounded batches, sending the batches concurrently."""
+        backend = self.embedder.backend
+        if isinstance(backend, OpenAIEmbeddingBackend):
+            async def embed_batch(batch):
+                response = await self._call(lambda: self.client.embeddings.create(input=batch, **backend.request_options()))
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        else:
+            async def embed_batch(batch):
+                return await asyncio.to_thread(backend.embed, batch)
+
+        batches = await asyncio.gather(*(embed_batch(batch) for batch in self.embedder.iter_batches(texts)))
+        return [embedding for batch in batches for embedding in batch]
+
+    async def get_embedding(self, text):
+        return (await self.get_embeddings([text]))[0]
+
+    async def transcribe_segment(self, audio_path):
+        backend = self.transcriber.backend
+        if not isinstance(backend, WhisperTranscriptionBackend):
+            return await asyncio.to_thread(backend.transcribe, audio_path)
+
+        async def request():
+            with open(audio_path, 'rb') as audio_file:
+                return await self.client.audio.transcriptions.create(model=backend.model, file=audio_file, response_format="verbose_json")
+        return backend.parse_response(await self._call(request))
+
+    async def transcribe(self, media_path):
+        """Encode and split in a thread, then transcribe all segments concurrently."""
+        with tempfile.TemporaryDirectory() as directory:
+            duration, segments, paths = await asyncio.to_thread(self.transcriber.prepare, media_path, directory)
+            transcriptions = await asyncio.gather(*(self.transcribe_segment(path) for path in paths))
+        return dict(stitch_transcript(segments, transcriptions), duration_seconds=duration)
+
+    async def summarize_text(self, text):
+        if self.count_tokens(text) > self.summary_max_tokens:
+            return await self.summarize_long_text(text)
+        return await self.ask_gpt(self.get_text_prompt(text))
+
+    async def summarize_long_text(self, text):
+        return await self.summarize_parts(iter(self.summary_splitter.split_text(text)))
+
+    async def summarize_parts(self, parts):
+        """Map and reduce over an iterator of parts with at most `summary_concurrency` in flight.
+
+        Parts are read in a worker thread, as reading may parse the next pages of a file.
+        """
+        partials, in_flight = [], deque()
+        while (part := await asyncio.to_thread(next, parts, None)) is not None:
+            in_flight.append(asyncio.ensure_future(self.summarize_part(part)))
+            if len(in_flight) >= self.summary_concurrency:
+                partials.append(await in_flight.popleft())
+        partials.extend(await asyncio.gather(*in_flight))
+        return await self.reduce_summaries(partials)
+
+    async def reduce_summaries(self, partials):
+        summary, prompt_tokens, completion_tokens = await self.summarize_text("\n\n".join(partial[0] for partial in partials))
+        prompt_tokens += sum(partial[1] for partial in partials)
+        completion_tokens += sum(partial[2] for partial in partials)
+        return summary, prompt_tokens, completion_tokens
+
+    async def summarize_units(self, units):
+        """Like the sync version; units are parsed in a worker thread, so the loop never blocks on a file."""
+        windows = self.iter_summary_windows(units)
+        head, longer = await asyncio.to_thread(self.read_summary_head, windows)
+        if not longer:
+            return await self.summarize_text("\n\n".join(head))
+        return await self.summarize_parts(itertools.chain(head, (text for text, _ in windows)))
+
+    async def summarize_part(self, text):
+        key = self.summary_cache_key(text)
+        cached = self.summary_cache.get(key)
+        if cached is not None:
+            return cached, 0, 0
+        summary, prompt_tokens, completion_tokens = await self.ask_gpt(self.get_partial_summary_prompt(text))
+        self.summary_cache.set(key, summary)
+        return summary, prompt_tokens, completion_tokens
+
+    async def process_text(self, original_text):
+        summary, prompt_tokens, completion_tokens = await self.summarize_text(original_text)
+        return {
+            "original_text": original_text,
+            "summary": summary,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": self.calculate_model_cost(prompt_tokens, completion_tokens)
+        }
+
+    async def process_image(self, image_path):
+        image = await asyncio.to_thread(prepare_image, image_path, self.image_detail)
+        width, height = image["original_size"]
+        result = self.image_cache.get(self.image_cache_namespace(), image["digest"], image["hash"])
+        if result is not None:
+            prompt_tokens, completion_tokens = 0, 0
+        else:
+            result, prompt_tokens, completion_tokens = await self.ask_gpt(self.get_image_prompt(), image=image["data"], mime_type=image["mime_type"])
+            self.image_cache.set(self.image_cache_namespace(), image["digest"], result, image["hash"])
+        return {
+            "original_text": "Image content processed",
+            "summary": result,
+            "resolution": f"{width}x{height} pixels",
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": self.calculate_model_cost(prompt_tokens, completion_tokens)
+        }
+
+    async def process_video(self, video_path):
+        return await self.process_transcript(await self.transcribe(video_path))
+
+    async def process_transcript(self, transcript):
+        summary, prompt_tokens, completion_tokens = await self.summarize_text(transcript["text"])
+        return self.transcript_result(transcript, summary, prompt_tokens, completion_tokens)
+
+    async def process_youtube_video(self, video_url):
+        transcript_text = await asyncio.to_thread(self.get_youtube_transcript, video_url)
+        return await self.process_text(transcript_text)
+
+    async def load_document(self, doc_path, stream=False):
+        if self.is_url(doc_path):
+            if "youtube.com" in doc_path or "youtu.be" in doc_path:
+                return await self.process_youtube_video(doc_path)
+            raise ValueError("URL provided is not a supported format.")
+
+        doc_path = Path(doc_path).resolve()
+        if not doc_path.is_file():
+            raise ValueError(f"File path {doc_path} is not a valid file.")
+        doc_path = str(doc_path)
+        if doc_path.endswith(MEDIA_EXTENSIONS):
+            return await self.process_video(doc_path)
+        elif doc_path.endswith(IMAGE_EXTENSIONS):
+            return await self.process_image(doc_path)
+        return self.iter_units(doc_path) if stream else await asyncio.to_thread(self.load_text, doc_path)
+
+    async def process(self, doc_path=None):
+        if not doc_path:
+            raise ValueError("Invalid input. Provide a document path of a image, video, or YouTube URL to process.")
+        loaded = await self.load_document(doc_path, stream=True)
+        if isinstance(loaded, dict):  # Already processed video or image
+            return loaded
+        return await self.process_units(loaded)
+
+    async def process_units(self, units):
+        summary, prompt_tokens, completion_tokens = await self.summarize_units(units)
+        return {
+            "original_text": None,
+            "summary": summary,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": self.calculate_model_cost(prompt_tokens, completion_tokens)
+        }
+
+    async def close(self):
+        await self.client.close()
+
+
+if __name__ == "__main__":
+    async def main(paths):
+        processor = AsyncUniversalDocumentProcessor()
+        try:
+            results = await asyncio.gather(*(processor.process(path) for path in paths), return_exceptions=True)
+        finally:
+            await processor.close()
+        for path, result in zip(paths, results):
+            print("=" * 50)
+            print(path)
+            print(result if isinstance(result, Exception) else result["summary"][:500])
+
+    asyncio.run(main(sys.argv[1:]))
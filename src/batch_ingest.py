@@ -0,0 +1,348 @@
+"""Batch ingest of many documents as a staged, resumable pipeline.
+
+Stages: load -> summarize -> index. Parsing runs in a process pool; API and database
+calls run with bounded async concurrency. The index stage splits, embeds and stores a
+document in bounded batches, so one large document never holds all its vectors at once;
+these steps share a stage because a document's chunks are written in one transaction
+on one session, and `embed_concurrency` caps the embedding requests the index workers
+have in flight. Stages are connected by bounded queues, so a slow stage applies
+backpressure to the ones before it. Every finished or failed document is appended to a
+JSONL journal, and a rerun skips files whose path and content hash are already
+journaled as done.
+
+A text document is parsed once, into its pages/slides/sections: the summarizer reads
+them as a stream of token windows and the splitter chunks them unit by unit, so the
+document is never joined into one string. The parsed text of the documents in flight
+is capped at `queue_bytes`; a load worker waits for room before handing a document on.
+
+Resources are identified by their path relative to the source directory (or the
+manifest's "resource_path", default its "path"), so equal filenames in different
+directories stay separate. Index work is serialized per resource path and content
+hash, so concurrent workers never create the same resource twice.
+
+Usage:
+    python -m src.batch_ingest ./src/docs --section-id 1 --sub-section-id 4 --learning-type-id 5 --category-id 1
+    python -m src.batch_ingest manifest.jsonl --journal ingest_journal.jsonl --processes 4 --index-mode both
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from src.async_document_loader import AsyncUniversalDocumentProcessor
+from src.db.db_manager import DatabaseManager
+from src.document_loader import IMAGE_EXTENSIONS, MEDIA_EXTENSIONS, TEXT_EXTENSIONS, UniversalDocumentProcessor
+from src.document_processor import (
+    INDEX_MODES,
+    STORE_TARGETS,
+    get_index_mode,
+    hash_document,
+    index_document,
+)
+from src.embeddings import get_embedding_backend
+
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS + IMAGE_EXTENSIONS + MEDIA_EXTENSIONS
+CATEGORIZATION_FIELDS = ("section_id", "sub_section_id", "learning_type_id", "category_id", "permissions_allowed")
+
+_STOP = object()
+
+
+class ByteBudget:
+    """Caps the bytes held by items in flight; an item larger than the cap still passes on its own."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, size):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+    async def release(self, size):
+        async with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
+_process_document_processor = None
+
+
+def load_units_in_process(doc_path):
+    """Parse one text document into its pages/slides/sections inside a pool process, reusing a per-process loader."""
+    global _process_document_processor
+    if _process_document_processor is None:
+        _process_document_processor = UniversalDocumentProcessor()
+    return list(_process_document_processor.iter_units(str(Path(doc_path).resolve())))
+
+
+def iter_sources(source, defaults):
+    """Yield ingest items from a directory walk or a JSONL manifest of {"path": ..., <field overrides>}."""
+    source_path = Path(source)
+    if source_path.is_dir():
+        for path in sorted(source_path.rglob("*")):
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                yield dict(defaults, path=str(path), resource_path=path.relative_to(source_path).as_posix())
+    else:
+        with open(source_path, encoding="utf-8") as manifest:
+            for line in manifest:
+                if line.strip():
+                    item = dict(defaults, **json.loads(line))
+                    item.setdefault("resource_path", Path(item["path"]).as_posix())
+                    yield item
+
+
+class IngestJournal:
+    """Append-only JSONL progress log used to resume an interrupted batch."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as journal:
+                for line in journal:
+                    entry = json.loads(line)
+                    if entry["status"] == "done":
+                        self.done.add((entry["path"], entry["content_hash"]))
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, path, content_hash):
+        return (path, content_hash) in self.done
+
+    def record(self, path, content_hash, status, **info):
+        entry = dict(info, path=path, content_hash=content_hash, status=status, at=time.time())
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        if status == "done":
+            self.done.add((path, content_hash))
+
+    def close(self):
+        self._file.close()
+
+
+class BatchIngestPipeline:
+    """Runs ingest items through the staged pipeline with per-stage concurrency limits."""
+
+    def __init__(self, journal, store="both", processes=None, summarize_concurrency=8, embed_concurrency=4,
+                 db_concurrency=4, queue_size=16, embedding_backend=None, index_mode=None, queue_bytes=512 * 1024 * 1024):
+        if store not in STORE_TARGETS:
+            raise ValueError(f"store must be one of {STORE_TARGETS}, got {store!r}")
+        self.journal = journal
+        self.store = store
+        self.index_mode = get_index_mode(index_mode)
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = {
+            "load": self.processes,
+            "summarize": summarize_concurrency,
+            "index": db_concurrency,
+        }
+        self.queue_size = queue_size
+        self.text_budget = ByteBudget(queue_bytes)
+        self.doc_processor = AsyncUniversalDocumentProcessor(
+            max_concurrency=summarize_concurrency + embed_concurrency,
+            embedding_backend=embedding_backend or get_embedding_backend(),
+        )
+        self.embed_slots = asyncio.Semaphore(embed_concurrency)
+        self._locks = {}
+        self.db_manager = DatabaseManager()
+        self.stats = {"done": 0, "skipped": 0, "failed": 0}
+        self.stage_seconds = {stage: 0.0 for stage in self.concurrency}
+
+    async def run_db(self, function, *args):
+        """Run blocking database work in a thread with its own session, released afterwards."""
+        def call():
+            try:
+                return function(*args)
+            finally:
+                self.db_manager.close()
+        return await asyncio.to_thread(call)
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self, *keys):
+        """Hold one lock per key, acquired in sorted order so workers sharing keys cannot deadlock."""
+        locks = [self._locks.setdefault(key, asyncio.Lock()) for key in sorted(set(keys))]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    async def release(self, item):
+        """Return an item's parsed-text bytes to the budget once it no longer holds them."""
+        size = item.pop("reserved_bytes", 0)
+        if size:
+            await self.text_budget.release(size)
+
+    async def embed(self, texts):
+        async with self.embed_slots:
+            return await self.doc_processor.get_embeddings(texts)
+
+    # Stage handlers: each takes an item dict and returns it (enriched) or None to drop it.
+
+    async def load(self, item):
+        loop = asyncio.get_running_loop()
+        item["content_hash"] = await loop.run_in_executor(self.process_pool, hash_document, item["path"])
+        if self.journal.is_done(item["path"], item["content_hash"]):
+            self.stats["skipped"] += 1
+            return None
+        if await self.run_db(self.db_manager.get_resource_by_hash, item["content_hash"]) is not None:
+            self.journal.record(item["path"], item["content_hash"], "done", duplicate=True)
+            self.stats["skipped"] += 1
+            return None
+        if item["path"].lower().endswith(TEXT_EXTENSIONS):
+            units = await loop.run_in_executor(self.process_pool, load_units_in_process, item["path"])
+            size = sum(len(unit.page_content) for unit in units)
+            await self.text_budget.acquire(size)
+            # Summarized from, and for body chunks split from, instead of parsing the file again
+            item["units"], item["reserved_bytes"] = units, size
+        else:
+            # URLs, images and videos are mostly API work; they are summarized while loading
+            item["loaded"] = await self.doc_processor.load_document(item["path"])
+        return item
+
+    async def summarize(self, item):
+        if "units" in item:
+            item["result"] = await self.doc_processor.process_units(iter(item["units"]))
+            if self.index_mode == "summary":
+                del item["units"]  # Only the summary is indexed
+                await self.release(item)
+        else:
+            item["result"] = item.pop("loaded")  # Images and videos are summarized while loading
+        if not item["result"].get("summary") and self.index_mode != "body":
+            raise ValueError("No summary generated for the document.")
+        return item
+
+    async def index(self, item):
+        loop = asyncio.get_running_loop()
+
+        def embed(texts):
+            # Called from the indexing thread; the requests run on the event loop's shared client
+            return asyncio.run_coroutine_threadsafe(self.embed(texts), loop).result()
+
+        result = item.pop("result")
+        async with self.exclusive(("path", item["resource_path"]), ("hash", item["content_hash"])):
+            # Checked again under the lock: another worker may have stored this content since the load stage
+            if await self.run_db(self.db_manager.get_resource_by_hash, item["content_hash"]) is not None:
+                self.journal.record(item["path"], item["content_hash"], "done", duplicate=True)
+                self.stats["skipped"] += 1
+                return None
+            counts = await self.run_db(
+                index_document, self.db_manager, self.doc_processor, item["path"], result, item["content_hash"],
+                *(item[field] for field in CATEGORIZATION_FIELDS), self.store, self.index_mode, embed,
+                item.pop("units", None), item["resource_path"],
+            )
+        self.journal.record(item["path"], item["content_hash"], "done", resource_id=counts["resource_id"],
+                            chunks_added=counts["chunks_added"], cost=result.get("cost"))
+        self.stats["done"] += 1
+        return None
+
+    async def _run_stage(self, name, handler, in_queue, out_queue, next_concurrency):
+        async def worker():
+            while True:
+                item = await in_queue.get()
+                if item is _STOP:
+                    return
+                start = time.perf_counter()
+                try:
+                    result = await handler(item)
+                except Exception as error:
+                    print(f"[{name}] {item['path']} failed: {error}")
+                    self.journal.record(item["path"], item.get("content_hash"), "failed", stage=name, error=str(error))
+                    self.stats["failed"] += 1
+                    result = None
+                self.stage_seconds[name] += time.perf_counter() - start
+                if result is None:
+                    await self.release(item)  # Finished, skipped or failed
+                if result is not None and out_queue is not None:
+                    await out_queue.put(result)  # Blocks while the next stage is saturated
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency[name])))
+        if out_queue is not None:
+            for _ in range(next_concurrency):
+                await out_queue.put(_STOP)
+
+    async def run(self, items):
+        stages = [
+            ("load", self.load),
+            ("summarize", self.summarize),
+            ("index", self.index),
+        ]
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in stages]
+
+        async def feed():
+            for item in items:
+                await queues[0].put(item)
+            for _ in range(self.concurrency["load"]):
+                await queues[0].put(_STOP)
+
+        self.process_pool = ProcessPoolExecutor(max_workers=self.processes)
+        try:
+            tasks = [feed()]
+            for index, (name, handler) in enumerate(stages):
+                out_queue = queues[index + 1] if index + 1 < len(stages) else None
+                next_concurrency = self.concurrency[stages[index + 1][0]] if out_queue is not None else 0
+                tasks.append(self._run_stage(name, handler, queues[index], out_queue, next_concurrency))
+            await asyncio.gather(*tasks)
+        finally:
+            self.process_pool.shutdown()
+            await self.doc_processor.close()
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory or JSONL manifest of documents.")
+    parser.add_argument("source", help="Directory to walk, or a JSONL manifest with one {\"path\": ...} per line")
+    parser.add_argument("--section-id", type=int, required=True)
+    parser.add_argument("--sub-section-id", type=int, required=True)
+    parser.add_argument("--learning-type-id", type=int, required=True)
+    parser.add_argument("--category-id", type=int, required=True)
+    parser.add_argument("--permissions-allowed", default="paid")
+    parser.add_argument("--store", choices=STORE_TARGETS, default="both")
+    parser.add_argument("--index-mode", choices=INDEX_MODES, default=None, help="summary, body or both (default: INDEX_MODE, else summary)")
+    parser.add_argument("--journal", default="ingest_journal.jsonl")
+    parser.add_argument("--processes", type=int, default=None, help="Loader processes (default: CPU count)")
+    parser.add_argument("--summarize-concurrency", type=int, default=8)
+    parser.add_argument("--embed-concurrency", type=int, default=4)
+    parser.add_argument("--db-concurrency", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--queue-mb", type=int, default=512, help="Cap on the parsed text of the documents in flight")
+    parser.add_argument("--embedding-backend", default=None, help="openai or local (default: EMBEDDING_BACKEND)")
+    args = parser.parse_args()
+
+    defaults = {field: getattr(args, field) for field in CATEGORIZATION_FIELDS}
+    journal = IngestJournal(args.journal)
+    pipeline = BatchIngestPipeline(
+        journal,
+        store=args.store,
+        processes=args.processes,
+        summarize_concurrency=args.summarize_concurrency,
+        embed_concurrency=args.embed_concurrency,
+        db_concurrency=args.db_concurrency,
+        queue_size=args.queue_size,
+        queue_bytes=args.queue_mb * 1024 * 1024,
+        embedding_backend=get_embedding_backend(args.embedding_backend),
+        index_mode=args.index_mode,
+    )
+    start = time.perf_counter()
+    try:
+        stats = asyncio.run(pipeline.run(iter_sources(args.source, defaults)))
+    finally:
+        journal.close()
+
+    print("\n" + "=" * 50)
+    print(f"Done: {stats['done']}  Skipped: {stats['skipped']}  Failed: {stats['failed']}")
+    print(f"Wall time: {time.perf_counter() - start:.1f}s")
+    for stage, seconds in pipeline.stage_seconds.items():
+        print(f"  {stage:<10} {seconds:.1f}s busy")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
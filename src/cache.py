@@ -0,0 +1,349 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.embeddings import BatchEmbedder, get_embedding_backend
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with an optional per-entry time-to-live."""
+
+    def __init__(self, max_entries=1024, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def keys(self):
+        """Snapshot of the keys, least recently used first (expired entries included)."""
+        with self._lock:
+            return list(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """On-disk key/value cache that survives restarts; values go through `encode`/`decode`."""
+
+    def __init__(self, path, ttl_seconds=None, encode=json.dumps, decode=json.loads):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.encode = encode
+        self.decode = decode
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT value, stored_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+                self._connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._connection.commit()
+                return None
+        return self.decode(value)
+
+    def set(self, key, value):
+        encoded = self.encode(value)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, encoded, time.time()),
+            )
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM cache")
+            self._connection.commit()
+
+
+class TieredCache:
+    """In-process LRU in front of an optional on-disk tier, with hit/miss counters."""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.stats["disk_hits"] += 1
+                self.memory.set(key, value)
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def hit_rate(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+
+def _encode_vector(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _decode_vector(blob):
+    return np.frombuffer(blob, dtype=np.float32).tolist()
+
+
+class QueryEmbeddingCache:
+    """Caches query embeddings keyed by embedding model and normalized query text."""
+
+    def __init__(self, backend, max_entries=1024, ttl_seconds=24 * 3600, disk_path=None):
+        self.backend = backend
+        disk = None
+        if disk_path:
+            disk = SQLiteCache(disk_path, ttl_seconds=ttl_seconds, encode=_encode_vector, decode=_decode_vector)
+        self.cache = TieredCache(LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds), disk)
+
+    @staticmethod
+    def normalize(query):
+        return " ".join(query.lower().split())
+
+    def key(self, query):
+        return f"{self.backend.name}:{self.normalize(query)}"
+
+    def get_embedding(self, query):
+        return self.cache.get_or_compute(self.key(query), lambda: self.backend.embed([query])[0])
+
+    def get_embeddings(self, queries):
+        """Embeddings for many queries, in order; all cache misses are embedded in batched requests."""
+        keys = [self.key(query) for query in queries]
+        found = {key: self.cache.get(key) for key in dict.fromkeys(keys)}
+        missing = {key: query for key, query in zip(keys, queries) if found[key] is None}
+        if missing:
+            for key, embedding in zip(missing, BatchEmbedder(self.backend).embed(list(missing.values()))):
+                self.cache.set(key, embedding)
+                found[key] = embedding
+        return [found[key] for key in keys]
+
+    @property
+    def stats(self):
+        return dict(self.cache.stats, hit_rate=self.cache.hit_rate(), entries=len(self.cache.memory))
+
+
+class ImageAnalysisCache:
+    """Caches image analyses by content digest, optionally serving near-duplicates by perceptual hash.
+
+    A lookup tries the exact digest (sha256 of the image bytes; memory, then disk). With
+    `max_distance` > 0 it then scans the in-memory entries for a perceptual hash within
+    that many differing bits, so a re-saved or resized photo reuses the earlier answer;
+    off by default, because scans of different text pages (slides, forms) often hash
+    that close together. `namespace` separates analyses made with different models,
+    prompts or detail levels.
+    """
+
+    def __init__(self, max_entries=1024, max_distance=0, disk_path=None):
+        self.max_distance = max_distance
+        self.near_hits = 0  # Exact-digest misses answered by a near-duplicate
+        self.cache = TieredCache(LRUCache(max_entries=max_entries), SQLiteCache(disk_path) if disk_path else None)
+
+    @staticmethod
+    def key(namespace, digest):
+        return f"{namespace}:{digest}"
+
+    @staticmethod
+    def near_prefix(namespace):
+        return f"{namespace}:near:"
+
+    def get(self, namespace, digest, image_hash=None):
+        value = self.cache.get(self.key(namespace, digest))
+        if value is not None or not self.max_distance or image_hash is None:
+            return value
+        prefix = self.near_prefix(namespace)
+        for key in reversed(self.cache.memory.keys()):
+            if key.startswith(prefix) and bin(int(key[len(prefix):], 16) ^ image_hash).count("1") <= self.max_distance:
+                value = self.cache.memory.get(key)
+                if value is not None:
+                    self.near_hits += 1
+                    return value
+        return None
+
+    def set(self, namespace, digest, value, image_hash=None):
+        self.cache.set(self.key(namespace, digest), value)
+        if self.max_distance and image_hash is not None:
+            # In memory only: the near-duplicate scan never reaches the disk tier
+            self.cache.memory.set(f"{self.near_prefix(namespace)}{image_hash:016x}", value)
+
+
+class SearchResultCache:
+    """Caches search results keyed by query embedding, search parameters and corpus version.
+
+    Every write to the corpus bumps `version`, which is part of the key, so results
+    computed before the write are never served again and age out of the LRU. The TTL
+    bounds staleness from writes made by other processes, which this one cannot see.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=300):
+        self.version = 0
+        self._lock = threading.Lock()
+        self.cache = TieredCache(LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds))
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+
+    @staticmethod
+    def embedding_hash(embedding):
+        return hashlib.blake2b(np.asarray(embedding, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+
+    def key(self, namespace, embedding, **params):
+        return (namespace, self.embedding_hash(embedding), json.dumps(params, sort_keys=True, default=str), self.version)
+
+    def get_or_search(self, namespace, embedding, search, **params):
+        """Return the cached result of `search()` for these parameters, running it on a miss.
+
+        Callers get their own copy, so editing results (e.g. re-ranking scores) never
+        changes what later hits are served.
+        """
+        return copy.deepcopy(self.cache.get_or_compute(self.key(namespace, embedding, **params), search))
+
+    @property
+    def stats(self):
+        return dict(self.cache.stats, hit_rate=self.cache.hit_rate(), entries=len(self.cache.memory), version=self.version)
+
+
+# Process-wide caches, configured from the environment. A cache's *_PATH variable names
+# the SQLite file of its on-disk tier; unset keeps that cache in memory only.
+_query_embedding_cache = None
+_summary_cache = None
+_image_analysis_cache = None
+_search_result_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache():
+    """Process-wide query embedding cache shared by the SQL and LangChain search paths.
+
+    Configured with QUERY_CACHE_SIZE, QUERY_CACHE_TTL (seconds) and QUERY_CACHE_PATH.
+    """
+    global _query_embedding_cache
+    with _cache_lock:
+        if _query_embedding_cache is None:
+            _query_embedding_cache = QueryEmbeddingCache(
+                backend=get_embedding_backend(),
+                max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+                ttl_seconds=float(os.getenv("QUERY_CACHE_TTL", str(24 * 3600))),
+                disk_path=os.getenv("QUERY_CACHE_PATH"),
+            )
+        return _query_embedding_cache
+
+
+def get_summary_cache():
+    """Process-wide cache of intermediate (map-stage) summaries keyed by content hash.
+
+    Configured with SUMMARY_CACHE_SIZE and SUMMARY_CACHE_PATH.
+    """
+    global _summary_cache
+    with _cache_lock:
+        if _summary_cache is None:
+            disk_path = os.getenv("SUMMARY_CACHE_PATH")
+            _summary_cache = TieredCache(
+                LRUCache(max_entries=int(os.getenv("SUMMARY_CACHE_SIZE", "4096"))),
+                SQLiteCache(disk_path) if disk_path else None,
+            )
+        return _summary_cache
+
+
+def get_image_analysis_cache():
+    """Process-wide cache of image analyses keyed by perceptual hash.
+
+    Configured with IMAGE_CACHE_SIZE, IMAGE_CACHE_MAX_DISTANCE (differing hash bits still
+    treated as the same image; 0, the default, matches exact hashes only) and IMAGE_CACHE_PATH.
+    """
+    global _image_analysis_cache
+    with _cache_lock:
+        if _image_analysis_cache is None:
+            _image_analysis_cache = ImageAnalysisCache(
+                max_entries=int(os.getenv("IMAGE_CACHE_SIZE", "1024")),
+                max_distance=int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "0")),
+                disk_path=os.getenv("IMAGE_CACHE_PATH"),
+            )
+        return _image_analysis_cache
+
+
+def get_search_result_cache():
+    """Process-wide cache of search results, invalidated by every corpus write.
+
+    Configured with RESULT_CACHE_SIZE and RESULT_CACHE_TTL (seconds; bounds how long
+    writes from other processes can go unnoticed).
+    """
+    global _search_result_cache
+    with _cache_lock:
+        if _search_result_cache is None:
+            _search_result_cache = SearchResultCache(
+                max_entries=int(os.getenv("RESULT_CACHE_SIZE", "1024")),
+                ttl_seconds=float(os.getenv("RESULT_CACHE_TTL", "300")),
+            )
+        return _search_result_cache
+
+
+def bump_corpus_version():
+    """Invalidate cached search results after the corpus changed."""
+    get_search_result_cache().bump()
@@ -1,8 +1,9 @@
 # db/config.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
 import os
 from dotenv import load_dotenv
+from pgvector.psycopg import register_vector
 
 load_dotenv()
 
@@ -10,5 +11,56 @@ connection = (
     f"postgresql+psycopg://{os.getenv('DB_USERNAME')}:{os.getenv('DB_PASSWORD')}"
     f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
 )
-engine = create_engine(connection)
+
+# Pool tuning: DB_POOL_SIZE connections are kept open, up to DB_MAX_OVERFLOW more are
+# opened under load, stale connections are detected with a pre-ping and recycled
+# after DB_POOL_RECYCLE seconds (before server or proxy idle timeouts kill them).
+engine = create_engine(
+    connection,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    pool_pre_ping=True,
+)
+
+
+@event.listens_for(engine, "connect")
+def register_vector_type(dbapi_connection, connection_record):
+    """Teach each new psycopg connection to send and receive pgvector values in binary."""
+    register_vector(dbapi_connection)
+
+
+# Distance metric of the ANN index and of every similarity query: "l2", "cosine" or
+# "inner_product". OpenAI embeddings are unit length, so all three rank results the same
+# way and inner product is the cheapest to compute.
+VECTOR_METRIC = os.getenv("VECTOR_METRIC", "l2")
+
+# Embedding model and output size, shared by ingest, search, the LangChain collection and
+# the embeddings column. text-embedding-3 models return any size up to their native one
+# (1536 for -small, 3072 for -large); shorter vectors are Matryoshka truncations, so an
+# existing table can be shrunk with `python -m src.db.migrate_vectors --dimensions 512`.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
+# Storage of the embeddings column: "vector" (float32) or "halfvec" (float16, half the
+# table and index size). Switching an existing table goes through
+# `python -m src.db.migrate_vectors`.
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "vector")
+
+# "binary" searches a small HNSW index over binary_quantize(embedding) and re-ranks the
+# top candidates on the stored vectors; "none" indexes the stored vectors directly.
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+
+# Filtered searches keep scanning the ANN index until `limit` rows pass the filters
+# ("relaxed_order" or "strict_order"; needs pgvector 0.8+, "off" for older versions).
+# Filters matching at most EXACT_SEARCH_MAX_ROWS chunks skip the ANN index and are
+# searched exactly, which is both faster and complete for such small sets.
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+EXACT_SEARCH_MAX_ROWS = int(os.getenv("EXACT_SEARCH_MAX_ROWS", "2000"))
+
 Session = sessionmaker(bind=engine)
+
+# One session per thread (Streamlit script run, worker thread); call
+# ScopedSession.remove() at the end of a request to return its connection to the pool.
+ScopedSession = scoped_session(Session)
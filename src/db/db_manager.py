@@ -1,28 +1,144 @@
 # db/crud.py
 
-from src.db.models import User, Category, Section, SubSection, LearningType, Resource, Embeddings,Base
-from src.db.config import engine,Session as SessionFactory  
-from sqlalchemy import MetaData,inspect,text
+from src.db.models import User, Category, Section, SubSection, LearningType, Resource, Embeddings,Base,EMBEDDING_FILTER_COLUMNS
+from src.db.config import engine,ScopedSession,EXACT_SEARCH_MAX_ROWS
+from src.db.migrate_text_search import TEXT_SEARCH_CONFIG, text_search_column_exists
+from src.cache import bump_corpus_version
+from src.diversify import diversify
+from src.db.vector_index import (
+    VectorIndexManager,
+    DISTANCE_OPERATORS,
+    DEFAULT_ITERATIVE_SCAN,
+    DEFAULT_METRIC,
+    DEFAULT_QUANTIZATION,
+    binary_quantized,
+    query_vector,
+    search_settings,
+    similarity_from_distance,
+    sql_literal,
+)
+from sqlalchemy import MetaData,func,inspect,text,insert
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+import os
+import threading
+import time
+import numpy as np
+
+# Idempotent DDL that brings tables created by older versions up to the current models.
+# Index names match the ones SQLAlchemy generates for fresh tables.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE resources ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_resources_content_hash ON resources (content_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_resources_path ON resources (path)",
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_resource_id_content_hash ON embeddings (resource_id, content_hash)",
+    # Resource filter attributes denormalized onto the chunks
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS permissions_allowed VARCHAR",
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS category_id INTEGER",
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS sub_section_id INTEGER",
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS learning_type_id INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_category_id_sub_section_id ON embeddings (category_id, sub_section_id)",
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_sub_section_id ON embeddings (sub_section_id)",
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_learning_type_id ON embeddings (learning_type_id)",
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_permissions_allowed ON embeddings (permissions_allowed)",
+    # Change marker; no default in ADD COLUMN, so existing rows stay NULL and the table is not rewritten
+    "ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE embeddings ALTER COLUMN updated_at SET DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_updated_at ON embeddings (updated_at)",
+    # Backfill rows written before the copies existed; a no-op (index lookup) once done
+    """UPDATE embeddings SET permissions_allowed = resources.permissions_allowed, category_id = resources.category_id,
+        sub_section_id = resources.sub_section_id, learning_type_id = resources.learning_type_id
+    FROM resources WHERE embeddings.resource_id = resources.id AND embeddings.category_id IS NULL""",
+]
+
+# Values of the search `chunk_type` filter, matched against Embeddings.summary
+CHUNK_TYPES = ("summary", "body")
+
+FUSION_METHODS = ("rrf", "weighted")
+
+# Worker threads for the parallel halves of a hybrid search
+_search_pool = ThreadPoolExecutor(max_workers=int(os.getenv("SEARCH_THREADS", "8")), thread_name_prefix="search")
+
+
+def fuse_results(vector_results, lexical_results, limit, fusion="rrf", weights=(1.0, 1.0), rrf_k=60):
+    """Merge vector and lexical result lists (dicts with an `id`) into one ranking.
+
+    "rrf" (reciprocal rank fusion) scores a chunk by sum(weight / (rrf_k + rank)) over
+    the lists it appears in and needs no score calibration. "weighted" min-max
+    normalizes each list's scores (closeness for vectors, ts_rank for text) to [0, 1]
+    and sums them with the weights.
+    """
+    if fusion not in FUSION_METHODS:
+        raise ValueError(f"fusion must be one of {FUSION_METHODS}, got {fusion!r}")
+
+    def normalized(values):
+        low, high = min(values), max(values)
+        return [1.0 if high == low else (value - low) / (high - low) for value in values]
+
+    merged = {}
+    sides = (
+        ("distance", vector_results, [-result["distance"] for result in vector_results]),
+        ("rank", lexical_results, [result["rank"] for result in lexical_results]),
+    )
+    for (score_key, results, raw_scores), weight in zip(sides, weights):
+        side_scores = normalized(raw_scores) if fusion == "weighted" and results else None
+        for position, result in enumerate(results):
+            entry = merged.setdefault(result["id"], {
+                "id": result["id"],
+                "content": result["content"],
+                "resource_name": result["resource_name"],
+                "resource_id": result["resource_id"],
+                "chunk_order": result["chunk_order"],
+                "distance": None,
+                "similarity": None,
+                "rank": None,
+                "score": 0.0,
+            })
+            entry[score_key] = result[score_key]
+            if score_key == "distance":
+                entry["similarity"] = result["similarity"]
+            entry["score"] += weight * (side_scores[position] if side_scores else 1.0 / (rrf_k + position + 1))
+    return sorted(merged.values(), key=lambda entry: entry["score"], reverse=True)[:limit]
 
 
 class DatabaseManager:
-    def __init__(self):
-        self.session = SessionFactory()
-        self.create_missing_tables()
+    _schema_checked = False
+    _text_search_ready = True
+    _schema_lock = threading.Lock()
+
+    def __init__(self, session=None):
+        """Use `session` if given; otherwise each thread gets its own scoped session."""
+        self._session = session
+        self.ensure_schema()
+
+    @property
+    def session(self):
+        return self._session if self._session is not None else ScopedSession()
 
     def close(self):
-        """Close the session."""
-        self.session.close()
-    def create_missing_tables(self):
+        """End the current request: close the session and return its connection to the pool."""
+        if self._session is not None:
+            self._session.close()
+        else:
+            ScopedSession.remove()
+
+    @classmethod
+    def ensure_schema(cls):
+        """Run the schema checks once per process rather than once per manager."""
+        if cls._schema_checked:
+            return
+        with cls._schema_lock:
+            if not cls._schema_checked:
+                cls.create_missing_tables()
+                cls._schema_checked = True
+
+    @classmethod
+    def create_missing_tables(cls):
         """Create tables only if they are missing in the database."""
         inspector = inspect(engine)
         existing_tables = inspector.get_table_names()
 
-        # Reflect metadata to check existing tables
-        metadata = MetaData()
-        metadata.reflect(bind=engine)
-
         # Check for missing tables and create them
         missing_tables = [table for table in Base.metadata.tables.keys() if table not in existing_tables]
         if missing_tables:
@@ -31,6 +147,28 @@ class DatabaseManager:
         else:
             # print("All tables already exist.")
             pass
+
+        cls.upgrade_schema()
+
+        # Adding the generated content_tsv column rewrites the table, so it is an explicit migration
+        cls._text_search_ready = text_search_column_exists()
+        if not cls._text_search_ready:
+            print("Warning: embeddings.content_tsv is missing, so hybrid search is disabled. "
+                  "Add it with `python -m src.db.migrate_text_search`.")
+
+        # Without an ANN index every similarity search is a sequential scan, but building one
+        # on a large table takes long and must not block startup; leave it to the CLI
+        missing = VectorIndexManager().missing_default_index()
+        if missing:
+            print(f"Warning: no ANN index with {missing} on embeddings; searches scan the whole table. "
+                  f"Build it with `python -m src.db.vector_index ensure`.")
+
+    @staticmethod
+    def upgrade_schema():
+        """Add columns and indexes introduced after the tables were first created."""
+        with engine.begin() as connection:
+            for statement in SCHEMA_UPGRADES:
+                connection.execute(text(statement))
     # Population Methods
 
     def populate_users(self):
@@ -114,6 +252,7 @@ class DatabaseManager:
         self.session.query(Category).delete()
         self.session.query(User).delete()
         self.session.commit()
+        bump_corpus_version()
         print("All records deleted from all tables.")
         
     def delete_resources_embeddings(self):
@@ -121,6 +260,7 @@ class DatabaseManager:
         self.session.query(Embeddings).delete()
         self.session.query(Resource).delete()
         self.session.commit()
+        bump_corpus_version()
         print("All records from Embedding and Resources deleted")
         
         
@@ -132,17 +272,26 @@ class DatabaseManager:
         if resource:
             self.session.delete(resource)
             self.session.commit()
+            bump_corpus_version()
             print(f"Resource {resource_id} and associated chunks deleted.")
         else:
             print(f"Resource {resource_id} not found.")
 
     def update_resource(self, resource_id: int, **kwargs):
-        """Updates a resource's details with provided keyword arguments."""
+        """Updates a resource's details with provided keyword arguments.
+
+        Filter attributes are also copied onto the resource's chunks, in the same transaction.
+        """
         resource = self.session.query(Resource).filter_by(id=resource_id).first()
         if resource:
             for key, value in kwargs.items():
                 setattr(resource, key, value)
+            copied = {key: value for key, value in kwargs.items() if key in EMBEDDING_FILTER_COLUMNS}
+            if copied or "resource_name" in kwargs:
+                # Search results carry the filters and resource name, so the chunks count as changed
+                self.session.query(Embeddings).filter_by(resource_id=resource_id).update(dict(copied, updated_at=func.now()), synchronize_session=False)
             self.session.commit()
+            bump_corpus_version()
             print(f"Resource {resource_id} updated with {kwargs}.")
         else:
             print(f"Resource {resource_id} not found.")
@@ -154,25 +303,44 @@ class DatabaseManager:
             for key, value in kwargs.items():
                 setattr(chunk, key, value)
             self.session.commit()
+            bump_corpus_version()
             print(f"Chunk {chunk_id} updated with {kwargs}.")
         else:
             print(f"Chunk {chunk_id} not found.")
-    def add_resource(self, sub_section_id, learning_type_id, category_id, resource_name, path, permissions_allowed="free"):
-        """Add a new resource to the database."""
+    def add_resource(self, sub_section_id, learning_type_id, category_id, resource_name, path, permissions_allowed="free", content_hash=None, commit=True):
+        """Add a new resource to the database.
+
+        With `commit=False` the row is only flushed, so its id can be used for chunks
+        written later in the same transaction.
+        """
         resource = Resource(
             sub_section_id=sub_section_id,
             learning_type_id=learning_type_id,
             permissions_allowed=permissions_allowed,
             category_id=category_id,
             resource_name=resource_name,
-            path=path
+            path=path,
+            content_hash=content_hash
         )
         self.session.add(resource)
-        self.session.commit()
+        if commit:
+            self.session.commit()
+            bump_corpus_version()
+        else:
+            self.session.flush()  # Assigns resource.id without committing; the committer bumps the version
         print(f"Resource '{resource_name}' added with ID {resource.id}.")
         return resource.id  # Return the ID of the newly created resource
 
-    def add_chunk(self, resource_id, chunk_order, embedding, content,summary,cmetadata):
+    def resource_filter_values(self, resource_id):
+        """Return the resource's filter attributes ({column: value}) that its chunks carry copies of."""
+        row = (
+            self.session.query(*(getattr(Resource, column) for column in EMBEDDING_FILTER_COLUMNS))
+            .filter_by(id=resource_id)
+            .one()
+        )
+        return dict(zip(EMBEDDING_FILTER_COLUMNS, row))
+
+    def add_chunk(self, resource_id, chunk_order, embedding, content,summary,cmetadata,content_hash=None):
         """Add a new chunk (embedding) associated with a specific resource."""
         chunk = Embeddings(
             resource_id=resource_id,
@@ -181,11 +349,109 @@ class DatabaseManager:
             embedding=embedding,
             content=content,
             summary=summary,
-            cmetadata= cmetadata
+            cmetadata= cmetadata,
+            content_hash=content_hash,
+            **self.resource_filter_values(resource_id)
         )
         self.session.add(chunk)
         self.session.commit()
+        bump_corpus_version()
         print(f"Chunk {chunk_order} added to resource ID {resource_id}.")
+
+    def add_chunks(self, resource_id, chunks, commit=True):
+        """Add many chunks of a resource with a single multi-row INSERT.
+
+        `chunks` is an iterable of dicts with the `add_chunk` fields
+        (chunk_order, embedding, content, summary, cmetadata); the resource's filter
+        attributes are added to every row.
+        """
+        today = date.today()
+        rows = [dict(chunk, resource_id=resource_id, date=today) for chunk in chunks]
+        if rows:
+            filter_values = self.resource_filter_values(resource_id)
+            for row in rows:
+                row.update(filter_values)
+        if rows:
+            self.session.execute(insert(Embeddings), rows)
+        if commit:
+            self.session.commit()
+            bump_corpus_version()  # Otherwise the caller does, once the rows are committed
+        print(f"{len(rows)} chunks added to resource ID {resource_id}.")
+        return len(rows)
+
+    def add_resource_with_chunks(self, chunks, sub_section_id, learning_type_id, category_id, resource_name, path, permissions_allowed="free", content_hash=None):
+        """Add a resource and all of its chunks in one transaction, so they become visible together."""
+        resource = Resource(
+            sub_section_id=sub_section_id,
+            learning_type_id=learning_type_id,
+            permissions_allowed=permissions_allowed,
+            category_id=category_id,
+            resource_name=resource_name,
+            path=path,
+            content_hash=content_hash
+        )
+        try:
+            self.session.add(resource)
+            self.session.flush()  # Assigns resource.id without committing
+            self.add_chunks(resource.id, chunks, commit=False)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        bump_corpus_version()
+        print(f"Resource '{resource_name}' added with ID {resource.id}.")
+        return resource.id
+    def sync_resource_chunks(self, resource_id, new_chunks, kept_chunks, stale_chunk_ids, content_hash=None, resource_values=None):
+        """Apply an incremental re-ingest of a resource in one transaction.
+
+        Inserts `new_chunks` (dicts as for `add_chunks`), moves kept chunks to their new
+        positions with their new metadata (`{chunk_id: (chunk_order, cmetadata)}`),
+        deletes `stale_chunk_ids`, records the new file `content_hash` and applies
+        changed `resource_values` (e.g. category, permissions) to the resource and the
+        filter columns of its chunks.
+        """
+        try:
+            if resource_values:
+                self.session.query(Resource).filter_by(id=resource_id).update(resource_values, synchronize_session=False)
+                copied = {key: value for key, value in resource_values.items() if key in EMBEDDING_FILTER_COLUMNS}
+                if copied:
+                    self.session.query(Embeddings).filter_by(resource_id=resource_id).update(copied, synchronize_session=False)
+            if stale_chunk_ids:
+                self.session.query(Embeddings).filter(Embeddings.id.in_(stale_chunk_ids)).delete(synchronize_session=False)
+            for chunk_id, (chunk_order, cmetadata) in kept_chunks.items():
+                self.session.query(Embeddings).filter_by(id=chunk_id).update({"chunk_order": chunk_order, "cmetadata": cmetadata, "date": date.today()})
+            self.add_chunks(resource_id, new_chunks, commit=False)
+            if content_hash is not None:
+                self.session.query(Resource).filter_by(id=resource_id).update({"content_hash": content_hash})
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        bump_corpus_version()
+        print(f"Resource {resource_id} synced: {len(new_chunks)} added, {len(kept_chunks)} kept, {len(stale_chunk_ids)} removed.")
+
+    def get_resource_by_path(self, path):
+        """Return the resource stored under `path`, or None (indexed lookup)."""
+        return self.session.query(Resource).filter_by(path=path).first()
+
+    def get_resource_by_hash(self, content_hash):
+        """Return a resource whose source file has this content hash, or None (indexed lookup)."""
+        return self.session.query(Resource).filter_by(content_hash=content_hash).first()
+
+    def get_chunk_hashes(self, resource_id):
+        """Return {(is summary chunk, chunk content hash): [chunk ids]} for the chunks of a resource."""
+        rows = (
+            self.session.query(Embeddings.summary, Embeddings.content_hash, Embeddings.id)
+            .filter_by(resource_id=resource_id)
+            .order_by(Embeddings.chunk_order)
+            .all()
+        )
+        chunk_hashes = {}
+        for summary, content_hash, chunk_id in rows:
+            # Rows written before body chunks existed have no flag; they are summary chunks
+            chunk_hashes.setdefault((summary is not False, content_hash), []).append(chunk_id)
+        return chunk_hashes
+
     def get_all_resource_paths(self):
         """Retrieve all unique document paths in the resources table."""
         paths = self.session.query(Resource.path).distinct().all()
@@ -212,64 +478,326 @@ class DatabaseManager:
         return ["free", "paid", "agency"]
     
         
-    def search_documents(self, query_embedding, limit=5, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None):
-        # Convert the query to an embedding and format it as an array for PostgreSQL
-        query_embedding_cast = f"ARRAY{query_embedding}::vector"  # Casting directly as vector array
-        
-        # Start building the SQL query with the required parts
+    def _search_filters(self, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None, chunk_type=None):
+        """Build the WHERE clauses and bound parameters for the search filters.
+
+        Clauses are emitted in a fixed order so every filter combination maps to one
+        stable SQL text, which lets psycopg reuse its server-side prepared statement.
+        Filters apply to the attributes copied onto `embeddings`, so the index scan
+        filters rows itself. The permission is inlined rather than bound (there are
+        only a few levels), so a partial index on it can match the query's predicate.
+        `chunk_type` is "summary", "body" or None for both.
+        """
+        if chunk_type is not None and chunk_type not in CHUNK_TYPES:
+            raise ValueError(f"chunk_type must be one of {CHUNK_TYPES} or None, got {chunk_type!r}")
+        permission_clause = None
+        if permissions_allowed is not None:
+            permission_clause = "embeddings.permissions_allowed = " + sql_literal(permissions_allowed).replace("%", "%%")
+        candidates = [
+            ("embeddings.resource_id = %(resource_id)s", "resource_id", resource_id),
+            (permission_clause, None, permissions_allowed),
+            ("embeddings.category_id = %(category_id)s", "category_id", category_id),
+            ("embeddings.sub_section_id = %(sub_section_id)s", "sub_section_id", sub_section_id),
+            ("embeddings.learning_type_id = %(learning_type_id)s", "learning_type_id", learning_type_id),
+            # Chunks stored before body indexing have no flag and count as summary chunks
+            ("(embeddings.summary IS NOT FALSE) = %(summary)s", "summary", None if chunk_type is None else chunk_type == "summary"),
+        ]
+        filters = [clause for clause, _, value in candidates if value is not None]
+        params = {name: value for _, name, value in candidates if name is not None and value is not None}
+        return filters, params
+
+    def _driver_cursor(self):
+        """Return a raw psycopg cursor on the session's current connection and transaction."""
+        return self.session.connection().connection.driver_connection.cursor()
+
+    def count_matching(self, filters, params, cap):
+        """Count the chunks passing `filters`, stopping at `cap` + 1 (B-tree index lookups only)."""
         sql_query = f"""
-            SELECT 
+            SELECT count(*) FROM (
+                SELECT 1 FROM embeddings WHERE {" AND ".join(filters) or "TRUE"} LIMIT %(count_cap)s
+            ) AS matching
+        """
+        with self._driver_cursor() as cursor:
+            cursor.execute(sql_query, dict(params, count_cap=cap + 1), prepare=True)
+            return cursor.fetchone()[0]
+
+    def _scan_strategy(self, filters, params, exact=None, iterative_scan=None):
+        """Pick (exact, iterative_scan) for a search with these filters; explicit values win."""
+        if exact is None:
+            exact = bool(filters) and EXACT_SEARCH_MAX_ROWS > 0 and self.count_matching(filters, params, EXACT_SEARCH_MAX_ROWS) <= EXACT_SEARCH_MAX_ROWS
+        if iterative_scan is None and filters and not exact and DEFAULT_ITERATIVE_SCAN != "off":
+            iterative_scan = DEFAULT_ITERATIVE_SCAN
+        return exact, iterative_scan
+
+    def search_documents(self, query_embedding, limit=5, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None, chunk_type=None, ef_search=None, probes=None, rerank_candidates=None, exact=None, iterative_scan=None, mmr_lambda=None, max_per_resource=None, collapse=False, candidates=None):
+        """Return the chunks closest to `query_embedding`, optionally filtered and diversified (see README)."""
+        filters, params = self._search_filters(
+            resource_id=resource_id,
+            permissions_allowed=permissions_allowed,
+            category_id=category_id,
+            sub_section_id=sub_section_id,
+            learning_type_id=learning_type_id,
+            chunk_type=chunk_type,
+        )
+        diversified = mmr_lambda is not None or bool(max_per_resource) or collapse
+        fetch_limit = max(limit, candidates or limit * 20) if diversified else limit
+        params["query_embedding"] = np.asarray(query_embedding, dtype=np.float32)
+        params["limit"] = fetch_limit
+        where = " WHERE " + " AND ".join(filters) if filters else ""
+        with_vectors = mmr_lambda is not None  # MMR compares candidates with each other, so it needs their vectors
+
+        exact, iterative_scan = self._scan_strategy(filters, params, exact, iterative_scan)
+
+        if DEFAULT_QUANTIZATION == "binary" and not exact:
+            params["candidates"] = max(fetch_limit, rerank_candidates or fetch_limit * 10)
+            # An HNSW scan returns at most ef_search rows, so it must cover the candidate pool
+            ef_search = min(1000, max(ef_search or 0, params["candidates"]))
+            sql_query = f"""
+                SELECT content, resource_name, embedding {DISTANCE_OPERATORS[DEFAULT_METRIC]} {query_vector()} AS distance, id,
+                    resource_id, chunk_order{", embedding::vector" if with_vectors else ""}
+                FROM (
+                    SELECT embeddings.content, resources.resource_name, embeddings.embedding, embeddings.id,
+                        embeddings.resource_id, embeddings.chunk_order
+                    FROM embeddings
+                    JOIN resources ON embeddings.resource_id = resources.id
+                    {where}
+                    ORDER BY {binary_quantized("embeddings.embedding")} <~> binary_quantize({query_vector()})
+                    LIMIT %(candidates)s
+                ) AS candidates
+                ORDER BY distance LIMIT %(limit)s
+            """
+        else:
+            sql_query = f"""
+                SELECT
+                    embeddings.content,
+                    resources.resource_name,
+                    embeddings.embedding {DISTANCE_OPERATORS[DEFAULT_METRIC]} {query_vector()} AS distance,
+                    embeddings.id,
+                    embeddings.resource_id,
+                    embeddings.chunk_order{", embeddings.embedding::vector" if with_vectors else ""}
+                FROM embeddings
+                JOIN resources ON embeddings.resource_id = resources.id
+                {where}
+                ORDER BY distance LIMIT %(limit)s
+            """
+
+        settings = dict(ef_search=ef_search, probes=probes, iterative_scan=iterative_scan, exact=exact)
+        with self._driver_cursor() as cursor, search_settings(cursor, **settings):
+            cursor.execute(sql_query, params, prepare=True)
+            results = cursor.fetchall()
+        results.sort(key=lambda row: row[2])  # A relaxed iterative scan may return rows slightly out of order
+
+        # Format the results into a list of dictionaries
+        formatted_results = [
+            {
+                "content": row[0],
+                "resource_name": row[1],
+                "distance": row[2],
+                "similarity": similarity_from_distance(row[2]),
+                "id": row[3],
+                "resource_id": row[4],
+                "chunk_order": row[5]
+            }
+            for row in results
+        ]
+        if diversified:
+            embeddings = [row[6] for row in results] if with_vectors else None
+            return diversify(formatted_results, query_embedding, limit, embeddings, mmr_lambda=mmr_lambda,
+                             max_per_resource=max_per_resource, collapse=collapse)
+        return formatted_results
+
+    def search_documents_batch(self, query_embeddings, limit=5, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None, chunk_type=None, ef_search=None, probes=None, rerank_candidates=None, exact=None, iterative_scan=None):
+        """Search many query vectors with the same filters in one statement; returns one result list per query.
+
+        The vectors are sent as a single `vector[]` parameter and searched with a LATERAL
+        join over `unnest(...) WITH ORDINALITY`, so a batch costs one round trip, one
+        planning step and one set of filter checks instead of one of each per query.
+        Each inner search uses the ANN index exactly as `search_documents` does, and the
+        results match its output per query.
+        """
+        if not len(query_embeddings):
+            return []
+        filters, params = self._search_filters(
+            resource_id=resource_id,
+            permissions_allowed=permissions_allowed,
+            category_id=category_id,
+            sub_section_id=sub_section_id,
+            learning_type_id=learning_type_id,
+            chunk_type=chunk_type,
+        )
+        params["query_embeddings"] = [np.asarray(query_embedding, dtype=np.float32) for query_embedding in query_embeddings]
+        params["limit"] = limit
+        where = " WHERE " + " AND ".join(filters) if filters else ""
+        query = query_vector("queries.query_embedding")
+
+        exact, iterative_scan = self._scan_strategy(filters, params, exact, iterative_scan)
+
+        if DEFAULT_QUANTIZATION == "binary" and not exact:
+            params["candidates"] = max(limit, rerank_candidates or limit * 10)
+            ef_search = min(1000, max(ef_search or 0, params["candidates"]))
+            matches = f"""
+                SELECT content, resource_name, embedding {DISTANCE_OPERATORS[DEFAULT_METRIC]} {query} AS distance, id,
+                    resource_id, chunk_order
+                FROM (
+                    SELECT embeddings.content, resources.resource_name, embeddings.embedding, embeddings.id,
+                        embeddings.resource_id, embeddings.chunk_order
+                    FROM embeddings
+                    JOIN resources ON embeddings.resource_id = resources.id
+                    {where}
+                    ORDER BY {binary_quantized("embeddings.embedding")} <~> binary_quantize({query})
+                    LIMIT %(candidates)s
+                ) AS candidates
+                ORDER BY distance LIMIT %(limit)s
+            """
+        else:
+            matches = f"""
+                SELECT
+                    embeddings.content,
+                    resources.resource_name,
+                    embeddings.embedding {DISTANCE_OPERATORS[DEFAULT_METRIC]} {query} AS distance,
+                    embeddings.id,
+                    embeddings.resource_id,
+                    embeddings.chunk_order
+                FROM embeddings
+                JOIN resources ON embeddings.resource_id = resources.id
+                {where}
+                ORDER BY distance LIMIT %(limit)s
+            """
+        sql_query = f"""
+            SELECT queries.position, matches.content, matches.resource_name, matches.distance, matches.id,
+                matches.resource_id, matches.chunk_order
+            FROM unnest(%(query_embeddings)b::vector[]) WITH ORDINALITY AS queries(query_embedding, position)
+            CROSS JOIN LATERAL ({matches}) AS matches
+            ORDER BY queries.position, matches.distance
+        """
+
+        settings = dict(ef_search=ef_search, probes=probes, iterative_scan=iterative_scan, exact=exact)
+        with self._driver_cursor() as cursor, search_settings(cursor, **settings):
+            cursor.execute(sql_query, params, prepare=True)
+            rows = cursor.fetchall()
+
+        results = [[] for _ in query_embeddings]
+        for position, content, resource_name, distance, chunk_id, resource_id, chunk_order in rows:
+            results[position - 1].append({
+                "content": content,
+                "resource_name": resource_name,
+                "distance": distance,
+                "similarity": similarity_from_distance(distance),
+                "id": chunk_id,
+                "resource_id": resource_id,
+                "chunk_order": chunk_order
+            })
+        return results
+
+    def lexical_search(self, query_text, limit=5, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None, chunk_type=None):
+        """Return the chunks that best match `query_text` by Postgres full-text search.
+
+        Uses the GIN-indexed `content_tsv` column; `query_text` accepts web-search syntax
+        ("quoted phrases", OR, -excluded). Exact terms such as program names and acronyms
+        that embeddings blur together are matched here.
+        """
+        if not self._text_search_ready:
+            raise RuntimeError("embeddings.content_tsv is missing; run `python -m src.db.migrate_text_search` and restart.")
+        filters, params = self._search_filters(
+            resource_id=resource_id,
+            permissions_allowed=permissions_allowed,
+            category_id=category_id,
+            sub_section_id=sub_section_id,
+            learning_type_id=learning_type_id,
+            chunk_type=chunk_type,
+        )
+        params["query_text"] = query_text
+        params["limit"] = limit
+
+        sql_query = f"""
+            SELECT
                 embeddings.content,
                 resources.resource_name,
-                embeddings.embedding <-> {query_embedding_cast} AS distance
+                ts_rank_cd(embeddings.content_tsv, query) AS rank,
+                embeddings.id,
+                embeddings.resource_id,
+                embeddings.chunk_order
             FROM embeddings
             JOIN resources ON embeddings.resource_id = resources.id
+            CROSS JOIN websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', %(query_text)s) AS query
+            WHERE embeddings.content_tsv @@ query
         """
-        
-        # Add filters dynamically
-        filters = []
-        params = {"limit": limit}
-        
-        if resource_id is not None:
-            filters.append("resources.id = :resource_id")
-            params["resource_id"] = resource_id
-        
-        if permissions_allowed is not None:
-            filters.append("resources.permissions_allowed = :permissions_allowed")
-            params["permissions_allowed"] = permissions_allowed
-        
-        if category_id is not None:
-            filters.append("resources.category_id = :category_id")
-            params["category_id"] = category_id
-        
-        if sub_section_id is not None:
-            filters.append("resources.sub_section_id = :sub_section_id")
-            params["sub_section_id"] = sub_section_id
-        
-        if learning_type_id is not None:
-            filters.append("resources.learning_type_id = :learning_type_id")
-            params["learning_type_id"] = learning_type_id
-        
-        # Join all filters with AND and add them to the SQL query
         if filters:
-            sql_query += " WHERE " + " AND ".join(filters)
-        
-        # Order by distance and apply the limit
-        sql_query += " ORDER BY distance LIMIT :limit"
-        
-        # Execute the SQL query
-        results = self.session.execute(text(sql_query), params).fetchall()
-        
-        # Format the results into a list of dictionaries
-        formatted_results = [
+            sql_query += " AND " + " AND ".join(filters)
+        sql_query += " ORDER BY rank DESC LIMIT %(limit)s"
+
+        with self._driver_cursor() as cursor:
+            cursor.execute(sql_query, params, prepare=True)
+            results = cursor.fetchall()
+
+        return [
             {
                 "content": row[0],
                 "resource_name": row[1],
-                "distance": row[2]
+                "rank": row[2],
+                "id": row[3],
+                "resource_id": row[4],
+                "chunk_order": row[5]
             }
             for row in results
         ]
-        return formatted_results
+
+    def _run_in_own_session(self, function, *args, **kwargs):
+        """Run a search with a fresh scoped session for the current thread, timing it in ms."""
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs), (time.perf_counter() - start) * 1000
+        finally:
+            self.close()
+
+    def hybrid_search(self, query_embedding, query_text, limit=5, candidates=None, fusion="rrf", vector_weight=1.0, lexical_weight=1.0, rrf_k=60, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None, chunk_type=None, ef_search=None, probes=None, max_per_resource=None, collapse=False):
+        """Combine vector and full-text search; returns (results, timings in ms).
+
+        Both candidate queries (`candidates` rows each, default 4 x `limit`) run in
+        parallel on separate pooled connections, so the added latency is that of the
+        slower query rather than their sum. Results are merged with `fuse_results`
+        ("rrf" or "weighted") and carry the fused `score` plus each side's `distance`
+        `similarity` and `rank` (None when a chunk was found by one side only).
+        `max_per_resource` and `collapse` apply to the fused ranking as in `search_documents`
+        (from a default of 20 x `limit` candidates); MMR needs vectors the text side lacks.
+        """
+        filters = dict(
+            resource_id=resource_id,
+            permissions_allowed=permissions_allowed,
+            category_id=category_id,
+            sub_section_id=sub_section_id,
+            learning_type_id=learning_type_id,
+            chunk_type=chunk_type,
+        )
+        diversified = bool(max_per_resource) or collapse
+        candidates = candidates or limit * (20 if diversified else 4)
+        start = time.perf_counter()
+        if self._session is None:
+            vector_future = _search_pool.submit(self._run_in_own_session, self.search_documents, query_embedding, candidates, ef_search=ef_search, probes=probes, **filters)
+            lexical_future = _search_pool.submit(self._run_in_own_session, self.lexical_search, query_text, candidates, **filters)
+            vector_results, vector_ms = vector_future.result()
+            lexical_results, lexical_ms = lexical_future.result()
+        else:
+            # An explicit session cannot be shared across threads; run the queries one after the other
+            vector_start = time.perf_counter()
+            vector_results = self.search_documents(query_embedding, candidates, ef_search=ef_search, probes=probes, **filters)
+            lexical_start = time.perf_counter()
+            lexical_results = self.lexical_search(query_text, candidates, **filters)
+            vector_ms = (lexical_start - vector_start) * 1000
+            lexical_ms = (time.perf_counter() - lexical_start) * 1000
+
+        fusion_start = time.perf_counter()
+        results = fuse_results(vector_results, lexical_results, None if diversified else limit, fusion=fusion, weights=(vector_weight, lexical_weight), rrf_k=rrf_k)
+        if diversified:
+            results = diversify(results, query_embedding, limit, max_per_resource=max_per_resource, collapse=collapse)
+        end = time.perf_counter()
+        timings = {
+            "vector_ms": vector_ms,
+            "lexical_ms": lexical_ms,
+            "fusion_ms": (end - fusion_start) * 1000,
+            "total_ms": (end - start) * 1000,
+        }
+        return results, timings
 if __name__ == "__main__":
     db_manager = DatabaseManager()
     # db_manager.drop_all_tables()
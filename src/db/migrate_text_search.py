@@ -0,0 +1,77 @@
+# db/migrate_text_search.py
+"""Add the full-text search column used by hybrid search to an existing embeddings table.
+
+`embeddings.content_tsv` is a STORED generated column, so adding it to a table that
+already holds chunks rewrites the whole table under an ACCESS EXCLUSIVE lock: searches
+and ingest wait until the rewrite is done. Tables created by this version already have
+the column; older ones are migrated with this script, when the corpus can go offline
+for the duration, instead of implicitly on app start. The GIN index is then built
+CONCURRENTLY, so it does not block writes. Restart the app afterwards to enable
+`search_documents(..., mode="hybrid")`.
+
+Usage:
+    python -m src.db.migrate_text_search --dry-run
+    python -m src.db.migrate_text_search --maintenance-work-mem 1GB
+"""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from src.db.config import engine
+
+TABLE = "embeddings"
+COLUMN = "content_tsv"
+INDEX_NAME = "ix_embeddings_content_tsv"
+TEXT_SEARCH_CONFIG = "english"
+
+
+def text_search_column_exists():
+    with engine.connect() as connection:
+        return connection.execute(
+            text("SELECT 1 FROM information_schema.columns WHERE table_name = :table AND column_name = :column"),
+            {"table": TABLE, "column": COLUMN},
+        ).first() is not None
+
+
+def migration_statements():
+    """The column rewrite (one transaction) and the index build (outside a transaction block)."""
+    return [
+        f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS {COLUMN} tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', content)) STORED",
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON {TABLE} USING gin ({COLUMN})",
+    ]
+
+
+def migrate(dry_run=False, maintenance_work_mem=None):
+    add_column, create_index = migration_statements()
+    if dry_run:
+        print(add_column + ";")
+        print(create_index + ";")
+        return
+
+    start = time.perf_counter()
+    if text_search_column_exists():
+        print(f"{TABLE}.{COLUMN} already exists.")
+    else:
+        print(add_column)
+        with engine.begin() as connection:
+            connection.execute(text(add_column))
+        print(f"Column added in {time.perf_counter() - start:.1f}s; building index...")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        try:
+            if maintenance_work_mem:
+                connection.execute(text("SELECT set_config('maintenance_work_mem', :value, false)"), {"value": maintenance_work_mem})
+            connection.execute(text(create_index))
+        finally:
+            # Session-level setting; do not hand it on with the pooled connection
+            connection.execute(text("RESET maintenance_work_mem"))
+    print(f"Done in {time.perf_counter() - start:.1f}s. Restart the app to enable hybrid search.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add embeddings.content_tsv and its GIN index for hybrid search.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the DDL without running it")
+    parser.add_argument("--maintenance-work-mem", default=None, help="e.g. 1GB, speeds up the index build")
+    args = parser.parse_args()
+    migrate(dry_run=args.dry_run, maintenance_work_mem=args.maintenance_work_mem)
@@ -0,0 +1,167 @@
+# db/migrate_vectors.py
+"""Convert stored embeddings between float32 `vector` and float16 `halfvec` storage,
+and/or shrink them to fewer dimensions.
+
+Shrinking keeps the first N dimensions and re-normalizes them to unit length, which
+is exactly what the API returns for `dimensions=N` with text-embedding-3 models
+(Matryoshka embeddings), so stored vectors stay comparable with new queries. The
+LangChain collection (`langchain_pg_embedding`), which holds the same vectors for
+store "both"/"langchain", is shrunk in the same transaction; it keeps `vector` storage.
+
+The ANN indexes on the column are dropped and the column is converted with a single
+ALTER COLUMN ... TYPE, in one transaction; Postgres rewrites the table, so it is
+compact afterwards but locked against reads and writes while the rewrite runs. The
+default index for the new type (and VECTOR_METRIC / --quantization) is then built,
+followed by the partial indexes (`vector_index create --partition-by`) that were
+dropped, with their predicates and build options.
+Set VECTOR_STORAGE / EMBEDDING_DIMENSIONS to match before restarting the app.
+
+Usage:
+    python -m src.db.migrate_vectors --report
+    python -m src.db.migrate_vectors --to halfvec --dry-run
+    python -m src.db.migrate_vectors --to halfvec --maintenance-work-mem 2GB
+    python -m src.db.migrate_vectors --to halfvec --quantization binary
+    python -m src.db.migrate_vectors --dimensions 512
+    python -m src.db.migrate_vectors --to vector
+"""
+import argparse
+import re
+import time
+
+from sqlalchemy import text
+
+from src.db.config import engine
+from src.db.vector_index import (
+    DEFAULT_METRIC,
+    DEFAULT_QUANTIZATION,
+    OPERATOR_CLASSES,
+    QUANTIZATIONS,
+    VECTOR_STORAGES,
+    VectorIndexManager,
+)
+
+
+def relation_sizes(table="embeddings"):
+    """Return {"table": bytes, "indexes": {index name: bytes}}; table size includes TOAST."""
+    with engine.connect() as connection:
+        table_size = connection.execute(text("SELECT pg_table_size(CAST(:table AS regclass))"), {"table": table}).scalar()
+        rows = connection.execute(
+            text(
+                "SELECT indexname, pg_relation_size(CAST(quote_ident(indexname) AS regclass)) "
+                "FROM pg_indexes WHERE tablename = :table ORDER BY indexname"
+            ),
+            {"table": table},
+        ).fetchall()
+    return {"table": table_size, "indexes": {row[0]: row[1] for row in rows}}
+
+
+def print_sizes(sizes):
+    megabytes = 1024 * 1024
+    print(f"  table        {sizes['table'] / megabytes:10.1f} MB")
+    for name, size in sizes["indexes"].items():
+        print(f"  {name:<40} {size / megabytes:10.1f} MB")
+
+
+def parse_column_type(column_type):
+    """Split e.g. 'halfvec(1536)' into ('halfvec', 1536)."""
+    match = re.fullmatch(r"(\w+)\((\d+)\)", column_type or "")
+    if match is None:
+        raise ValueError(f"Unexpected vector column type {column_type!r}")
+    return match.group(1), int(match.group(2))
+
+
+LANGCHAIN_TABLE = "langchain_pg_embedding"
+
+
+def migration_statements(manager, current_dimensions):
+    """DDL that drops the ANN indexes on the column and converts it to the manager's storage and size."""
+    statements = [f"DROP INDEX IF EXISTS {name}" for name in manager.list_indexes()]
+    column_type = f"{manager.storage}({manager.dimensions})"
+    value = manager.column
+    if manager.dimensions < current_dimensions:
+        # Matryoshka truncation: leading dimensions, back to unit length
+        value = f"l2_normalize(subvector({manager.column}, 1, {manager.dimensions}))"
+    statements.append(
+        f"ALTER TABLE {manager.table} ALTER COLUMN {manager.column} TYPE {column_type} USING {value}::{column_type}"
+    )
+    return statements
+
+
+def langchain_statements(dimensions):
+    """DDL that shrinks the LangChain collection's vectors to `dimensions`; empty if there is nothing to do."""
+    manager = VectorIndexManager(table=LANGCHAIN_TABLE, storage="vector", dimensions=dimensions)
+    column_type = manager.column_type()
+    if column_type is None:
+        return []
+    # LangChain declares a plain `vector` column when created without an embedding length
+    current_dimensions = float("inf") if column_type == "vector" else parse_column_type(column_type)[1]
+    if dimensions >= current_dimensions:
+        return []
+    return migration_statements(manager, current_dimensions)
+
+
+def migrate(target=None, dimensions=None, metric=DEFAULT_METRIC, quantization=DEFAULT_QUANTIZATION, dry_run=False, maintenance_work_mem=None):
+    """Convert the column to `target` storage and/or `dimensions`; unset arguments keep the current value."""
+    current = VectorIndexManager().column_type()
+    current_storage, current_dimensions = parse_column_type(current)
+    target = target or current_storage
+    dimensions = dimensions or current_dimensions
+    if target not in VECTOR_STORAGES:
+        raise ValueError(f"Unsupported storage {target!r}; expected one of {VECTOR_STORAGES}")
+    if dimensions > current_dimensions:
+        raise ValueError(f"Cannot grow {current} to {dimensions} dimensions; re-embed the documents instead.")
+    manager = VectorIndexManager(storage=target, dimensions=dimensions)
+    statements = langchain_statements(dimensions)
+    if (target, dimensions) == (current_storage, current_dimensions) and not statements:
+        print(f"{manager.table}.{manager.column} is already {current}.")
+        return
+
+    partial_indexes = []
+    if (target, dimensions) != (current_storage, current_dimensions):
+        partial_indexes = manager.partial_indexes()
+        statements = migration_statements(manager, current_dimensions) + statements
+    if dry_run:
+        for statement in statements:
+            print(statement + ";")
+        print(f"-- then: {manager.index_name('hnsw', metric, quantization)}")
+        for spec in partial_indexes:
+            print(f"-- then: {manager.index_name(spec['method'], spec['metric'], spec['quantization'], spec['suffix'])}"
+                  f" WHERE {spec['where']}")
+        return
+
+    print(f"Before ({current}):")
+    print_sizes(relation_sizes(manager.table))
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for statement in statements:
+            print(statement)
+            connection.execute(text(statement))
+    print(f"Column converted in {time.perf_counter() - start:.1f}s; building index...")
+    manager.create_index(metric=metric, quantization=quantization, maintenance_work_mem=maintenance_work_mem)
+    for spec in partial_indexes:
+        manager.create_index(maintenance_work_mem=maintenance_work_mem, **spec)
+    print(f"After ({manager.column_type()}), {time.perf_counter() - start:.1f}s total:")
+    print_sizes(relation_sizes(manager.table))
+    settings = [f"VECTOR_STORAGE={target}", f"EMBEDDING_DIMENSIONS={dimensions}"]
+    if quantization != "none":
+        settings.append(f"VECTOR_QUANTIZATION={quantization}")
+    print(f"Set {', '.join(settings)} before restarting the app.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the embeddings column between vector and halfvec storage, or shrink it.")
+    parser.add_argument("--to", choices=VECTOR_STORAGES, help="Target storage type (default: keep)")
+    parser.add_argument("--dimensions", type=int, default=None, help="Truncate to this many dimensions (default: keep)")
+    parser.add_argument("--report", action="store_true", help="Only print the column type and table/index sizes")
+    parser.add_argument("--metric", choices=list(OPERATOR_CLASSES), default=DEFAULT_METRIC)
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=DEFAULT_QUANTIZATION)
+    parser.add_argument("--dry-run", action="store_true", help="Print the DDL without running it")
+    parser.add_argument("--maintenance-work-mem", default=None, help="e.g. 2GB, speeds up the index build")
+    args = parser.parse_args()
+
+    if args.report or not (args.to or args.dimensions):
+        print(f"embeddings.embedding is {VectorIndexManager().column_type()}")
+        print_sizes(relation_sizes())
+    else:
+        migrate(args.to, args.dimensions, metric=args.metric, quantization=args.quantization, dry_run=args.dry_run,
+                maintenance_work_mem=args.maintenance_work_mem)
@@ -1,15 +1,24 @@
 # db/models.py
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Text,Boolean,JSON
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, Text,Boolean,JSON,Index,Computed,func
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship, declarative_base
 from sqlalchemy.types import UserDefinedType
 
+from src.db.config import EMBEDDING_DIMENSIONS, VECTOR_STORAGE
+
 Base = declarative_base()
 
 class Vector(UserDefinedType):
-    """Custom type to represent pgvector's VECTOR data type."""
+    """Custom type to represent pgvector's VECTOR (float32) or HALFVEC (float16) data type."""
+
+    cache_ok = True
+
+    def __init__(self, dimensions=EMBEDDING_DIMENSIONS, storage=VECTOR_STORAGE):
+        self.dimensions = dimensions  # EMBEDDING_DIMENSIONS, the configured embedding size
+        self.storage = storage
 
     def get_col_spec(self):
-        return "VECTOR(1536)"  # Adjust dimension as needed (e.g., 1536 for OpenAI embeddings)
+        return f"{self.storage.upper()}({self.dimensions})"
 
 
 # Define the tables
@@ -52,7 +61,8 @@ class Resource(Base):
     permissions_allowed = Column(String, nullable=False)
     category_id = Column(Integer, ForeignKey('categories.category_id'), nullable=False)
     resource_name = Column(String, nullable=False)
-    path = Column(String, nullable=False)
+    path = Column(String, nullable=False, index=True)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the source file
 
     # Define relationships
     sub_section = relationship("SubSection")
@@ -70,4 +80,28 @@ class Embeddings(Base):
     content = Column(Text, nullable=False)
     summary = Column(Boolean, nullable=True)
     cmetadata = Column(JSON, nullable=True)
-    resource = relationship("Resource", back_populates="embeddings")  # Relationship back to Resource
\ No newline at end of file
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the chunk text
+    # Full-text search vector; deferred so the ORM works on older tables until migrate_text_search adds it
+    content_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True)))
+    # Copies of the resource's filter attributes, so filtered searches need no join (kept in sync by DatabaseManager)
+    permissions_allowed = Column(String, nullable=True)
+    category_id = Column(Integer, nullable=True)
+    sub_section_id = Column(Integer, nullable=True)
+    learning_type_id = Column(Integer, nullable=True)
+    # Time of the last insert or update (transaction start); drives incremental local search refreshes
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=True)
+    resource = relationship("Resource", back_populates="embeddings")  # Relationship back to Resource
+
+    __table_args__ = (
+        Index("ix_embeddings_resource_id_content_hash", "resource_id", "content_hash"),
+        Index("ix_embeddings_content_tsv", "content_tsv", postgresql_using="gin"),
+        Index("ix_embeddings_category_id_sub_section_id", "category_id", "sub_section_id"),
+        Index("ix_embeddings_sub_section_id", "sub_section_id"),
+        Index("ix_embeddings_learning_type_id", "learning_type_id"),
+        Index("ix_embeddings_permissions_allowed", "permissions_allowed"),
+        Index("ix_embeddings_updated_at", "updated_at"),
+    )
+    __mapper_args__ = {"eager_defaults": False}  # Do not fetch content_tsv back after inserts
+
+# Resource attributes copied onto every chunk row
+EMBEDDING_FILTER_COLUMNS = ("permissions_allowed", "category_id", "sub_section_id", "learning_type_id")
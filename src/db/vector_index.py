@@ -0,0 +1,357 @@
+# db/vector_index.py
+"""Management of pgvector ANN indexes (HNSW / IVFFlat) on the embeddings table.
+
+Usage:
+    python -m src.db.vector_index list
+    python -m src.db.vector_index create --method hnsw --metric l2 --m 16 --ef-construction 64
+    python -m src.db.vector_index create --method ivfflat --metric cosine --lists 200
+    python -m src.db.vector_index rebuild --method hnsw --metric l2
+    python -m src.db.vector_index drop --method hnsw --metric l2
+    python -m src.db.vector_index create --quantization binary
+    python -m src.db.vector_index create --partition-by permissions_allowed
+    python -m src.db.vector_index drop --suffix permissions_allowed_free
+"""
+import argparse
+import math
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from src.db.config import engine, EMBEDDING_DIMENSIONS, VECTOR_ITERATIVE_SCAN, VECTOR_METRIC, VECTOR_QUANTIZATION, VECTOR_STORAGE
+from src.db.models import EMBEDDING_FILTER_COLUMNS
+
+# Distance operator and index operator class for each supported metric
+DISTANCE_OPERATORS = {"l2": "<->", "cosine": "<=>", "inner_product": "<#>"}
+OPERATOR_CLASSES = {"l2": "vector_l2_ops", "cosine": "vector_cosine_ops", "inner_product": "vector_ip_ops"}
+INDEX_METHODS = ("hnsw", "ivfflat")
+VECTOR_STORAGES = ("vector", "halfvec")
+QUANTIZATIONS = ("none", "binary")
+ITERATIVE_SCAN_MODES = ("off", "relaxed_order", "strict_order")
+
+DEFAULT_INDEX_METHOD = "hnsw"
+DEFAULT_METRIC = VECTOR_METRIC
+DEFAULT_STORAGE = VECTOR_STORAGE
+DEFAULT_QUANTIZATION = VECTOR_QUANTIZATION
+DEFAULT_ITERATIVE_SCAN = VECTOR_ITERATIVE_SCAN
+
+
+def validate(method, metric, quantization="none"):
+    if method not in INDEX_METHODS:
+        raise ValueError(f"Unsupported index method {method!r}; expected one of {INDEX_METHODS}")
+    if metric not in OPERATOR_CLASSES:
+        raise ValueError(f"Unsupported distance metric {metric!r}; expected one of {tuple(OPERATOR_CLASSES)}")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unsupported quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+
+
+def operator_class(metric, storage=DEFAULT_STORAGE):
+    """Index operator class for `metric` on a `storage` column, e.g. halfvec_cosine_ops."""
+    return OPERATOR_CLASSES[metric].replace("vector", storage, 1)
+
+
+def sql_literal(value):
+    """Inline SQL for an int or string value, for index predicates and the queries that must match them."""
+    if isinstance(value, int):
+        return str(int(value))
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def binary_quantized(column_sql, dimensions=EMBEDDING_DIMENSIONS):
+    """SQL for the 1-bit-per-dimension form of a vector column, as the binary index stores it."""
+    return f"binary_quantize({column_sql})::bit({dimensions})"
+
+
+def query_vector(parameter="%(query_embedding)b", storage=DEFAULT_STORAGE):
+    """SQL for a bound query vector (sent as float32 `vector`) cast to the column's storage type."""
+    return parameter if storage == "vector" else f"{parameter}::{storage}"
+
+
+def similarity_from_distance(distance, metric=DEFAULT_METRIC):
+    """Convert a pgvector distance into cosine similarity (1 = same direction, higher is closer).
+
+    Exact for unit-length embeddings, which OpenAI and the local backend produce, so scores
+    are comparable whichever metric a search used: L2 distance d gives 1 - d^2 / 2, cosine
+    distance d gives 1 - d, and `<#>` returns the negated inner product.
+    """
+    if distance is None:
+        return None
+    if metric == "l2":
+        return 1.0 - distance * distance / 2.0
+    if metric == "cosine":
+        return 1.0 - distance
+    if metric == "inner_product":
+        return -distance
+    raise ValueError(f"Unsupported distance metric {metric!r}; expected one of {tuple(OPERATOR_CLASSES)}")
+
+
+@contextmanager
+def search_settings(cursor, ef_search=None, probes=None, iterative_scan=None, exact=False):
+    """Apply per-query ANN settings for the duration of a search and restore them afterwards.
+
+    `ef_search` tunes HNSW recall/latency, `probes` tunes IVFFlat. `iterative_scan`
+    ("relaxed_order" / "strict_order") lets a filtered index scan continue until enough
+    rows pass the filters; "relaxed_order" may return rows slightly out of order, so
+    callers re-sort. `exact` disables index scans, so the planner filters with bitmap
+    scans on the B-tree indexes and sorts the matching rows by exact distance. Settings
+    are transaction-local and reset to their previous values on exit, so a long-lived
+    session does not leak one query's tuning into the next.
+    """
+    settings = {}
+    if ef_search is not None:
+        settings["hnsw.ef_search"] = int(ef_search)
+    if probes is not None:
+        settings["ivfflat.probes"] = int(probes)
+    if iterative_scan is not None:
+        if iterative_scan not in ITERATIVE_SCAN_MODES:
+            raise ValueError(f"iterative_scan must be one of {ITERATIVE_SCAN_MODES}, got {iterative_scan!r}")
+        settings["hnsw.iterative_scan"] = iterative_scan
+        settings["ivfflat.iterative_scan"] = "off" if iterative_scan == "off" else "relaxed_order"  # IVFFlat has no strict mode
+    if exact:
+        settings["enable_indexscan"] = "off"
+
+    previous = {}
+    for name, value in settings.items():
+        cursor.execute("SELECT current_setting(%s, true), set_config(%s, %s, true)", (name, name, str(value)))
+        previous[name] = cursor.fetchone()[0]
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is not None:
+                cursor.execute("SELECT set_config(%s, %s, true)", (name, value))
+
+
+class VectorIndexManager:
+    """Create, rebuild, drop and list ANN indexes on a vector column.
+
+    With quantization "binary" the index is built over binary_quantize(column) with
+    Hamming distance, independent of the metric; it is 32x smaller than a float32 index
+    and is meant for a coarse first pass that is re-ranked on the stored vectors.
+    """
+
+    def __init__(self, table="embeddings", column="embedding", storage=DEFAULT_STORAGE, dimensions=EMBEDDING_DIMENSIONS):
+        self.table = table
+        self.column = column
+        self.storage = storage
+        self.dimensions = dimensions
+
+    def index_name(self, method, metric, quantization="none", suffix=None):
+        kind = "binary" if quantization == "binary" else metric
+        suffix = f"_{suffix}" if suffix else ""
+        return f"{self.table}_{self.column}_{method}_{kind}{suffix}_idx"
+
+    def index_key(self, metric, quantization="none"):
+        if quantization == "binary":
+            return f"({binary_quantized(self.column, self.dimensions)}) bit_hamming_ops"
+        return f"{self.column} {operator_class(metric, self.storage)}"
+
+    def column_type(self):
+        """The column's current SQL type, e.g. 'vector(1536)' or 'halfvec(1536)'; None if the table does not exist."""
+        with engine.connect() as connection:
+            return connection.execute(
+                text(
+                    "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                    "WHERE attrelid = to_regclass(:table) AND attname = :column AND NOT attisdropped"
+                ),
+                {"table": self.table, "column": self.column},
+            ).scalar()
+
+    def _execute(self, statement, settings=None):
+        """Run DDL outside a transaction block, as CONCURRENTLY requires.
+
+        `settings` are session-level there, so they are reset before the connection goes
+        back to the pool.
+        """
+        settings = settings or {}
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            try:
+                for name, value in settings.items():
+                    connection.execute(text("SELECT set_config(:name, :value, false)"), {"name": name, "value": value})
+                connection.execute(text(statement))
+            finally:
+                for name in settings:
+                    connection.execute(text(f"RESET {name}"))
+
+    def count_rows(self):
+        with engine.connect() as connection:
+            return connection.execute(text(f"SELECT count(*) FROM {self.table}")).scalar()
+
+    def default_lists(self):
+        """pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond that."""
+        rows = self.count_rows()
+        if rows <= 1_000_000:
+            return max(1, rows // 1000)
+        return int(math.sqrt(rows))
+
+    def create_index(self, method=DEFAULT_INDEX_METHOD, metric=DEFAULT_METRIC, m=16, ef_construction=64, lists=None, concurrently=False, maintenance_work_mem=None, quantization="none", where=None, suffix=None):
+        """Create an HNSW or IVFFlat index using the operator class that matches `metric` and the column storage.
+
+        `where` makes it a partial index over the rows matching that predicate, named with `suffix`.
+        """
+        validate(method, metric, quantization)
+        if method == "hnsw":
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            options = f"lists = {int(lists or self.default_lists())}"
+        name = self.index_name(method, metric, quantization, suffix)
+        statement = (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+            f"ON {self.table} USING {method} ({self.index_key(metric, quantization)}) WITH ({options})"
+        )
+        if where:
+            statement += f" WHERE {where}"
+        settings = {"maintenance_work_mem": maintenance_work_mem} if maintenance_work_mem else None
+        self._execute(statement, settings)
+        print(f"Index {name} created.")
+        return name
+
+    def create_partial_indexes(self, column, method=DEFAULT_INDEX_METHOD, metric=DEFAULT_METRIC, quantization="none", **options):
+        """Create one partial ANN index per distinct value of a low-cardinality filter column.
+
+        A search filtered on `column = value` (with the value inlined, as search_documents
+        does for permissions) then walks a graph of only the matching rows, so a
+        restrictive filter neither starves the result list nor scans extra rows.
+        """
+        if column not in EMBEDDING_FILTER_COLUMNS:
+            raise ValueError(f"Unsupported filter column {column!r}; expected one of {EMBEDDING_FILTER_COLUMNS}")
+        with engine.connect() as connection:
+            values = connection.execute(
+                text(f"SELECT DISTINCT {column} FROM {self.table} WHERE {column} IS NOT NULL ORDER BY 1")
+            ).scalars().all()
+        names = []
+        for value in values:
+            suffix = f"{column}_" + "".join(char if char.isalnum() else "_" for char in str(value).lower())
+            names.append(self.create_index(method, metric, quantization=quantization,
+                                           where=f"{column} = {sql_literal(value)}", suffix=suffix, **options))
+        return names
+
+    def rebuild_index(self, method=DEFAULT_INDEX_METHOD, metric=DEFAULT_METRIC, concurrently=False, quantization="none", suffix=None):
+        """Rebuild an existing index, e.g. after a bulk load degraded an IVFFlat clustering.
+
+        `suffix` selects a partial index, as named by `create_partial_indexes`.
+        """
+        validate(method, metric, quantization)
+        name = self.index_name(method, metric, quantization, suffix)
+        self._execute(f"REINDEX INDEX {'CONCURRENTLY ' if concurrently else ''}{name}")
+        print(f"Index {name} rebuilt.")
+
+    def drop_index(self, method=DEFAULT_INDEX_METHOD, metric=DEFAULT_METRIC, concurrently=False, quantization="none", suffix=None):
+        validate(method, metric, quantization)
+        name = self.index_name(method, metric, quantization, suffix)
+        self._execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}")
+        print(f"Index {name} dropped.")
+
+    def list_indexes(self):
+        """Return {index_name: index_definition} for the ANN indexes on the table."""
+        with engine.connect() as connection:
+            rows = connection.execute(
+                text(
+                    "SELECT indexname, indexdef FROM pg_indexes "
+                    "WHERE tablename = :table AND (indexdef ILIKE '%USING hnsw%' OR indexdef ILIKE '%USING ivfflat%')"
+                ),
+                {"table": self.table},
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def parse_index_name(self, name):
+        """Return {"method", "metric", "quantization", "suffix"} for a name made by `index_name`, or None."""
+        for method in INDEX_METHODS:
+            for kind in (*OPERATOR_CLASSES, "binary"):
+                match = re.fullmatch(rf"{self.table}_{self.column}_{method}_{kind}(?:_(\w+))?_idx", name)
+                if match:
+                    metric, quantization = (DEFAULT_METRIC, "binary") if kind == "binary" else (kind, "none")
+                    return {"method": method, "metric": metric, "quantization": quantization, "suffix": match.group(1)}
+        return None
+
+    def partial_indexes(self):
+        """Return create_index arguments for each partial ANN index on the table.
+
+        Used to rebuild them after the column type changes, since their operator class
+        (and the binary_quantize expression) depends on the storage and dimensions.
+        """
+        specs = []
+        for name, definition in sorted(self.list_indexes().items()):
+            spec = self.parse_index_name(name)
+            if spec is None or " WHERE " not in definition:
+                continue
+            head, spec["where"] = definition.split(" WHERE ", 1)
+            options = re.search(r" WITH \(([^)]*)\)", head)
+            for option, value in re.findall(r"(\w+)='?(\d+)'?", options.group(1) if options else ""):
+                if option in ("m", "ef_construction", "lists"):
+                    spec[option] = int(value)
+            specs.append(spec)
+        return specs
+
+    def missing_default_index(self, metric=DEFAULT_METRIC, quantization=DEFAULT_QUANTIZATION):
+        """Return the operator class no ANN index provides for the configured search, or None.
+
+        An index only accelerates queries using its own operator, so switching the metric
+        or quantization needs a matching index. Raises if the column type differs from
+        VECTOR_STORAGE / EMBEDDING_DIMENSIONS.
+        """
+        validate(DEFAULT_INDEX_METHOD, metric, quantization)
+        column_type = self.column_type()
+        expected_type = f"{self.storage}({self.dimensions})"
+        if column_type is not None and column_type != expected_type:
+            raise RuntimeError(
+                f"{self.table}.{self.column} is {column_type} but VECTOR_STORAGE and EMBEDDING_DIMENSIONS expect "
+                f"{expected_type}; run `python -m src.db.migrate_vectors --to {self.storage} --dimensions {self.dimensions}` "
+                f"or change the settings."
+            )
+        needed = "bit_hamming_ops" if quantization == "binary" else operator_class(metric, self.storage)
+        full_indexes = [definition for definition in self.list_indexes().values() if " WHERE " not in definition]
+        return None if any(needed in definition for definition in full_indexes) else needed
+
+    def ensure_default_index(self, metric=DEFAULT_METRIC, quantization=DEFAULT_QUANTIZATION, concurrently=True, maintenance_work_mem=None):
+        """Create the default HNSW index if `missing_default_index` reports one is needed.
+
+        Built CONCURRENTLY by default so writes continue during the build; an old index
+        is left for `drop` once it is no longer used.
+        """
+        if self.missing_default_index(metric, quantization):
+            return self.create_index(metric=metric, quantization=quantization, concurrently=concurrently,
+                                     maintenance_work_mem=maintenance_work_mem)
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage ANN indexes on the embeddings table.")
+    parser.add_argument("action", choices=["list", "ensure", "create", "rebuild", "drop"])
+    parser.add_argument("--method", choices=INDEX_METHODS, default=DEFAULT_INDEX_METHOD)
+    parser.add_argument("--metric", choices=list(OPERATOR_CLASSES), default=DEFAULT_METRIC)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--concurrently", action="store_true")
+    parser.add_argument("--maintenance-work-mem", default=None, help="e.g. 2GB, speeds up HNSW builds")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=None,
+                        help="binary: index binary_quantize(embedding) for re-ranked search (default: none; ensure: VECTOR_QUANTIZATION)")
+    parser.add_argument("--partition-by", choices=EMBEDDING_FILTER_COLUMNS, default=None,
+                        help="create: one partial index per distinct value of this filter column")
+    parser.add_argument("--suffix", default=None,
+                        help="rebuild/drop: the partial index with this suffix, e.g. permissions_allowed_free (see list)")
+    args = parser.parse_args()
+
+    manager = VectorIndexManager()
+    quantization = args.quantization or "none"
+    if args.action == "list":
+        for name, definition in manager.list_indexes().items():
+            print(f"{name}: {definition}")
+    elif args.action == "ensure":
+        # The build the app leaves to the operator; always CONCURRENTLY
+        if manager.ensure_default_index(args.metric, args.quantization or DEFAULT_QUANTIZATION,
+                                        maintenance_work_mem=args.maintenance_work_mem) is None:
+            print("The default index already exists.")
+    elif args.action == "create" and args.partition_by:
+        manager.create_partial_indexes(args.partition_by, args.method, args.metric, quantization=quantization,
+                                       m=args.m, ef_construction=args.ef_construction, lists=args.lists,
+                                       concurrently=args.concurrently, maintenance_work_mem=args.maintenance_work_mem)
+    elif args.action == "create":
+        manager.create_index(args.method, args.metric, m=args.m, ef_construction=args.ef_construction,
+                             lists=args.lists, concurrently=args.concurrently,
+                             maintenance_work_mem=args.maintenance_work_mem, quantization=quantization)
+    elif args.action == "rebuild":
+        manager.rebuild_index(args.method, args.metric, concurrently=args.concurrently, quantization=quantization, suffix=args.suffix)
+    else:
+        manager.drop_index(args.method, args.metric, concurrently=args.concurrently, quantization=quantization, suffix=args.suffix)
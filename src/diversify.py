@@ -0,0 +1,99 @@
+"""Result diversification for similarity search: MMR, per-resource caps and collapsing.
+
+All stages work on a candidate list fetched once (dicts as returned by
+`DatabaseManager.search_documents`, best first). MMR is vectorized: each step scores
+every remaining candidate with one matrix-vector product against the chunk picked
+last, so a pool of a few hundred candidates costs about a millisecond.
+"""
+import numpy as np
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def mmr(query_embedding, candidate_embeddings, k, lambda_mult=0.5, groups=None, max_per_group=None):
+    """Maximal marginal relevance: indices of up to `k` candidates, in selection order.
+
+    Each pick maximizes lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, picked),
+    with cosine similarities; lambda_mult = 1 is plain relevance ranking, lower values
+    trade relevance for diversity. With `groups` (one label per candidate), at most
+    `max_per_group` candidates are picked from each group.
+    """
+    candidates = _unit_rows(np.asarray(candidate_embeddings, dtype=np.float32))
+    if not len(candidates) or k <= 0:
+        return []
+    query = _unit_rows(np.asarray(query_embedding, dtype=np.float32))
+    relevance = lambda_mult * (candidates @ query)
+    redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    labels = np.asarray(groups) if groups is not None and max_per_group else None
+    picked_per_group = {}
+    selected = []
+    while len(selected) < k and available.any():
+        scores = relevance - (1 - lambda_mult) * redundancy if selected else relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, candidates @ candidates[best])
+        if labels is not None:
+            group = labels[best]
+            picked_per_group[group] = picked_per_group.get(group, 0) + 1
+            if picked_per_group[group] >= max_per_group:
+                available &= labels != group
+    return selected
+
+
+def cap_per_resource(results, max_per_resource, limit=None):
+    """Keep at most `max_per_resource` results per resource, preserving order."""
+    counts = {}
+    kept = []
+    for result in results:
+        resource = result["resource_id"]
+        if counts.get(resource, 0) < max_per_resource:
+            counts[resource] = counts.get(resource, 0) + 1
+            kept.append(result)
+            if limit is not None and len(kept) == limit:
+                break
+    return kept
+
+
+def collapse_by_resource(results, candidates=None):
+    """Attach to each result all matching chunks of its resource, in document order.
+
+    `results` holds one chunk per resource (e.g. from `cap_per_resource(..., 1)`);
+    each gets a `chunks` list (id, chunk_order, content, similarity) gathered from
+    `candidates` (default: `results`) and sorted by chunk_order, so callers can show
+    the matches in context.
+    """
+    groups = {}
+    for candidate in results if candidates is None else candidates:
+        groups.setdefault(candidate["resource_id"], []).append(candidate)
+    collapsed = []
+    for result in results:
+        hits = groups.get(result["resource_id"], [result])
+        collapsed.append(dict(result, chunks=[
+            {key: hit[key] for key in ("id", "chunk_order", "content", "similarity")}
+            for hit in sorted(hits, key=lambda hit: hit["chunk_order"])
+        ]))
+    return collapsed
+
+
+def diversify(results, query_embedding, limit, embeddings=None, mmr_lambda=None, max_per_resource=None, collapse=False):
+    """Pick `limit` results from a best-first candidate list.
+
+    `mmr_lambda` re-ranks by MMR (needs `embeddings`, one per result), `max_per_resource`
+    caps the results per resource, and `collapse` returns one result per resource with
+    its matching chunks attached.
+    """
+    per_resource = 1 if collapse else max_per_resource
+    if mmr_lambda is not None:
+        groups = [result["resource_id"] for result in results]
+        selected = [results[index] for index in mmr(query_embedding, embeddings, limit, mmr_lambda, groups, per_resource)]
+    elif per_resource:
+        selected = cap_per_resource(results, per_resource, limit)
+    else:
+        selected = results[:limit]
+    return collapse_by_resource(selected, results) if collapse else selected
@@ -1,24 +1,37 @@
 import openai
 import os
-import tempfile
-import base64
 from dotenv import load_dotenv
-from moviepy.editor import VideoFileClip
 from youtube_transcript_api import YouTubeTranscriptApi
-from langchain_community.document_loaders import PyMuPDFLoader, Docx2txtLoader, TextLoader
+from langchain_community.document_loaders import PyMuPDFLoader, Docx2txtLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.docstore.document import Document
 
 from pptx import Presentation
 from pathlib import Path
 
 import re
-from PIL import Image
+import hashlib
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src.cache import get_image_analysis_cache, get_summary_cache
+from src.embeddings import BatchEmbedder, TokenCounter
+from src.image_preprocessor import prepare_image
+from src.transcription import SegmentedTranscriber
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+TEXT_EXTENSIONS = (".pdf", ".docx", ".doc", ".txt", ".pptx")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+MEDIA_EXTENSIONS = (".mp4", ".mp3", ".wav", ".m4a")
+
 class UniversalDocumentProcessor:
-    def __init__(self):
+    def __init__(self, embedding_backend=None, embedding_batch_size=100, embedding_max_batch_tokens=250_000,
+                 summary_max_tokens=100_000, summary_group_tokens=8_000, summary_concurrency=8,
+                 transcription_backend=None, transcription_segment_seconds=600, transcription_concurrency=4,
+                 image_detail="low"):
         self.input_token_cost = 0.150 / 1_000_000
         self.output_token_cost = 0.600 / 1_000_000
         self.transcription_cost_per_minute = 0.006
@@ -26,9 +39,35 @@ class UniversalDocumentProcessor:
             chunk_size=700,
             chunk_overlap=50,
         )
+        self.embedder = BatchEmbedder(
+            backend=embedding_backend,
+            batch_size=embedding_batch_size,
+            max_batch_tokens=embedding_max_batch_tokens,
+        )
+        # Texts above summary_max_tokens are summarized map-reduce style, in groups of summary_group_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_group_tokens = summary_group_tokens
+        self.summary_concurrency = summary_concurrency
+        self.count_tokens = TokenCounter("o200k_base")
+        self.summary_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=summary_group_tokens,
+            chunk_overlap=0,
+            length_function=self.count_tokens,
+        )
+        self.summary_cache = get_summary_cache()
+        # Images are downscaled to what the model sees at `image_detail`; near-duplicates reuse an analysis
+        self.image_detail = image_detail
+        self.image_cache = get_image_analysis_cache()
+        # Recordings are encoded once, cut into segments and transcribed concurrently
+        self.transcriber = SegmentedTranscriber(
+            backend=transcription_backend,
+            max_segment_seconds=transcription_segment_seconds,
+            concurrency=transcription_concurrency,
+        )
 
-    def load_document(self, doc_path: str):
-        
+    def load_document(self, doc_path: str, stream=False):
+        """Return a processed result dict for URLs, images and recordings, and the text of
+        a text document (with `stream`, its lazily read units instead)."""
         if self.is_url(doc_path):
             if "youtube.com" in doc_path or "youtu.be" in doc_path:
                 return self.process_youtube_video(doc_path)
@@ -40,24 +79,71 @@ class UniversalDocumentProcessor:
         if not Path(doc_path).is_file():
             raise ValueError(f"File path {doc_path} is not a valid file.")
         doc_path = str(doc_path)
+        if doc_path.endswith(MEDIA_EXTENSIONS):
+            return self.process_video(doc_path)
+        elif doc_path.endswith(IMAGE_EXTENSIONS):
+            return self.process_image(doc_path)
+        return self.iter_units(doc_path) if stream else self.load_text(doc_path)
+
+    def load_text(self, doc_path):
+        """Extract the text of a PDF, Word, text or PowerPoint file (no API calls)."""
+        return "\n\n".join(unit.page_content for unit in self.iter_units(doc_path))
+
+    def iter_units(self, doc_path, section_chars=4000):
+        """Lazily yield a text document as Documents, one per page, slide or section.
+
+        Each unit carries its source position in the metadata: `page` (1-based) for PDFs,
+        `slide` (1-based) for PowerPoint and `section` (0-based) for Word and text files,
+        which are cut at paragraph breaks once a section reaches `section_chars` (and at
+        a line break, or mid-line, by twice that size when no paragraph break comes).
+        Only one unit needs to be in memory at a time (Word files are read whole by docx2txt).
+        """
+        doc_path = str(doc_path)
         if doc_path.endswith(".pdf"):
-            loader = PyMuPDFLoader(doc_path)
+            for page in PyMuPDFLoader(doc_path).lazy_load():
+                yield Document(page_content=page.page_content, metadata={"source": doc_path, "page": page.metadata.get("page", 0) + 1})
         elif doc_path.endswith('.docx') or doc_path.endswith('.doc'):
-            loader = Docx2txtLoader(doc_path)
+            for doc in Docx2txtLoader(doc_path).lazy_load():
+                yield from self._iter_sections(doc_path, doc.page_content.splitlines(keepends=True), section_chars)
         elif doc_path.endswith('.txt'):
-            loader = TextLoader(doc_path)
+            with open(doc_path) as text_file:
+                # readline(limit) bounds memory for files with very long or no line breaks
+                lines = iter(lambda: text_file.readline(section_chars), "")
+                yield from self._iter_sections(doc_path, lines, section_chars)
         elif doc_path.endswith('.pptx'):
-            return self.load_pptx(doc_path)
-        elif doc_path.endswith('.mp4'):
-            return self.process_video(doc_path)
-        elif doc_path.endswith(('.jpg', '.jpeg', '.png')):
-            return self.process_image(doc_path)
-        
+            yield from self.iter_pptx_slides(doc_path)
         else:
             raise ValueError("Unsupported file format")
-        
-        docs = loader.load()
-        return "\n\n".join(doc.page_content for doc in docs)
+
+    def _iter_sections(self, doc_path, lines, section_chars):
+        buffer, size, section = [], 0, 0
+        for line in lines:
+            paragraph_break = not line.strip()
+            if size >= section_chars and (paragraph_break or size + len(line) > 2 * section_chars):
+                yield Document(page_content="".join(buffer).strip("\n"), metadata={"source": doc_path, "section": section})
+                buffer, size, section = [], 0, section + 1
+                if paragraph_break:
+                    continue
+            buffer.append(line)
+            size += len(line)
+        if buffer:
+            yield Document(page_content="".join(buffer).strip("\n"), metadata={"source": doc_path, "section": section})
+
+    def iter_pptx_slides(self, path):
+        """Yield one Document per slide that has text, with its 1-based slide number."""
+        prs = Presentation(path)
+        for index, slide in enumerate(prs.slides, 1):
+            content = [shape.text for shape in slide.shapes if hasattr(shape, "text")]
+            if content:
+                yield Document(page_content="\n\n".join(content), metadata={"source": str(path), "slide": index})
+
+    def iter_chunks(self, doc_path, units=None):
+        """Stream a text document (or its already loaded `units`) through the splitter.
+
+        Chunks inherit each unit's position metadata.
+        """
+        for unit in self.iter_units(doc_path) if units is None else units:
+            yield from self.text_splitter.split_documents([unit])
 
     def is_url(self, path):
         # Check if path is a URL
@@ -65,27 +151,22 @@ class UniversalDocumentProcessor:
         return re.match(url_regex, path) is not None
 
     def load_pptx(self, path):
-        prs = Presentation(path)
-        content = []
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    content.append(shape.text)
-        return "\n\n".join(content)
+        return "\n\n".join(slide.page_content for slide in self.iter_pptx_slides(path))
 
-    def encode_image(self, image_path):
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    def image_cache_namespace(self):
+        return f"image-analysis:gpt-4o-mini:{self.image_detail}"
 
     def process_image(self, image_path):
-        # Get the resolution of the image
-        with Image.open(image_path) as img:
-            width, height = img.size
-
-        # Encode image to base64 for GPT processing
-        base64_image = self.encode_image(image_path)
-        prompt = self.get_image_prompt()
-        result, prompt_tokens, completion_tokens = self.ask_gpt(prompt, image=base64_image)
+        # Downscale, re-encode and fingerprint the image before anything is sent
+        image = prepare_image(image_path, detail=self.image_detail)
+        width, height = image["original_size"]
+
+        result = self.image_cache.get(self.image_cache_namespace(), image["digest"], image["hash"])
+        if result is not None:
+            prompt_tokens, completion_tokens = 0, 0
+        else:
+            result, prompt_tokens, completion_tokens = self.ask_gpt(self.get_image_prompt(), image=image["data"], mime_type=image["mime_type"])
+            self.image_cache.set(self.image_cache_namespace(), image["digest"], result, image["hash"])
         model_cost = self.calculate_model_cost(prompt_tokens, completion_tokens)
         
         return {
@@ -98,10 +179,17 @@ class UniversalDocumentProcessor:
         }
 
     def process_video(self, video_path):
-        audio_path = self.extract_audio_from_video(video_path)
-        transcript_text = self.transcribe_audio_whisper(audio_path)
-        summary, prompt_tokens, completion_tokens = self.summarize_text(transcript_text)
-        audio_duration_minutes = self.get_audio_duration_in_minutes(video_path)
+        """Transcribe a video or audio file segment by segment, then summarize the timestamped transcript."""
+        transcript = self.transcriber.transcribe(video_path)
+        return self.process_transcript(transcript)
+
+    def process_transcript(self, transcript):
+        summary, prompt_tokens, completion_tokens = self.summarize_text(transcript["text"])
+        return self.transcript_result(transcript, summary, prompt_tokens, completion_tokens)
+
+    def transcript_result(self, transcript, summary, prompt_tokens, completion_tokens):
+        transcript_text = transcript["text"]
+        audio_duration_minutes = transcript["duration_seconds"] / 60
         transcription_cost = self.calculate_whisper_cost(audio_duration_minutes)
         model_cost = self.calculate_model_cost(prompt_tokens, completion_tokens)
         
@@ -110,15 +198,19 @@ class UniversalDocumentProcessor:
             "original_text": transcript_text,
             "summary": summary,
             "audio_duration_minutes": audio_duration_minutes,
+            "transcript_segments": transcript["segments"],
             "prompt_tokens": prompt_tokens,
             "completion_tokens": completion_tokens,
             "cost": total_cost
         }
 
-    def process_youtube_video(self, video_url):
+    def get_youtube_transcript(self, video_url):
         video_id = video_url.split('v=')[-1].split('&')[0]
         transcript = YouTubeTranscriptApi.get_transcript(video_id)
-        transcript_text = " ".join([entry['text'] for entry in transcript])
+        return " ".join([entry['text'] for entry in transcript])
+
+    def process_youtube_video(self, video_url):
+        transcript_text = self.get_youtube_transcript(video_url)
         summary, prompt_tokens, completion_tokens = self.summarize_text(transcript_text)
         model_cost = self.calculate_model_cost(prompt_tokens, completion_tokens)
 
@@ -130,26 +222,11 @@ class UniversalDocumentProcessor:
             "cost": model_cost
         }
 
-    def extract_audio_from_video(self, video_path):
-        video = VideoFileClip(video_path)
-        temp_audio_path = tempfile.mktemp(suffix=".wav")
-        video.audio.write_audiofile(temp_audio_path)
-        return temp_audio_path
-
-    def transcribe_audio_whisper(self, audio_path):
-        with open(audio_path, 'rb') as audio_file:
-            response = openai.audio.transcriptions.create(model = "whisper-1", file=audio_file)
-        return response.text
-
-    def get_audio_duration_in_minutes(self, video_path):
-        video = VideoFileClip(video_path)
-        return video.duration / 60
-
     def calculate_whisper_cost(self, audio_duration_minutes):
         return audio_duration_minutes * self.transcription_cost_per_minute
 
-    def ask_gpt(self, text, image=None):
-       # Construct the message structure with specified format
+    def build_messages(self, text, image=None, mime_type="image/jpeg"):
+        # Construct the message structure with specified format
         message_content = [
             {"type": "text", "text": text}
         ]
@@ -159,23 +236,25 @@ class UniversalDocumentProcessor:
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{image}",
-                        "detail": "low"
+                        "url": f"data:{mime_type};base64,{image}",
+                        "detail": self.image_detail
                     }
                     
                 }
             )
 
         # Prepare the messages for the OpenAI API request
-        messages = [
+        return [
             {
                 "role": "user",
                 "content": message_content
             }
         ]
+
+    def ask_gpt(self, text, image=None, mime_type="image/jpeg"):
         response = openai.chat.completions.create(
             model="gpt-4o-mini",
-            messages=messages
+            messages=self.build_messages(text, image, mime_type)
         )
         answer = response.choices[0].message.content
         prompt_tokens = response.usage.prompt_tokens
@@ -188,10 +267,98 @@ class UniversalDocumentProcessor:
         return input_cost + output_cost
 
     def summarize_text(self, text):
+        if self.count_tokens(text) > self.summary_max_tokens:
+            return self.summarize_long_text(text)
         prompt = self.get_text_prompt(text)
         summary, prompt_tokens, completion_tokens = self.ask_gpt(prompt)
         return summary, prompt_tokens, completion_tokens
 
+    def summarize_long_text(self, text):
+        """Map-reduce summary: summarize token-bounded groups concurrently, then summarize the summaries.
+
+        If the combined partial summaries are still too long, `summarize_text` reduces them again.
+        """
+        return self.summarize_parts(self.summary_splitter.split_text(text))
+
+    def summarize_parts(self, parts):
+        """Map and reduce over an iterable of parts, with at most `summary_concurrency` parts in flight."""
+        partials, in_flight = [], deque()
+        with ThreadPoolExecutor(max_workers=self.summary_concurrency) as pool:
+            for part in parts:
+                in_flight.append(pool.submit(self.summarize_part, part))
+                if len(in_flight) >= self.summary_concurrency:
+                    partials.append(in_flight.popleft().result())
+            partials.extend(future.result() for future in in_flight)
+        return self.reduce_summaries(partials)
+
+    def reduce_summaries(self, partials):
+        summary, prompt_tokens, completion_tokens = self.summarize_text("\n\n".join(partial[0] for partial in partials))
+        prompt_tokens += sum(partial[1] for partial in partials)
+        completion_tokens += sum(partial[2] for partial in partials)
+        return summary, prompt_tokens, completion_tokens
+
+    def iter_summary_windows(self, units):
+        """Group streamed units into (text, tokens) windows of at most `summary_group_tokens`; longer units are split."""
+        buffer, tokens = [], 0
+        for unit in units:
+            count = self.count_tokens(unit.page_content)
+            if count <= self.summary_group_tokens:
+                pieces = [(unit.page_content, count)]
+            else:
+                pieces = [(piece, self.count_tokens(piece)) for piece in self.summary_splitter.split_text(unit.page_content)]
+            for piece, count in pieces:
+                if buffer and tokens + count > self.summary_group_tokens:
+                    yield "\n\n".join(buffer), tokens
+                    buffer, tokens = [], 0
+                buffer.append(piece)
+                tokens += count
+        if buffer:
+            yield "\n\n".join(buffer), tokens
+
+    def read_summary_head(self, windows):
+        """Read windows until they exceed `summary_max_tokens`; returns (texts, whether the document is longer)."""
+        head, tokens = [], 0
+        for text, count in windows:
+            head.append(text)
+            tokens += count
+            if tokens > self.summary_max_tokens:
+                return head, True
+        return head, False
+
+    def summarize_units(self, units):
+        """Summarize a document streamed as units without holding its whole text.
+
+        A document within `summary_max_tokens` is summarized in one request, as
+        `summarize_text` would; a longer one is summarized map-reduce style over token
+        windows, which are summarized while later units are still being read.
+        """
+        windows = self.iter_summary_windows(units)
+        head, longer = self.read_summary_head(windows)
+        if not longer:
+            return self.summarize_text("\n\n".join(head))
+        return self.summarize_parts(itertools.chain(head, (text for text, _ in windows)))
+
+    def summary_cache_key(self, text):
+        return "partial-summary:gpt-4o-mini:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def summarize_part(self, text):
+        """Summarize one group of a long text; cached by content hash, so cache hits cost no tokens."""
+        key = self.summary_cache_key(text)
+        cached = self.summary_cache.get(key)
+        if cached is not None:
+            return cached, 0, 0
+        summary, prompt_tokens, completion_tokens = self.ask_gpt(self.get_partial_summary_prompt(text))
+        self.summary_cache.set(key, summary)
+        return summary, prompt_tokens, completion_tokens
+
+    def get_partial_summary_prompt(self, text):
+        return f"""
+        You are an AI assistant summarizing one section of a longer resource. Summarize the section below so it can later be combined with the summaries of the other sections. Keep the key themes, specific facts, figures, names, programs and acronyms, and any audiences or use cases the section mentions. Do not add information that is not in the text.
+
+        Section to summarize:
+        {text}
+        """
+
     def get_text_prompt(self, text):
         return f"""
         You are an AI assistant specialized in analyzing resources for recommendation systems. Given the text provided, your task is to produce a summary that is highly relevant for recommending the resource in specific contexts. Please perform the following:
@@ -233,13 +400,28 @@ class UniversalDocumentProcessor:
 
     def process(self, doc_path=None):
         if doc_path:
-            original_text = self.load_document(doc_path)
-            if isinstance(original_text, dict):  # Already processed video or image
-                return original_text
+            loaded = self.load_document(doc_path, stream=True)
+            if isinstance(loaded, dict):  # Already processed video or image
+                return loaded
 
         else:
             raise ValueError("Invalid input. Provide a document path of a image, video, or YouTube URL to process.")
 
+        return self.process_units(loaded)
+
+    def process_units(self, units):
+        """Summarize a text document from its streamed units; `original_text` is None, as the text is never joined."""
+        summary, prompt_tokens, completion_tokens = self.summarize_units(units)
+        return {
+            "original_text": None,
+            "summary": summary,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": self.calculate_model_cost(prompt_tokens, completion_tokens)
+        }
+
+    def process_text(self, original_text):
+        """Summarize already-loaded text and report token usage and cost."""
         summary, prompt_tokens, completion_tokens = self.summarize_text(original_text)
         model_cost = self.calculate_model_cost(prompt_tokens, completion_tokens)
 
@@ -251,8 +433,11 @@ class UniversalDocumentProcessor:
             "cost": model_cost
         }
     def get_embedding(self,text):
-        response = openai.embeddings.create(input=text, model="text-embedding-3-small")
-        return response.data[0].embedding
+        return self.embedder.embed([text])[0]
+
+    def get_embeddings(self, texts):
+        """Embed many texts, sending up to `embedding_batch_size` texts per request."""
+        return self.embedder.embed(texts)
     
     def split_docs(self, docs):
         chunks = []
@@ -268,7 +453,8 @@ if __name__ == "__main__":
     print("\n" + "=" * 50)
     print("Original Text")
     print("=" * 50)
-    print(result["original_text"][:1000] + "...\n" if len(result["original_text"]) > 1000 else result["original_text"])
+    original_text = result["original_text"] or ""  # None for streamed text documents
+    print(original_text[:1000] + "...\n" if len(original_text) > 1000 else original_text)
 
     print("\n" + "=" * 50)
     print("Summary")
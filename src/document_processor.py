@@ -1,9 +1,12 @@
 # main.py
 from src.db.db_manager import DatabaseManager
-from src.document_loader import UniversalDocumentProcessor
+from src.document_loader import IMAGE_EXTENSIONS, TEXT_EXTENSIONS, UniversalDocumentProcessor
 from src.langchain_processor import LangchainProcessor
 from langchain.docstore.document import Document
 from pathlib import Path
+import hashlib
+import itertools
+import os
 import re
 import uuid
 
@@ -13,91 +16,288 @@ def is_url(path):
     url_regex = re.compile(r'^(https?://)?(www\.)?([a-zA-Z0-9_-]+)+(\.[a-zA-Z]+)+(/[\w#!:.?+=&%@!\-]*)?$')
     return re.match(url_regex, path) is not None
 
-def process_and_store_document(doc_path, section_id, sub_section_id, learning_type_id, category_id, permissions_allowed="paid", langchain_db=False):
-
-    db_manager = DatabaseManager()
-    doc_processor = UniversalDocumentProcessor()
-    langchain_processor = LangchainProcessor()
+STORE_TARGETS = ("both", "sql", "langchain")
+INDEX_MODES = ("summary", "body", "both")
 
+def hash_text(text):
+    """SHA-256 hex digest of a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
+def hash_document(doc_path):
+    """SHA-256 hex digest of a file's bytes, read in blocks; URLs are identified by the URL itself."""
     if is_url(doc_path):
-        resource_name = doc_path
+        return hash_text(doc_path)
+    digest = hashlib.sha256()
+    with open(doc_path, "rb") as document_file:
+        for block in iter(lambda: document_file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def langchain_chunk_id(resource_name, chunk_hash, occurrence, summary=True):
+    """Deterministic LangChain document id, so re-ingesting a chunk overwrites instead of duplicating it."""
+    name = f"{resource_name}#{chunk_hash}#{occurrence}" if summary else f"{resource_name}#body#{chunk_hash}#{occurrence}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, name))
+
+def get_resource_name(doc_path):
+    """URLs are stored as-is; files by their filename only."""
+    return doc_path if is_url(doc_path) else Path(doc_path).name
+
+def chunk_metadata(resource_name, section_id, sub_section_id, learning_type_id, category_id, permissions_allowed, resource_path=None):
+    """Resource metadata carried by every chunk of a document."""
+    return {
+        'path': resource_path or resource_name,  # The filename, unless a batch ingest identifies files by relative path
+        'resource_name': resource_name,  # Store only the filename
+        'category_id': category_id,
+        'sub_section_id': sub_section_id,
+        'section_id': section_id,
+        'learning_type_id': learning_type_id,
+        'permissions_allowed': permissions_allowed
+    }
+
+def build_chunk_documents(doc_processor, summary, metadata):
+    """Wrap the summary in a Document with the resource metadata and split it into chunks."""
+    doc = Document(page_content=summary, metadata=dict(metadata, summary=True))
+    return doc_processor.split_docs([doc])
+
+def iter_body_chunks(doc_processor, doc_path, result, metadata, units=None):
+    """Yield chunks of the document's own text, flagged as non-summary chunks.
+
+    Text files are split unit by unit (pages, slides, sections), so chunks keep their
+    source position; the units are re-read from the file unless the caller already
+    loaded them. Transcripts of videos and YouTube URLs are split from `original_text`;
+    images have no body text.
+    """
+    if not is_url(doc_path) and str(doc_path).endswith(TEXT_EXTENSIONS):
+        chunks = doc_processor.iter_chunks(doc_path, units)
+    elif not is_url(doc_path) and str(doc_path).endswith(IMAGE_EXTENSIONS):
+        return
     else:
-        # Extract the filename from the doc_path
-        resource_name = Path(doc_path).name
-
-    # Check existing resource names in the database
-    db_sources = db_manager.get_all_resource_paths()
-    print(f"Existing document paths: {db_sources}")
-
-    # Check if the document is already in the database based on the filename
-    if resource_name not in db_sources:
-        # Step 1: Process the document and generate a summary
-        result = doc_processor.process(doc_path)
-        summary = result.get("summary", "")
-
-        if summary:
-            # Step 2: Create a Document object with metadata
-            doc = Document(
-                page_content=summary,
-                metadata={
-                    'path': resource_name,  # Use only the filename here
-                    'resource_name': resource_name,  # Store only the filename
-                    'summary': True,
-                    'category_id': category_id,
-                    'sub_section_id': sub_section_id,
-                    'section_id': section_id,
-                    'learning_type_id': learning_type_id,
-                    'permissions_allowed': permissions_allowed
-                }
-            )
+        chunks = doc_processor.text_splitter.create_documents([result.get("original_text", "")])
+    for chunk in chunks:
+        chunk.metadata = dict(metadata, **chunk.metadata, summary=False)
+        yield chunk
+
+def iter_index_chunks(doc_processor, doc_path, result, metadata, index_mode, units=None):
+    """Yield the chunks to index for `index_mode`: summary chunks first, then body chunks."""
+    if index_mode in ("summary", "both"):
+        yield from build_chunk_documents(doc_processor, result["summary"], metadata)
+    if index_mode in ("body", "both"):
+        yield from iter_body_chunks(doc_processor, doc_path, result, metadata, units)
+
+def iter_batches(items, batch_size):
+    """Group an iterable into lists of at most `batch_size` items without materializing it."""
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
 
-            # Step 3: Add the resource to the database and get the resource ID
-            resource_id = db_manager.add_resource(
+class ChunkIndexer:
+    """Embeds and stores the chunks of one resource, one bounded batch at a time.
+
+    Chunks are identified by (summary flag, chunk-text hash) and matched against the
+    chunks already stored for the resource; matched chunks keep their embedding and are
+    only moved to their new position, the rest are embedded and inserted. SQL writes
+    stay in one transaction until `finish`, which also deletes the chunks that were not
+    seen again. Chunk-level tracking uses the `embeddings` table, so it requires store
+    "both" or "sql"; LangChain writes are not part of the transaction. Re-ingesting with
+    other resource attributes updates the resource, the filter columns of its chunks
+    and the metadata of the kept chunks.
+    """
+
+    def __init__(self, db_manager, embed, resource_name, previous, content_hash, store, sub_section_id, learning_type_id, category_id, permissions_allowed, resource_path=None):
+        self.db_manager = db_manager
+        self.embed = embed
+        self.resource_name = resource_name
+        self.resource_path = resource_path or resource_name
+        self.content_hash = content_hash
+        self.sql_store = store in ("both", "sql")
+        self.langchain_processor = LangchainProcessor() if store in ("both", "langchain") else None
+        self.known_chunks = db_manager.get_chunk_hashes(previous.id) if previous is not None and self.sql_store else {}
+        self.occurrences = {}
+        self.kept_chunks = {}
+        self.kept_langchain_metadata = {}
+        self.resource_values = {}
+        self.next_order = 0
+        self.chunks_added = 0
+        if previous is not None:
+            self.resource_id = previous.id
+            attributes = dict(sub_section_id=sub_section_id, learning_type_id=learning_type_id, category_id=category_id,
+                              permissions_allowed=permissions_allowed)
+            self.resource_values = {key: value for key, value in attributes.items() if getattr(previous, key) != value}
+        else:
+            self.resource_id = db_manager.add_resource(
                 sub_section_id=sub_section_id,
                 learning_type_id=learning_type_id,
                 category_id=category_id,
                 resource_name=resource_name,  # Store only the filename
-                path=resource_name,  # Store only the filename
-                permissions_allowed=permissions_allowed
+                path=self.resource_path,
+                permissions_allowed=permissions_allowed,
+                content_hash=content_hash,
+                commit=False
             )
 
-            # Step 4: Split the document into chunks
-            chunks_docs = doc_processor.split_docs([doc])
+    def langchain_id(self, key, occurrence):
+        summary, chunk_hash = key
+        return langchain_chunk_id(self.resource_path, chunk_hash, occurrence, summary)
 
-            # Prepare each chunk for LangchainProcessor with additional metadata
-            for order, chunk in enumerate(chunks_docs):
+    def index_batch(self, chunks):
+        """Assign positions to a batch of chunks, then embed and write the ones not stored yet."""
+        new_chunks, new_keys, new_langchain_ids = [], [], []
+        for chunk in chunks:
+            order = self.next_order
+            self.next_order += 1
+            chunk.metadata['vector_order'] = order
+            key = (chunk.metadata['summary'], hash_text(chunk.page_content))
+            occurrence = self.occurrences.get(key, 0)
+            self.occurrences[key] = occurrence + 1
+            if self.known_chunks.get(key):
+                self.kept_chunks[self.known_chunks[key].pop(0)] = (order, dict(chunk.metadata))
+                self.kept_langchain_metadata[self.langchain_id(key, occurrence)] = dict(chunk.metadata, resource_id=self.resource_id)
+            else:
+                new_chunks.append(chunk)
+                new_keys.append(key)
+                new_langchain_ids.append(self.langchain_id(key, occurrence))
+        if not new_chunks:
+            return
 
-                # Add the `order` and `unique_id` to chunk metadata
-                chunk.metadata['vector_order'] = order
+        # Each new chunk is embedded exactly once; both stores reuse the vectors
+        embeddings = self.embed([chunk.page_content for chunk in new_chunks])
+        if self.sql_store:
+            self.db_manager.add_chunks(self.resource_id, [
+                {
+                    "chunk_order": chunk.metadata['vector_order'],
+                    "embedding": embedding,
+                    "content": chunk.page_content,
+                    "summary": summary,
+                    "cmetadata": chunk.metadata,
+                    "content_hash": chunk_hash,
+                }
+                for chunk, embedding, (summary, chunk_hash) in zip(new_chunks, embeddings, new_keys)
+            ], commit=False)
+        if self.langchain_processor is not None:
+            for chunk in new_chunks:
+                chunk.metadata['resource_id'] = self.resource_id
+            self.langchain_processor.add_embedded_documents(new_chunks, embeddings, ids=new_langchain_ids)
+        self.chunks_added += len(new_chunks)
 
-            # Initialize LangchainProcessor and add documents with metadata
-            langchain_processor.add_documents([chunk for chunk in chunks_docs])
+    def finish(self):
+        """Delete the chunks not seen again, commit, and return the resource id and chunk counts."""
+        stale_chunk_ids = [chunk_id for chunk_ids in self.known_chunks.values() for chunk_id in chunk_ids]
+        # Leftover occurrences of a chunk were numbered after the ones still present
+        stale_langchain_ids = [
+            self.langchain_id(key, self.occurrences.get(key, 0) + index)
+            for key, chunk_ids in self.known_chunks.items()
+            for index in range(len(chunk_ids))
+        ]
+        self.db_manager.sync_resource_chunks(
+            self.resource_id,
+            new_chunks=[],
+            kept_chunks=self.kept_chunks,
+            stale_chunk_ids=stale_chunk_ids,
+            content_hash=self.content_hash,
+            resource_values=self.resource_values
+        )
+        if self.langchain_processor is not None:
+            self.langchain_processor.update_metadata(self.kept_langchain_metadata)
+            if stale_langchain_ids:
+                self.langchain_processor.delete_documents(stale_langchain_ids)
+        return {
+            "resource_id": self.resource_id,
+            "chunks_added": self.chunks_added,
+            "chunks_reused": len(self.kept_chunks),
+            "chunks_removed": len(stale_chunk_ids),
+        }
 
-            # Step 5: Add each chunk as an embedding to the database
-            for order, chunk in enumerate(chunks_docs):
-                embedding = doc_processor.get_embedding(chunk.page_content)
+    def abort(self):
+        self.db_manager.session.rollback()
 
-                # Add chunk to the database with its metadata and embedding
-                db_manager.add_chunk(
-                    resource_id=resource_id,
-                    chunk_order=order,
-                    embedding=embedding,
-                    content=chunk.page_content,
-                    summary=True,
-                    cmetadata=chunk.metadata
-                )
+def get_index_mode(index_mode=None):
+    """Resolve the indexing mode, defaulting to the INDEX_MODE environment variable."""
+    index_mode = index_mode or os.getenv("INDEX_MODE", "summary")
+    if index_mode not in INDEX_MODES:
+        raise ValueError(f"index_mode must be one of {INDEX_MODES}, got {index_mode!r}")
+    return index_mode
 
+def index_document(db_manager, doc_processor, doc_path, result, content_hash, section_id, sub_section_id, learning_type_id, category_id, permissions_allowed, store="both", index_mode="summary", embed=None, units=None, resource_path=None):
+    """Chunk, embed and store a processed document in batches of the embedder's batch size.
 
-            print("Document and chunks processed and stored successfully.")
-            return f"Document '{resource_name}' uploaded and processed successfully!", result
-        else:
-            print("No summary generated for the document.")
-            return "No summary generated for the document.", None
-    else:
-        print(f"Document '{resource_name}' already exists in the database.")
+    `embed` defaults to the processor's batched `get_embeddings`; `units` are the text
+    document's already loaded pages/sections, so body chunks skip a second parse.
+    `resource_path` identifies the resource (default: the filename), e.g. a path
+    relative to a batch's source directory. Returns the resource id and the number of
+    chunks added, reused and removed.
+    """
+    resource_name = get_resource_name(doc_path)
+    resource_path = resource_path or resource_name
+    previous = db_manager.get_resource_by_path(resource_path)
+    metadata = chunk_metadata(resource_name, section_id, sub_section_id, learning_type_id, category_id, permissions_allowed, resource_path)
+    indexer = ChunkIndexer(db_manager, embed or doc_processor.get_embeddings, resource_name, previous, content_hash, store,
+                           sub_section_id, learning_type_id, category_id, permissions_allowed, resource_path)
+    try:
+        chunks = iter_index_chunks(doc_processor, doc_path, result, metadata, index_mode, units)
+        for batch in iter_batches(chunks, doc_processor.embedder.batch_size):
+            indexer.index_batch(batch)
+        return indexer.finish()
+    except Exception:
+        indexer.abort()
+        raise
+
+def process_and_store_document(doc_path, section_id, sub_section_id, learning_type_id, category_id, permissions_allowed="paid", store="both", embedding_backend=None, index_mode=None):
+    """Process a document and store its chunks.
+
+    Each chunk is embedded exactly once; the same vectors are written to the
+    `embeddings` table ("sql"), the LangChain PGVector collection ("langchain"),
+    or both. The resource row is always recorded so re-uploads are detected.
+
+    `index_mode` selects what is chunked: the GPT "summary", the document "body"
+    text itself, or "both" (default: INDEX_MODE, else "summary"). Body chunks are
+    stored with `summary=False` and are streamed in bounded batches.
+
+    Files are identified by a content hash and chunks by a chunk-text hash. Uploading
+    identical content again is a no-op; uploading an edited file under an existing
+    name embeds only the changed chunks and deletes the stale ones. Chunk-level
+    tracking uses the `embeddings` table, so it requires store "both" or "sql".
+    """
+    if store not in STORE_TARGETS:
+        raise ValueError(f"store must be one of {STORE_TARGETS}, got {store!r}")
+    index_mode = get_index_mode(index_mode)
+
+    db_manager = DatabaseManager()
+    try:
+        return _process_and_store_document(db_manager, doc_path, section_id, sub_section_id, learning_type_id, category_id, permissions_allowed, store, embedding_backend, index_mode)
+    finally:
+        db_manager.close()
+
+def _process_and_store_document(db_manager, doc_path, section_id, sub_section_id, learning_type_id, category_id, permissions_allowed, store, embedding_backend, index_mode):
+    doc_processor = UniversalDocumentProcessor(embedding_backend=embedding_backend)
+    resource_name = get_resource_name(doc_path)
+
+    # Check whether this exact content is already in the database (single indexed lookup)
+    content_hash = hash_document(doc_path)
+    duplicate = db_manager.get_resource_by_hash(content_hash)
+    if duplicate is not None:
+        print(f"Document '{resource_name}' already exists in the database as '{duplicate.resource_name}'.")
         return f"Document '{resource_name}' already exists in the database.", None
-        
+
+    # Step 1: Process the document and generate a summary
+    result = doc_processor.process(doc_path)
+    summary = result.get("summary", "")
+
+    if not summary and index_mode != "body":
+        print("No summary generated for the document.")
+        return "No summary generated for the document.", None
+
+    # Step 2: Chunk, embed and store in bounded batches; unchanged chunks keep their stored embedding
+    counts = index_document(db_manager, doc_processor, doc_path, result, content_hash, section_id, sub_section_id,
+                            learning_type_id, category_id, permissions_allowed, store=store, index_mode=index_mode)
+
+    result.update({
+        "chunks_added": counts["chunks_added"],
+        "chunks_reused": counts["chunks_reused"],
+        "chunks_removed": counts["chunks_removed"],
+    })
+    print("Document and chunks processed and stored successfully.")
+    return f"Document '{resource_name}' uploaded and processed successfully!", result
+
 if __name__=='__main__':
     message, summary = process_and_store_document(
     doc_path="./src/docs/CHWsUniversalTitles.pdf",
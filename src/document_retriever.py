@@ -1,21 +1,87 @@
-import openai
 from src.db.db_manager import DatabaseManager
-import os
-# Function to get embeddings from OpenAI
+from src.cache import get_query_embedding_cache, get_search_result_cache
+from src.local_search import get_local_search_index
+from src.reranking import get_reranking_stage
+
+SEARCH_MODES = ("vector", "hybrid")
+
+# Stateless facade: every thread (Streamlit session run) gets its own scoped session
 db_manager = DatabaseManager()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+
+# Function to get query embeddings, served from the shared query embedding cache when possible
 def get_embedding(text):
-    response = openai.embeddings.create(input=text, model="text-embedding-3-small")
-    return response.data[0].embedding
+    return get_query_embedding_cache().get_embedding(text)
+
+
+def search_documents(query, limit=5, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None, chunk_type=None, ef_search=None, probes=None, mode="vector", mmr_lambda=None, max_per_resource=None, collapse=False, rerank=None, rerank_depth=None):
+    """Search chunks by embedding ("vector") or by embedding and full text fused together ("hybrid").
 
+    With LOCAL_SEARCH_PATH set, vector searches are answered from the in-process
+    snapshot (src/local_search.py) instead of the database. Repeated searches are
+    served from the search result cache until the corpus changes. `mmr_lambda`,
+    `max_per_resource` and `collapse` diversify the results (see README); hybrid
+    searches support only the last two.
 
-def search_documents(query, limit=5, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None):
+    With a re-ranker configured (RERANKER, or a RerankingStage passed as `rerank`),
+    the first stage fetches `rerank_depth` candidates (default 10 x `limit`) and the
+    re-ranker picks the best `limit`; `rerank=False` skips it.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {SEARCH_MODES}, got {mode!r}")
+    if mode == "hybrid" and mmr_lambda is not None:
+        raise ValueError("mmr_lambda is not supported with mode='hybrid': full-text matches have no vectors to compare")
     query_embedding = get_embedding(query)
-    result = db_manager.search_documents(query_embedding, limit,resource_id=resource_id, permissions_allowed=permissions_allowed, category_id=category_id, sub_section_id=sub_section_id, learning_type_id=learning_type_id)
+    filters = dict(resource_id=resource_id, permissions_allowed=permissions_allowed, category_id=category_id, sub_section_id=sub_section_id, learning_type_id=learning_type_id, chunk_type=chunk_type)
+    diversity = dict(mmr_lambda=mmr_lambda, max_per_resource=max_per_resource, collapse=collapse)
+    diversified = mmr_lambda is not None or bool(max_per_resource) or collapse
+    local_index = get_local_search_index() if mode == "vector" and not diversified else None
+    reranking_stage = get_reranking_stage() if rerank is None else rerank or None
+    first_stage_limit = (rerank_depth or limit * 10) if reranking_stage is not None else limit
+
+    def search():
+        if local_index is not None:
+            return local_index.search(query_embedding, first_stage_limit, **filters)
+        try:
+            if mode == "hybrid":
+                result, timings = db_manager.hybrid_search(query_embedding, query, first_stage_limit, ef_search=ef_search, probes=probes, max_per_resource=max_per_resource, collapse=collapse, **filters)
+                print("Hybrid search timings (ms):", {stage: round(ms, 1) for stage, ms in timings.items()})
+                return result
+            return db_manager.search_documents(query_embedding, first_stage_limit, ef_search=ef_search, probes=probes, **diversity, **filters)
+        finally:
+            # Return this thread's connection to the pool between requests
+            db_manager.close()
+
+    namespace = "local" if local_index is not None else mode
+    # Hybrid results also depend on the raw text the full-text side parses
+    result = get_search_result_cache().get_or_search(
+        namespace, query_embedding, search, limit=first_stage_limit, ef_search=ef_search, probes=probes,
+        query=query if mode == "hybrid" else None, **diversity, **filters
+    )
+    if reranking_stage is not None:
+        # Outside the result cache, so a budget fallback is not cached; scores have their own cache
+        result, info = reranking_stage.rerank(query, result, limit)
+        print("Re-ranking:", {name: round(value, 1) if isinstance(value, float) else value for name, value in info.items()})
     print("Search results:", result)
     return result
 
+def search_documents_batch(queries, limit=5, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None, chunk_type=None, ef_search=None, probes=None, batch_size=256):
+    """Vector-search many queries with the same filters; returns one result list per query, in order.
+
+    Uncached queries are embedded together in batched requests and every `batch_size`
+    queries are searched with a single SQL statement, for jobs that score hundreds of
+    queries at once.
+    """
+    query_embeddings = get_query_embedding_cache().get_embeddings(list(queries))
+    filters = dict(resource_id=resource_id, permissions_allowed=permissions_allowed, category_id=category_id, sub_section_id=sub_section_id, learning_type_id=learning_type_id, chunk_type=chunk_type)
+    results = []
+    try:
+        for start in range(0, len(query_embeddings), batch_size):
+            batch = query_embeddings[start:start + batch_size]
+            results.extend(db_manager.search_documents_batch(batch, limit, ef_search=ef_search, probes=probes, **filters))
+    finally:
+        db_manager.close()
+    return results
+
 if __name__ == "__main__":
     search_documents("diabetes in the world ")
     
-    
\ No newline at end of file
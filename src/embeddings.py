@@ -0,0 +1,145 @@
+import hashlib
+import os
+import re
+from abc import ABC, abstractmethod
+
+import numpy as np
+import openai
+import tiktoken
+from dotenv import load_dotenv
+
+from src.db.config import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+
+load_dotenv()
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+DEFAULT_EMBEDDING_MODEL = EMBEDDING_MODEL
+DEFAULT_EMBEDDING_DIMENSIONS = EMBEDDING_DIMENSIONS
+
+
+class EmbeddingBackend(ABC):
+    """Base class for the services that turn a list of texts into vectors."""
+
+    model = None
+    dimensions = None
+
+    @property
+    def name(self):
+        """Identifies the vector space, e.g. for cache keys: model plus output size."""
+        return f"{self.model}@{self.dimensions}" if self.dimensions else self.model
+
+    @abstractmethod
+    def embed(self, texts):
+        """Return one embedding (list of floats) per input text, in input order."""
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Embeds texts through the OpenAI embeddings endpoint, one request per call.
+
+    `dimensions` asks text-embedding-3 models for shortened (Matryoshka) vectors;
+    older models ignore it and return their fixed size.
+    """
+
+    def __init__(self, model=DEFAULT_EMBEDDING_MODEL, dimensions=DEFAULT_EMBEDDING_DIMENSIONS):
+        self.model = model
+        self.dimensions = dimensions if model.startswith("text-embedding-3") else None
+
+    def request_options(self):
+        """Keyword arguments for embeddings.create (shared with the async client)."""
+        options = {"model": self.model}
+        if self.dimensions:
+            options["dimensions"] = self.dimensions
+        return options
+
+    def embed(self, texts):
+        response = openai.embeddings.create(input=list(texts), **self.request_options())
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """Hashed bag-of-words vectors computed in-process, for development without an API key.
+
+    Each word is hashed to a signed position and the counts are scaled to unit length,
+    so texts that share words land close together. Not semantically meaningful.
+    """
+
+    def __init__(self, dimensions=DEFAULT_EMBEDDING_DIMENSIONS, model="local-hash"):
+        self.dimensions = dimensions
+        self.model = model
+
+    def embed(self, texts):
+        return [self._embed_one(text) for text in texts]
+
+    def _embed_one(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = re.findall(r"\w+", text.lower()) or [text]
+        for token in tokens:
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dimensions] += sign
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+
+def get_embedding_backend(name=None, model=DEFAULT_EMBEDDING_MODEL, dimensions=DEFAULT_EMBEDDING_DIMENSIONS):
+    """Build a backend by name ("openai" or "local"); defaults to the EMBEDDING_BACKEND env var."""
+    name = (name or os.getenv("EMBEDDING_BACKEND", "openai")).lower()
+    if name == "openai":
+        return OpenAIEmbeddingBackend(model=model, dimensions=dimensions)
+    if name == "local":
+        return LocalEmbeddingBackend(dimensions=dimensions)
+    raise ValueError(f"Unknown embedding backend: {name}")
+
+
+class TokenCounter:
+    """Counts tokens with a tiktoken encoding, estimating ~4 characters per token when the
+    encoding cannot be loaded (tiktoken downloads it on first use, which fails offline)."""
+
+    def __init__(self, encoding_name="cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+
+    def __call__(self, text):
+        if self._encoding is None:
+            try:
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception:
+                self._encoding = False
+        if self._encoding:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // 4 + 1
+
+
+class BatchEmbedder:
+    """Groups texts into requests bounded by an item count and a token budget."""
+
+    def __init__(self, backend=None, batch_size=100, max_batch_tokens=250_000):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.backend = backend or get_embedding_backend()
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.count_tokens = TokenCounter("cl100k_base")
+
+    def iter_batches(self, texts):
+        """Yield lists of texts; a single text above the budget still gets its own batch."""
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if batch and (len(batch) >= self.batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def embed(self, texts):
+        """Embed all texts, issuing one backend request per batch."""
+        embeddings = []
+        for batch in self.iter_batches(texts):
+            embeddings.extend(self.backend.embed(batch))
+        return embeddings
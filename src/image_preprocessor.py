@@ -0,0 +1,91 @@
+"""Image preparation for the vision model: downscale, re-encode and fingerprint.
+
+The model resizes every image before looking at it (to fit 512x512 at detail "low";
+2048x2048 then 768px on the short side at "high"), so pixels beyond that are pure
+upload cost. Images are shrunk to the size the model will use, encoded as PNG when
+they have real transparency and JPEG otherwise, and fingerprinted twice: a sha256
+digest of the file for exact re-uploads, and a perceptual hash so near-duplicates
+can opt in to reusing an earlier analysis.
+"""
+import base64
+import hashlib
+import io
+
+from PIL import ExifTags, Image, ImageOps
+
+DETAIL_LEVELS = ("low", "high")
+
+
+def target_size(width, height, detail="low"):
+    """The size the model works at for `detail`; images are never upscaled."""
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"detail must be one of {DETAIL_LEVELS}, got {detail!r}")
+    limit = 512 if detail == "low" else 2048
+    scale = min(1.0, limit / width, limit / height)
+    if detail == "high":
+        # Relative to the already fitted size, so the two factors multiply
+        scale *= min(1.0, 768 / min(width * scale, height * scale))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def dhash(image, hash_size=8):
+    """Difference hash: a 64-bit fingerprint that survives resizing, re-encoding and small edits."""
+    pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(hash_size):
+        for column in range(hash_size):
+            left = pixels[row * (hash_size + 1) + column]
+            right = pixels[row * (hash_size + 1) + column + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def has_transparency(image):
+    if image.mode == "P":
+        return "transparency" in image.info
+    if image.mode in ("RGBA", "LA", "PA"):
+        return image.getchannel("A").getextrema()[0] < 255
+    return False
+
+
+def prepare_image(image_path, detail="low", jpeg_quality=85):
+    """Load an image and return it ready for a chat request.
+
+    Returns a dict with the base64 `data`, its `mime_type`, the sent `size`, the
+    `original_size`, the `digest` (sha256 hex of the file), the perceptual `hash` (int)
+    and the encoded `bytes`.
+    """
+    with open(image_path, "rb") as image_file:
+        raw = image_file.read()
+    with Image.open(io.BytesIO(raw)) as source:
+        source_format = source.format
+        upright = source.getexif().get(ExifTags.Base.Orientation, 1) == 1
+        image = source if upright else ImageOps.exif_transpose(source)  # Phone photos store their rotation in EXIF
+        original_size = image.size
+        image_hash = dhash(image)
+        size = target_size(*original_size, detail=detail)
+
+        if size == original_size and source_format == "JPEG" and upright:
+            # Already small enough and upright: send the file untouched rather than re-compress it
+            data, mime_type = raw, "image/jpeg"
+        else:
+            if size != original_size:
+                image = image.resize(size, Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            if has_transparency(image):
+                image.convert("RGBA").save(buffer, "PNG", optimize=True)
+                mime_type = "image/png"
+            else:
+                image.convert("RGB").save(buffer, "JPEG", quality=jpeg_quality, optimize=True)
+                mime_type = "image/jpeg"
+            data = buffer.getvalue()
+
+    return {
+        "data": base64.b64encode(data).decode("utf-8"),
+        "mime_type": mime_type,
+        "size": size,
+        "original_size": original_size,
+        "digest": hashlib.sha256(raw).hexdigest(),
+        "hash": image_hash,
+        "bytes": len(data),
+    }
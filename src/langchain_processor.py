@@ -1,9 +1,16 @@
 from langchain_postgres import PGVector
-from langchain_postgres.vectorstores import PGVector
+from langchain_postgres.vectorstores import PGVector, DistanceStrategy
 from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
 import src.langchain_processor as langchain_processor
+from src.cache import bump_corpus_version, get_query_embedding_cache, get_search_result_cache
+from src.db.config import engine, EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+from src.db.migrate_vectors import LANGCHAIN_TABLE
+from src.db.vector_index import DEFAULT_METRIC, similarity_from_distance
 
+from sqlalchemy import text
+
+import json
 import openai
 import os
 langchain_processor.debug = False
@@ -11,19 +18,28 @@ from uuid import uuid4
 
 load_dotenv()
 
+# LangChain's name for each pgvector metric, so both search paths rank and score alike
+DISTANCE_STRATEGIES = {
+    "l2": DistanceStrategy.EUCLIDEAN,
+    "cosine": DistanceStrategy.COSINE,
+    "inner_product": DistanceStrategy.MAX_INNER_PRODUCT,
+}
+
 class LangchainProcessor:
-    def __init__(self, collection_name="langchain"):
-        self.connection = (
-            f"postgresql+psycopg://{os.getenv('DB_USERNAME')}:{os.getenv('DB_PASSWORD')}"
-            f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-        )
+    def __init__(self, collection_name="langchain", query_cache=None, metric=DEFAULT_METRIC):
+        # Share the tuned connection pool with DatabaseManager instead of opening a second one
+        self.connection = engine
         self.collection_name = collection_name
+        self.query_cache = query_cache or get_query_embedding_cache()
+        self.metric = metric
         openai.api_key = os.getenv("OPENAI_API_KEY")
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        self.embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS)
         self.vector_store = PGVector(
             embeddings=self.embeddings,
+            embedding_length=EMBEDDING_DIMENSIONS,
             collection_name=self.collection_name,
             connection=self.connection,
+            distance_strategy=DISTANCE_STRATEGIES[metric],
             use_jsonb=True,
         )
 
@@ -31,19 +47,63 @@ class LangchainProcessor:
         """Add documents to the vector store."""
         uuids = [str(uuid4()) for _ in range(len(docs))]
         self.vector_store.add_documents(docs, ids=uuids)
+        bump_corpus_version()
+
+    def add_embedded_documents(self, docs, embeddings, ids=None):
+        """Add documents whose embeddings were already computed, skipping the re-embedding step.
+
+        Passing existing `ids` overwrites those documents instead of adding duplicates.
+        """
+        if not docs:
+            return
+        uuids = ids or [str(uuid4()) for _ in range(len(docs))]
+        self.vector_store.add_embeddings(
+            texts=[doc.page_content for doc in docs],
+            embeddings=[list(embedding) for embedding in embeddings],
+            metadatas=[doc.metadata for doc in docs],
+            ids=uuids,
+        )
+        bump_corpus_version()
     
+    def update_metadata(self, metadatas):
+        """Replace the metadata of stored documents ({id: metadata}) without re-embedding them."""
+        if not metadatas:
+            return
+        with self.connection.begin() as connection:
+            connection.execute(
+                text(f"UPDATE {LANGCHAIN_TABLE} SET cmetadata = CAST(:cmetadata AS jsonb) WHERE id = :id"),
+                [{"id": doc_id, "cmetadata": json.dumps(metadata, default=str)} for doc_id, metadata in metadatas.items()],
+            )
+        bump_corpus_version()
+
     def delete_document(self, doc_id):
         """Delete a document by ID."""
         self.vector_store.delete(ids=[str(doc_id)])
+        bump_corpus_version()
+
+    def delete_documents(self, doc_ids):
+        """Delete several documents by ID in one statement."""
+        self.vector_store.delete(ids=[str(doc_id) for doc_id in doc_ids])
+        bump_corpus_version()
     
     def similarity_search(self, query, k=10, filter=None):
         """Perform a similarity search."""
         return self.vector_store.similarity_search(query, k=k, filter=filter)
 
     def similarity_search_with_scores(self, query, k=10,filter=None):
-        """Perform a similarity search and return results with scores."""
-        results = self.vector_store.similarity_search_with_score(query=query, k=k,filter=filter)
-        return [(doc, score) for doc, score in results]
+        """Perform a similarity search and return (document, similarity) pairs.
+
+        The query embedding comes from the shared query cache, so repeated queries
+        skip the embedding round-trip. LangChain returns a distance for the collection's
+        metric; it is converted to the same cosine similarity `DatabaseManager` reports.
+        Repeated searches are served from the search result cache until the corpus changes.
+        """
+        embedding = self.query_cache.get_embedding(query)
+
+        def search():
+            results = self.vector_store.similarity_search_with_score_by_vector(embedding=embedding, k=k, filter=filter)
+            return [(doc, similarity_from_distance(distance, self.metric)) for doc, distance in results]
+        return get_search_result_cache().get_or_search(f"langchain:{self.collection_name}", embedding, search, k=k, filter=filter)
 
     def get_retriever(self, search_type="mmr", k=1):
         """Transform the vector store into a retriever for RAG."""
@@ -0,0 +1,483 @@
+"""In-process exact vector search over a memory-mapped snapshot of the embeddings table.
+
+For small and mid-sized corpora the round trip to Postgres dominates search latency.
+`LocalSearchIndex` exports the table once to a directory: the vectors as a raw
+float32 (or float16, for halfvec storage) matrix that is memory-mapped rather than
+loaded, one NumPy array per filter attribute, and the chunk texts in a JSON-lines
+sidecar read by offset. Searches are one matrix-vector product over the rows passing
+the filters (boolean masks) plus an `argpartition` top-k, with the distance and
+similarity definitions of the SQL path, so results match an exact SQL search.
+
+`refresh()` brings a snapshot up to date: rows with a new id are appended, rows whose
+`updated_at` is newer than the previous refresh (edited, moved or re-filtered chunks)
+are replaced, and rows no longer in the table are dropped. Files are never modified
+where a search may be reading them: new rows are appended past the rows the current
+manifest covers, and replacing rows writes the live rows to a new generation of files.
+The manifest, swapped atomically, commits each refresh.
+
+Usage:
+    python -m src.local_search export --path cache/local_search
+    python -m src.local_search refresh --path cache/local_search
+    python -m src.local_search search "community health workers" --path cache/local_search
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+
+from src.db.config import engine, EMBEDDING_DIMENSIONS, VECTOR_STORAGE
+from src.db.db_manager import CHUNK_TYPES
+from src.db.vector_index import DEFAULT_METRIC, similarity_from_distance
+
+SNAPSHOT_FORMAT = 3
+STORAGE_DTYPES = {"vector": "float32", "halfvec": "float16"}
+NULL_ID = -1  # Stands for SQL NULL in the integer attribute arrays
+
+# Per-row arrays kept next to the vectors; filter attributes are named after their columns
+ROW_ARRAYS = {
+    "ids": np.int64,          # Ascending: rows are appended in id order and rewrites keep the order
+    "resource_ids": np.int64,
+    "chunk_orders": np.int32,
+    "category_ids": np.int32,
+    "sub_section_ids": np.int32,
+    "learning_type_ids": np.int32,
+    "permissions": np.int16,  # Index into the manifest's permission names
+    "summary": np.bool_,      # NULL counts as a summary chunk, as in the SQL filter
+    "norms": np.float32,
+    "text_offsets": np.int64,
+    "text_lengths": np.int64,
+    "live": np.bool_,
+}
+
+ROWS_QUERY = """
+    SELECT
+        embeddings.id, embeddings.resource_id, embeddings.chunk_order, embeddings.category_id, embeddings.sub_section_id,
+        embeddings.learning_type_id, embeddings.permissions_allowed, embeddings.summary IS NOT FALSE,
+        embeddings.embedding::vector, embeddings.content, resources.resource_name
+    FROM embeddings
+    JOIN resources ON embeddings.resource_id = resources.id
+    WHERE {condition}
+    ORDER BY embeddings.id
+"""
+
+# Rows are stamped with their transaction's start time, so a transaction still open when a
+# refresh reads can commit rows older than the refresh; the next one starts from the oldest
+CHANGE_MARKER_QUERY = """
+    SELECT min(xact_start) FROM pg_stat_activity WHERE datname = current_database() AND xact_start IS NOT NULL
+"""
+
+
+class _RowWriter:
+    """Appends rows to a generation's vector and text files and collects their row array values.
+
+    The files are first cut back to the size the manifest commits (dropping whatever an
+    interrupted refresh left behind); searches never read past that size.
+    """
+
+    def __init__(self, files, manifest, dtype):
+        self.files = files
+        self.vector_bytes = manifest["count"] * manifest["dimensions"] * dtype.itemsize
+        self.text_bytes = manifest["text_bytes"]
+        self.blocks = []
+        self.rows = {name: [] for name in ROW_ARRAYS}
+
+    def __enter__(self):
+        self.vector_file, self.text_file = [open(path, "r+b" if os.path.exists(path) else "w+b") for path in self.files]
+        for file, size in ((self.vector_file, self.vector_bytes), (self.text_file, self.text_bytes)):
+            file.truncate(size)
+            file.seek(size)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.vector_file.close()
+        self.text_file.close()
+
+    @property
+    def added(self):
+        return len(self.rows["ids"])
+
+    def keep(self, arrays):
+        """Row arrays of rows already in the files."""
+        self.blocks.append(arrays)
+
+    def append_block(self, values, vectors, lines):
+        lengths = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+        values.update(text_offsets=self.text_bytes + np.cumsum(lengths) - lengths, text_lengths=lengths)
+        self.vector_file.write(np.ascontiguousarray(vectors).tobytes())
+        self.text_file.write(b"".join(lines))
+        self.text_bytes += int(lengths.sum())
+        self.blocks.append(values)
+
+    def append(self, values, vector, line):
+        values.update(text_offsets=self.text_bytes, text_lengths=len(line))
+        self.vector_file.write(vector.tobytes())
+        self.text_file.write(line)
+        self.text_bytes += len(line)
+        for name, value in values.items():
+            self.rows[name].append(value)
+
+    def arrays(self):
+        blocks = self.blocks + [{name: np.asarray(self.rows[name], dtype=dtype) for name, dtype in ROW_ARRAYS.items()}]
+        return {name: np.concatenate([block[name] for block in blocks]).astype(dtype, copy=False) for name, dtype in ROW_ARRAYS.items()}
+
+
+class LocalSearchIndex:
+    """A memory-mapped copy of the embeddings table that answers exact top-k searches in process."""
+
+    def __init__(self, path, storage=VECTOR_STORAGE, metric=DEFAULT_METRIC, block_rows=65536):
+        self.path = path
+        self.dtype = np.dtype(STORAGE_DTYPES[storage])
+        self.metric = metric
+        self.block_rows = block_rows
+        self._lock = threading.Lock()  # Serializes writers; searches read whichever state is current
+        self._state = None
+        if os.path.exists(self._file("manifest.json")):
+            self._state = self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _data_files(self, generation):
+        """Vector and text files of a snapshot generation; rewriting rows starts a new generation."""
+        return self._file(f"vectors-{generation}.bin"), self._file(f"texts-{generation}.jsonl")
+
+    @property
+    def manifest(self):
+        return self._state["manifest"] if self._state else None
+
+    def __len__(self):
+        return int(self._state["live"].sum()) if self._state else 0
+
+    # Snapshot files
+
+    def _load(self):
+        with open(self._file("manifest.json")) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            return None  # Written by an older version; the next export replaces it
+        built_for = (manifest["dimensions"], manifest["dtype"], manifest["metric"])
+        if built_for != (EMBEDDING_DIMENSIONS, self.dtype.name, self.metric):
+            raise RuntimeError(
+                f"Snapshot at {self.path} was built for {built_for}, not "
+                f"{(EMBEDDING_DIMENSIONS, self.dtype.name, self.metric)}; run `python -m src.local_search export`."
+            )
+        with np.load(self._file(manifest["rows_file"])) as rows:
+            arrays = {name: rows[name].astype(dtype, copy=False) for name, dtype in ROW_ARRAYS.items()}
+        return self._state_for(manifest, arrays)
+
+    def _state_for(self, manifest, arrays):
+        """In-memory state: manifest, row arrays, the memory-mapped vectors and an open text file.
+
+        Searches hold a reference to one state, so a refresh swapping in the next one
+        never changes data under a running search.
+        """
+        vector_path, text_path = self._data_files(manifest["generation"])
+        count, dimensions = manifest["count"], manifest["dimensions"]
+        if count:
+            vectors = np.memmap(vector_path, dtype=self.dtype, mode="r", shape=(count, dimensions))
+        else:
+            vectors = np.zeros((0, dimensions), dtype=self.dtype)
+        return dict(arrays, manifest=manifest, vectors=vectors, texts=open(text_path, "rb"))
+
+    def _save(self, manifest, arrays):
+        """Write the row arrays under a new name, then commit them (and the data files' sizes) with the manifest."""
+        manifest["version"] += 1
+        manifest["rows_file"] = f"rows-{manifest['generation']}-{manifest['version']}.npz"
+        np.savez(self._file(manifest["rows_file"]), **arrays)
+        temporary = self._file("manifest.json.tmp")
+        with open(temporary, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(temporary, self._file("manifest.json"))
+
+    @staticmethod
+    def _read_line(state, row):
+        return os.pread(state["texts"].fileno(), int(state["text_lengths"][row]), int(state["text_offsets"][row]))
+
+    @classmethod
+    def _read_text(cls, state, row):
+        return json.loads(cls._read_line(state, row))
+
+    # Export and refresh
+
+    def export(self):
+        """Write a fresh snapshot of the whole table into a new generation of files."""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            self._swap(*self._apply(self._state, rebuild=True))
+            return self.manifest
+
+    def refresh(self):
+        """Fetch rows added or changed since the last refresh and drop rows deleted since; returns counts."""
+        if self._state is None:
+            manifest = self.export()
+            return {"added": manifest["count"], "updated": 0, "removed": 0}
+        with self._lock:
+            state, counts = self._apply(self._state)
+            self._swap(state, counts)
+            return counts
+
+    def _swap(self, state, counts):
+        previous, self._state = self._state, state
+        if previous is None:
+            return
+        # Searches still holding the old state keep their open files and mappings
+        obsolete = [previous["manifest"]["rows_file"]]
+        if previous["manifest"]["generation"] != state["manifest"]["generation"]:
+            obsolete += [os.path.basename(path) for path in self._data_files(previous["manifest"]["generation"])]
+        for name in obsolete:
+            os.remove(self._file(name))
+
+    def _row(self, manifest, row):
+        """Row array values, stored vector and text line of one fetched row."""
+        chunk_id, resource_id, chunk_order, category_id, sub_section_id, learning_type_id, permission, summary, embedding, content, resource_name = row
+        vector = np.asarray(embedding, dtype=np.float32)
+        if permission is not None and permission not in manifest["permissions"]:
+            manifest["permissions"] = manifest["permissions"] + [permission]
+        values = {
+            "ids": chunk_id,
+            "resource_ids": resource_id,
+            "chunk_orders": chunk_order,
+            "category_ids": NULL_ID if category_id is None else category_id,
+            "sub_section_ids": NULL_ID if sub_section_id is None else sub_section_id,
+            "learning_type_ids": NULL_ID if learning_type_id is None else learning_type_id,
+            "permissions": NULL_ID if permission is None else manifest["permissions"].index(permission),
+            "summary": summary,
+            "norms": np.linalg.norm(vector),
+            "live": True,
+        }
+        return values, vector.astype(self.dtype), (json.dumps([content, resource_name]) + "\n").encode("utf-8")
+
+    def _apply(self, previous, rebuild=False):
+        """Build the state that follows `previous` (None, or `rebuild`, for a full export); returns (state, counts).
+
+        With no changed rows, new rows are appended to the current generation's files.
+        Otherwise the live rows are copied into a new generation with the changed rows
+        replaced, as they are when more than half of the rows are dead.
+        """
+        if previous is None or rebuild:
+            manifest = {"format": SNAPSHOT_FORMAT, "generation": previous["manifest"]["generation"] + 1 if previous else 1,
+                        "version": 0, "dimensions": EMBEDDING_DIMENSIONS, "dtype": self.dtype.name, "metric": self.metric,
+                        "count": 0, "text_bytes": 0, "max_id": 0, "changed_since": None, "permissions": []}
+            previous = None
+        else:
+            manifest = dict(previous["manifest"])
+        stream = {"stream_results": True, "yield_per": 1000}
+        updated = inserted = removed = 0
+
+        # One database snapshot for every read, so deletions, changes and new rows agree
+        with engine.connect().execution_options(isolation_level="REPEATABLE READ") as connection:
+            changed_since = connection.execute(text(CHANGE_MARKER_QUERY)).scalar()
+            current_ids = np.fromiter(connection.execute(text("SELECT id FROM embeddings")).scalars(), dtype=np.int64)
+            if previous is not None:
+                dead = ~previous["live"] | ~np.isin(previous["ids"], current_ids)
+                removed = int((previous["live"] & dead).sum())
+                changed = iter(())
+                if manifest["changed_since"]:
+                    changed = iter(connection.execution_options(**stream).execute(
+                        text(ROWS_QUERY.format(condition="embeddings.id <= :max_id AND embeddings.updated_at >= :since")),
+                        {"max_id": manifest["max_id"], "since": datetime.fromisoformat(manifest["changed_since"])},
+                    ))
+                first_changed = next(changed, None)
+                rewrite = first_changed is not None or dead.sum() > len(dead) / 2
+                if rewrite:
+                    manifest.update(generation=manifest["generation"] + 1, count=0, text_bytes=0)
+
+            with _RowWriter(self._data_files(manifest["generation"]), manifest, self.dtype) as writer:
+                if previous is not None and rewrite:
+                    updated, inserted = self._copy_live_rows(previous, ~dead, manifest, writer, first_changed, changed)
+                elif previous is not None:
+                    writer.keep(dict({name: previous[name] for name in ROW_ARRAYS}, live=previous["live"] & ~dead))
+                new_rows = connection.execution_options(**stream).execute(
+                    text(ROWS_QUERY.format(condition="embeddings.id > :max_id")), {"max_id": manifest["max_id"]}
+                )
+                for row in new_rows:
+                    writer.append(*self._row(manifest, row))
+
+        arrays = writer.arrays()
+        manifest.update(
+            count=len(arrays["ids"]),
+            text_bytes=writer.text_bytes,
+            max_id=max(manifest["max_id"], int(arrays["ids"].max()) if len(arrays["ids"]) else 0),
+            changed_since=changed_since.isoformat(),
+        )
+        self._save(manifest, arrays)
+        return self._state_for(manifest, arrays), {"added": writer.added + inserted, "updated": updated, "removed": removed}
+
+    def _copy_live_rows(self, previous, keep, manifest, writer, pending, changed):
+        """Copy the rows of `previous` where `keep` block by block, merging in the id-ordered `changed`
+        rows (`pending` is the first); returns (rows replaced, rows inserted).
+
+        A changed row missing from the snapshot was committed after a row with a higher id
+        had already been fetched (ids are assigned at insert, visibility at commit), so it
+        is inserted at its place in id order.
+        """
+        updated = inserted = 0
+        for start in range(0, len(keep), self.block_rows):
+            block = start + np.flatnonzero(keep[start:start + self.block_rows])
+            if not len(block):
+                continue
+            values = {name: previous[name][block] for name in ROW_ARRAYS}
+            vectors = np.array(previous["vectors"][block])
+            lines = [self._read_line(previous, row) for row in block]
+            missing = []
+            while pending is not None and pending[0] <= values["ids"][-1]:
+                position = int(np.searchsorted(values["ids"], pending[0]))
+                row_values, vector, line = self._row(manifest, pending)
+                if values["ids"][position] == pending[0]:
+                    vectors[position], lines[position] = vector, line
+                    for name, value in row_values.items():
+                        values[name][position] = value
+                    updated += 1
+                else:
+                    missing.append((position, row_values, vector, line))
+                pending = next(changed, None)
+            if missing:
+                positions = [position for position, _, _, _ in missing]
+                for name in ROW_ARRAYS:  # Text offsets are filled in by append_block
+                    values[name] = np.insert(values[name], positions, [row_values.get(name, 0) for _, row_values, _, _ in missing])
+                vectors = np.insert(vectors, positions, np.stack([vector for _, _, vector, _ in missing]), axis=0)
+                for offset, (position, _, _, line) in enumerate(missing):
+                    lines.insert(position + offset, line)
+                inserted += len(missing)
+            writer.append_block(values, vectors, lines)
+        while pending is not None:  # Missing rows above the last copied id; still below every new row
+            writer.append(*self._row(manifest, pending))
+            pending = next(changed, None)
+        return updated, inserted
+
+    # Search
+
+    def _mask(self, state, resource_id, permissions_allowed, category_id, sub_section_id, learning_type_id, chunk_type):
+        mask = state["live"].copy()
+        if resource_id is not None:
+            mask &= state["resource_ids"] == resource_id
+        if permissions_allowed is not None:
+            names = state["manifest"]["permissions"]
+            mask &= state["permissions"] == (names.index(permissions_allowed) if permissions_allowed in names else -2)
+        for name, value in (("category_ids", category_id), ("sub_section_ids", sub_section_id), ("learning_type_ids", learning_type_id)):
+            if value is not None:
+                mask &= state[name] == value
+        if chunk_type is not None:
+            if chunk_type not in CHUNK_TYPES:
+                raise ValueError(f"chunk_type must be one of {CHUNK_TYPES} or None, got {chunk_type!r}")
+            mask &= state["summary"] == (chunk_type == "summary")
+        return mask
+
+    def _distances(self, vectors, norms, query, query_norm):
+        """pgvector's distance for `self.metric`, from dot products and precomputed norms."""
+        dots = vectors @ query
+        if self.metric == "inner_product":
+            return -dots
+        if self.metric == "cosine":
+            return 1.0 - dots / np.maximum(norms * query_norm, np.finfo(np.float32).tiny)
+        return np.sqrt(np.maximum(norms * norms + query_norm * query_norm - 2.0 * dots, 0.0))
+
+    def search(self, query_embedding, limit=5, resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None, learning_type_id=None, chunk_type=None):
+        """Exact top-`limit` search; returns the same dicts as DatabaseManager.search_documents."""
+        state = self._state
+        if state is None:
+            raise RuntimeError(f"No snapshot at {self.path}; run `python -m src.local_search export` first.")
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        rows = np.flatnonzero(self._mask(state, resource_id, permissions_allowed, category_id, sub_section_id, learning_type_id, chunk_type))
+
+        best_rows, best_distances = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        for start in range(0, len(rows), self.block_rows):
+            block = rows[start:start + self.block_rows]
+            vectors = np.asarray(state["vectors"][block], dtype=np.float32)
+            distances = self._distances(vectors, state["norms"][block], query, query_norm)
+            candidates = np.concatenate([best_rows, block])
+            distances = np.concatenate([best_distances, distances])
+            if len(candidates) > limit:
+                keep = np.argpartition(distances, limit - 1)[:limit]
+                candidates, distances = candidates[keep], distances[keep]
+            best_rows, best_distances = candidates, distances
+
+        results = []
+        for index in np.argsort(best_distances, kind="stable"):
+            row = int(best_rows[index])
+            content, resource_name = self._read_text(state, row)
+            distance = float(best_distances[index])
+            results.append({
+                "content": content,
+                "resource_name": resource_name,
+                "distance": distance,
+                "similarity": similarity_from_distance(distance, self.metric),
+                "id": int(state["ids"][row]),
+                "resource_id": int(state["resource_ids"][row]),
+                "chunk_order": int(state["chunk_orders"][row]),
+            })
+        return results
+
+
+_local_search_index = None
+_local_search_lock = threading.Lock()
+_last_refresh = 0.0
+_refreshing = False
+
+
+def _refresh_in_background(index):
+    global _last_refresh, _refreshing
+    try:
+        if index.manifest is None:
+            index.export()
+        else:
+            index.refresh()
+    except Exception as e:
+        print(f"Local search refresh failed: {e}")
+    finally:
+        with _local_search_lock:
+            _last_refresh = time.monotonic()
+            _refreshing = False
+
+
+def get_local_search_index():
+    """Process-wide local search index, or None unless LOCAL_SEARCH_PATH is set and a snapshot is loaded.
+
+    A missing snapshot is exported, and a loaded one refreshed from the database at most
+    every LOCAL_SEARCH_REFRESH_SECONDS (default 60; 0 never refreshes, for replicas that
+    ship their own snapshot files), on a background thread: callers get the current
+    snapshot meanwhile, or None (search the database) until the first export is done.
+    """
+    global _local_search_index, _refreshing
+    path = os.getenv("LOCAL_SEARCH_PATH")
+    if not path:
+        return None
+    interval = float(os.getenv("LOCAL_SEARCH_REFRESH_SECONDS", "60"))
+    with _local_search_lock:
+        if _local_search_index is None:
+            _local_search_index = LocalSearchIndex(path)
+        index = _local_search_index
+        due = not _last_refresh or (interval and time.monotonic() - _last_refresh > interval)
+        if due and not _refreshing:
+            _refreshing = True
+            threading.Thread(target=_refresh_in_background, args=(index,), daemon=True).start()
+    return index if index.manifest is not None else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, refresh or query the local search snapshot.")
+    parser.add_argument("action", choices=["export", "refresh", "search"])
+    parser.add_argument("query", nargs="?", default=None)
+    parser.add_argument("--path", default=os.getenv("LOCAL_SEARCH_PATH", "cache/local_search"))
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    index = LocalSearchIndex(args.path)
+    start = time.perf_counter()
+    if args.action == "export":
+        print(index.export())
+    elif args.action == "refresh":
+        print(index.refresh())
+    else:
+        from src.cache import get_query_embedding_cache
+        query_embedding = get_query_embedding_cache().get_embedding(args.query or "")
+        start = time.perf_counter()
+        for result in index.search(query_embedding, args.limit):
+            print(f"{result['similarity']:.4f}  {result['resource_name']}: {result['content'][:80]!r}")
+    print(f"{len(index)} live rows, {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,73 @@
+"""Compare rows/sec of the per-row `add_chunk` path against the bulk `add_chunks` path.
+
+Usage: python -m src.pg_vector_test.bench_bulk_insert --rows 500
+"""
+import argparse
+import time
+
+from src.db.db_manager import DatabaseManager
+from src.embeddings import LocalEmbeddingBackend
+
+
+def make_chunks(rows):
+    texts = [f"benchmark chunk {i} about community health workers and training" for i in range(rows)]
+    embeddings = LocalEmbeddingBackend().embed(texts)
+    return [
+        {
+            "chunk_order": order,
+            "embedding": embedding,
+            "content": text,
+            "summary": True,
+            "cmetadata": {"benchmark": True},
+        }
+        for order, (text, embedding) in enumerate(zip(texts, embeddings))
+    ]
+
+
+def resource_fields(db_manager, name):
+    """Resource columns for a throwaway benchmark resource, using the first lookup ids available."""
+    return {
+        "sub_section_id": next(iter(db_manager.get_subsections().values())),
+        "learning_type_id": next(iter(db_manager.get_learning_types().values())),
+        "category_id": next(iter(db_manager.get_categories().values())),
+        "resource_name": name,
+        "path": name,
+    }
+
+
+def bench_per_row(db_manager, chunks):
+    resource_id = db_manager.add_resource(**resource_fields(db_manager, "benchmark-per-row"))
+    start = time.perf_counter()
+    for chunk in chunks:
+        db_manager.add_chunk(resource_id=resource_id, **chunk)
+    elapsed = time.perf_counter() - start
+    db_manager.delete_resource(resource_id)
+    return elapsed
+
+
+def bench_bulk(db_manager, chunks):
+    fields = resource_fields(db_manager, "benchmark-bulk")
+    start = time.perf_counter()
+    resource_id = db_manager.add_resource_with_chunks(chunks, **fields)
+    elapsed = time.perf_counter() - start
+    db_manager.delete_resource(resource_id)
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500)
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager()
+    chunks = make_chunks(args.rows)
+    per_row = bench_per_row(db_manager, chunks)
+    bulk = bench_bulk(db_manager, chunks)
+    db_manager.close()
+
+    print("\n" + "=" * 50)
+    print(f"Rows inserted: {args.rows}")
+    print(f"Per-row add_chunk: {per_row:.3f}s ({args.rows / per_row:,.0f} rows/sec)")
+    print(f"Bulk add_chunks:   {bulk:.3f}s ({args.rows / bulk:,.0f} rows/sec)")
+    print(f"Speedup: {per_row / bulk:.1f}x")
+    print("=" * 50)
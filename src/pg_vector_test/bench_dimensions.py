@@ -0,0 +1,119 @@
+"""Recall vs. latency of shortened (Matryoshka) embeddings on a fixed local corpus.
+
+The documents in a directory are chunked as for ingestion and embedded once at the
+model's full size. Each smaller setting is derived by keeping the leading dimensions
+and re-normalizing, which is what the API returns for `dimensions=N` with
+text-embedding-3 models, so one embedding pass covers every setting. Queries are a
+fixed-seed sample of chunk openings; the ground truth is the exact top-k at full size.
+Latency is an exact in-memory scan, so it shows the cost of the vector width alone,
+without the database.
+
+Usage:
+    python -m src.pg_vector_test.bench_dimensions --corpus ./src/docs
+    python -m src.pg_vector_test.bench_dimensions --dimensions 1536 768 512 256 --k 10 --cache dims.npy
+"""
+import argparse
+import os
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.document_loader import TEXT_EXTENSIONS, UniversalDocumentProcessor
+from src.embeddings import BatchEmbedder, get_embedding_backend
+
+FULL_DIMENSIONS = 1536
+DEFAULT_SETTINGS = (1536, 1024, 768, 512, 256)
+
+
+def load_corpus(corpus_dir, max_chunks=None):
+    """Chunk every text document under `corpus_dir`, in a stable (sorted path) order."""
+    processor = UniversalDocumentProcessor(embedding_backend=get_embedding_backend("local"))
+    chunks = []
+    for path in sorted(Path(corpus_dir).rglob("*")):
+        if path.suffix.lower() not in TEXT_EXTENSIONS:
+            continue
+        chunks.extend(chunk.page_content for chunk in processor.iter_chunks(str(path)))
+        if max_chunks and len(chunks) >= max_chunks:
+            return chunks[:max_chunks]
+    return chunks
+
+
+def embed_full(texts, backend_name, cache_path=None):
+    """Embed at full size, reusing `cache_path` (.npy) when it holds the same number of rows."""
+    if cache_path and os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if cached.shape == (len(texts), FULL_DIMENSIONS):
+            return cached
+    embedder = BatchEmbedder(get_embedding_backend(backend_name, dimensions=FULL_DIMENSIONS))
+    vectors = np.asarray(embedder.embed(texts), dtype=np.float32)
+    if cache_path:
+        np.save(cache_path, vectors)
+    return vectors
+
+
+def truncate(vectors, dimensions):
+    """Keep the leading `dimensions` and scale each row back to unit length."""
+    shortened = vectors[:, :dimensions]
+    norms = np.linalg.norm(shortened, axis=1, keepdims=True)
+    return shortened / np.where(norms == 0, 1, norms)
+
+
+def top_k(corpus, query, k):
+    scores = corpus @ query
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def evaluate(corpus, queries, truth, k):
+    """Mean recall@k against `truth` and per-query scan latencies (ms)."""
+    recalls, latencies = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = top_k(corpus, query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(found.tolist()) & expected) / k)
+    return statistics.mean(recalls), latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    return f"p50={statistics.median(ordered):7.3f}ms p95={p95:7.3f}ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default="./src/docs", help="Directory of documents to chunk and embed")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=list(DEFAULT_SETTINGS))
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-chunks", type=int, default=None)
+    parser.add_argument("--backend", choices=["openai", "local"], default=None,
+                        help="Embedding backend (default: EMBEDDING_BACKEND); 'local' is not Matryoshka-trained")
+    parser.add_argument("--cache", default=None, help=".npy file for the full-size embeddings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    chunks = load_corpus(args.corpus, args.max_chunks)
+    if len(chunks) <= args.k:
+        raise SystemExit(f"Need more than {args.k} chunks under {args.corpus}, found {len(chunks)}.")
+    full = truncate(embed_full(chunks, args.backend, args.cache), FULL_DIMENSIONS)
+
+    rng = np.random.default_rng(args.seed)
+    sample = rng.choice(len(chunks), size=min(args.queries, len(chunks)), replace=False)
+    query_texts = [" ".join(chunks[index].split()[:32]) for index in sample]
+    query_full = truncate(embed_full(query_texts, args.backend), FULL_DIMENSIONS)
+    truth = [set(top_k(full, query, args.k).tolist()) for query in query_full]
+
+    print(f"\n{len(chunks)} chunks, {len(query_texts)} queries, recall@{args.k} vs. exact {FULL_DIMENSIONS}-d search")
+    print("=" * 78)
+    for dimensions in sorted(set(args.dimensions), reverse=True):
+        if not 0 < dimensions <= FULL_DIMENSIONS:
+            continue
+        corpus = np.ascontiguousarray(truncate(full, dimensions))
+        recall, latencies = evaluate(corpus, truncate(query_full, dimensions), truth, args.k)
+        print(f"{dimensions:>5} dims  recall={recall:6.3f}  {summarize(latencies)}  "
+              f"{dimensions * 4:>5} B/vector (vector), {dimensions * 2:>5} B (halfvec)")
+    print("=" * 78)
@@ -0,0 +1,45 @@
+"""Compare looping over search_documents with one search_documents_batch statement per batch.
+
+The same query vectors are searched both ways, the results are checked to be identical,
+and queries per second are reported for each batch size.
+
+Usage: python -m src.pg_vector_test.bench_search_batch --queries 500 --batch-sizes 50 100 250
+"""
+import argparse
+import time
+
+from src.db.db_manager import DatabaseManager
+from src.embeddings import LocalEmbeddingBackend
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50, 100, 250])
+    parser.add_argument("--permissions", default=None, help="Optional permissions_allowed filter")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager()
+    query_embeddings = LocalEmbeddingBackend().embed(
+        [f"learner profile {i} interested in community health and education" for i in range(args.queries)]
+    )
+    filters = {"permissions_allowed": args.permissions}
+
+    start = time.perf_counter()
+    looped = [db_manager.search_documents(query_embedding, args.limit, **filters) for query_embedding in query_embeddings]
+    loop_seconds = time.perf_counter() - start
+
+    print("\n" + "=" * 70)
+    print(f"{'loop':<16} {args.queries / loop_seconds:9.1f} queries/s")
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        batched = []
+        for offset in range(0, len(query_embeddings), batch_size):
+            batched.extend(db_manager.search_documents_batch(query_embeddings[offset:offset + batch_size], args.limit, **filters))
+        seconds = time.perf_counter() - start
+        same = all([row["id"] for row in a] == [row["id"] for row in b] for a, b in zip(looped, batched))
+        print(f"batch of {batch_size:<7} {args.queries / seconds:9.1f} queries/s  "
+              f"x{loop_seconds / seconds:5.1f}  {'identical' if same else 'DIFFERENT'} results")
+    print("=" * 70)
+    db_manager.close()
@@ -0,0 +1,82 @@
+"""Compare the legacy string-interpolated vector search against the prepared, bound-parameter search.
+
+For each filter mix the same query vectors are searched with both paths; the legacy path
+sends a unique ~30KB SQL text per query, so Postgres has to parse and plan it every time.
+
+Usage: python -m src.pg_vector_test.bench_search_prepared --queries 50
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import text
+
+from src.db.db_manager import DatabaseManager
+from src.db.vector_index import DEFAULT_METRIC, DISTANCE_OPERATORS
+from src.embeddings import LocalEmbeddingBackend
+
+
+def legacy_search(db_manager, query_embedding, limit=5, **filters):
+    """The previous search_documents implementation, kept here as the baseline."""
+    query_embedding_cast = f"ARRAY{list(query_embedding)}::vector"
+    sql_query = f"""
+        SELECT
+            embeddings.content,
+            resources.resource_name,
+            embeddings.embedding {DISTANCE_OPERATORS[DEFAULT_METRIC]} {query_embedding_cast} AS distance
+        FROM embeddings
+        JOIN resources ON embeddings.resource_id = resources.id
+    """
+    clauses = [f"resources.{name} = :{name}" for name, value in filters.items() if value is not None]
+    params = {name: value for name, value in filters.items() if value is not None}
+    params["limit"] = limit
+    if clauses:
+        sql_query += " WHERE " + " AND ".join(clauses)
+    sql_query += " ORDER BY distance LIMIT :limit"
+    return db_manager.session.execute(text(sql_query), params).fetchall()
+
+
+def time_queries(search, query_embeddings, filters):
+    latencies = []
+    for query_embedding in query_embeddings:
+        start = time.perf_counter()
+        search(query_embedding, **filters)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    return f"p50={statistics.median(ordered):7.2f}ms p95={p95:7.2f}ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager()
+    categories = list(db_manager.get_categories().values())
+    subsections = list(db_manager.get_subsections().values())
+    filter_mixes = {
+        "no filters": {},
+        "permissions": {"permissions_allowed": "paid"},
+        "permissions+category": {"permissions_allowed": "paid", "category_id": categories[0] if categories else None},
+        "category+subsection": {
+            "category_id": categories[0] if categories else None,
+            "sub_section_id": subsections[0] if subsections else None,
+        },
+    }
+    query_embeddings = LocalEmbeddingBackend().embed(
+        [f"benchmark query {i} about health education" for i in range(args.queries)]
+    )
+
+    print("\n" + "=" * 70)
+    for name, filters in filter_mixes.items():
+        legacy = time_queries(lambda q, **f: legacy_search(db_manager, q, **f), query_embeddings, filters)
+        prepared = time_queries(db_manager.search_documents, query_embeddings, filters)
+        print(f"{name:<22} legacy   {summarize(legacy)}")
+        print(f"{'':<22} prepared {summarize(prepared)}")
+    print("=" * 70)
+    db_manager.close()
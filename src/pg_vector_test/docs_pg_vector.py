@@ -5,6 +5,9 @@ import numpy as np
 from dotenv import load_dotenv
 import os
 
+from src.db.config import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+from src.db.vector_index import DEFAULT_METRIC, DISTANCE_OPERATORS, similarity_from_distance
+
 load_dotenv()
 
 db_name = os.getenv("DB_NAME")
@@ -23,17 +26,17 @@ conn = psycopg2.connect(connection_string)
 cur = conn.cursor()
 
 # Create a table for our documents
-cur.execute("""
+cur.execute(f"""
     CREATE TABLE IF NOT EXISTS documents (
         id SERIAL PRIMARY KEY,
         content TEXT,
-        embedding vector(1536)
+        embedding vector({EMBEDDING_DIMENSIONS})
     )
 """)
 
 # Function to get embeddings from OpenAI
 def get_embedding(text):
-    response = openai.embeddings.create(input=text, model="text-embedding-3-small")
+    response = openai.embeddings.create(input=text, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS)
     return response.data[0].embedding
 
 # Function to add a document
@@ -46,8 +49,8 @@ def add_document(content):
 def search_documents(query, limit=5):
     query_embedding = get_embedding(query)
     # Cast the query embedding to vector
-    cur.execute("""
-        SELECT content, embedding <-> %s::vector AS distance
+    cur.execute(f"""
+        SELECT content, embedding {DISTANCE_OPERATORS[DEFAULT_METRIC]} %s::vector AS distance
         FROM documents
         ORDER BY distance
         LIMIT %s
@@ -69,7 +72,7 @@ search_query = "Tell me about programming languages"
 results = search_documents(search_query)
 print(f"Search results for: '{search_query}'")
 for i, (content, distance) in enumerate(results, 1):
-    print(f"{i}. {content} (Distance: {distance:.4f})")
+    print(f"{i}. {content} (Distance: {distance:.4f}, Similarity: {similarity_from_distance(distance):.4f})")
 
 # Clean up
 cur.close()
@@ -0,0 +1,162 @@
+"""Second-stage re-ranking of search candidates.
+
+The first stage (ANN or hybrid search) over-fetches cheaply; a `Reranker` then scores
+the top-N candidates against the query and the best k are returned. `RerankingStage`
+adds what a production re-ranker needs around any scorer: batched scoring, a cache of
+(query, chunk) scores, and a latency budget after which the first-stage order is
+returned unchanged (scoring finishes in the background and fills the cache, so the
+next identical search is re-ranked).
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from src.cache import LRUCache
+
+_rerank_pool = ThreadPoolExecutor(max_workers=int(os.getenv("RERANK_THREADS", "4")), thread_name_prefix="rerank")
+
+
+class Reranker(ABC):
+    """Base class for scorers that judge how well each text answers a query."""
+
+    name = None
+
+    @abstractmethod
+    def score(self, query, texts):
+        """Return one relevance score per text (higher is better), in input order."""
+
+
+class LexicalOverlapReranker(Reranker):
+    """Scores a text by the share of weighted query terms and adjacent term pairs it contains.
+
+    Each query term found in a text adds its weight (its length, capped, as a cheap
+    proxy for how specific it is, so "CHW" or "diabetes" count more than "of"), and
+    adjacent query term pairs found in order add a phrase bonus; scores lie in [0, 1].
+    A text's score depends only on the query and that text, as the score cache requires,
+    and identical inputs always give identical rankings.
+    """
+
+    name = "lexical-overlap"
+
+    def __init__(self, phrase_weight=0.5, max_term_weight=8):
+        self.phrase_weight = phrase_weight
+        self.max_term_weight = max_term_weight
+
+    @staticmethod
+    def tokens(text):
+        return re.findall(r"\w+", text.lower())
+
+    def score(self, query, texts):
+        query_terms = list(dict.fromkeys(self.tokens(query)))
+        if not query_terms:
+            return [0.0] * len(texts)
+        weights = {term: min(len(term), self.max_term_weight) for term in query_terms}
+        query_pairs = set(zip(query_terms, query_terms[1:]))
+        total = sum(weights.values()) + self.phrase_weight * len(query_pairs)
+        scores = []
+        for text in texts:
+            document = self.tokens(text)
+            terms = set(document)
+            overlap = sum(weight for term, weight in weights.items() if term in terms)
+            phrases = len(query_pairs & set(zip(document, document[1:])))
+            scores.append((overlap + self.phrase_weight * phrases) / total)
+        return scores
+
+
+def get_reranker(name=None):
+    """Build a reranker by name ("lexical" or "none"); defaults to the RERANKER env var."""
+    name = (name or os.getenv("RERANKER", "none")).lower()
+    if name == "none":
+        return None
+    if name == "lexical":
+        return LexicalOverlapReranker()
+    raise ValueError(f"Unknown reranker: {name}")
+
+
+class RerankingStage:
+    """Re-scores first-stage candidates with a `Reranker` under a latency budget.
+
+    Candidates are scored in batches of `batch_size`; scores are cached per
+    (reranker, query, chunk content). If scoring the uncached candidates takes longer
+    than `budget_ms`, `rerank` returns the first-stage order instead; 0 always does
+    unless every score is cached, and None disables the budget (waits for scoring).
+    """
+
+    def __init__(self, reranker, batch_size=32, budget_ms=200, cache_entries=10_000):
+        if budget_ms is not None and budget_ms < 0:
+            raise ValueError(f"budget_ms must be >= 0 or None, got {budget_ms!r}")
+        self.reranker = reranker
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.cache = LRUCache(max_entries=cache_entries)
+
+    def key(self, query, content):
+        digest = hashlib.blake2b(f"{' '.join(query.lower().split())}\0{content}".encode("utf-8"), digest_size=16)
+        return f"{self.reranker.name}:{digest.hexdigest()}"
+
+    def _score_batches(self, query, texts, keys):
+        """Score and cache `texts` batch by batch; returns {key: score}."""
+        scored = {}
+        for start in range(0, len(texts), self.batch_size):
+            scores = self.reranker.score(query, texts[start:start + self.batch_size])
+            for key, score in zip(keys[start:start + self.batch_size], scores):
+                self.cache.set(key, score)
+                scored[key] = score
+        return scored
+
+    def rerank(self, query, candidates, k):
+        """Return (top `k` candidates with a `rerank_score`, info dict).
+
+        `info` has `rerank_ms`, `cached` (scores served from cache), `scored` and
+        `fallback` (True when the budget ran out and first-stage order was kept).
+        """
+        start = time.perf_counter()
+        keys = [self.key(query, candidate["content"]) for candidate in candidates]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [index for index, score in enumerate(scores) if score is None]
+        info = {"cached": len(candidates) - len(missing), "scored": len(missing), "fallback": False}
+
+        if missing:
+            texts = [candidates[index]["content"] for index in missing]
+            future = _rerank_pool.submit(self._score_batches, query, texts, [keys[index] for index in missing])
+            try:
+                scored = future.result(timeout=None if self.budget_ms is None else self.budget_ms / 1000)
+            except TimeoutError:
+                info.update(fallback=True, rerank_ms=(time.perf_counter() - start) * 1000)
+                return candidates[:k], info
+            scores = [scored[key] if score is None else score for key, score in zip(keys, scores)]
+
+        order = sorted(range(len(candidates)), key=lambda index: -scores[index])  # Stable: ties keep first-stage order
+        results = [dict(candidates[index], rerank_score=scores[index]) for index in order[:k]]
+        info["rerank_ms"] = (time.perf_counter() - start) * 1000
+        return results, info
+
+
+_reranking_stage = None
+_reranking_lock = threading.Lock()
+
+
+def get_reranking_stage():
+    """Process-wide re-ranking stage, or None when RERANKER is "none" (the default).
+
+    Configured with RERANKER, RERANK_BATCH_SIZE, RERANK_BUDGET_MS ("none" disables the
+    budget) and RERANK_CACHE_SIZE.
+    """
+    global _reranking_stage
+    with _reranking_lock:
+        if _reranking_stage is None:
+            reranker = get_reranker()
+            if reranker is None:
+                return None
+            budget_ms = os.getenv("RERANK_BUDGET_MS", "200")
+            _reranking_stage = RerankingStage(
+                reranker,
+                batch_size=int(os.getenv("RERANK_BATCH_SIZE", "32")),
+                budget_ms=None if budget_ms.lower() == "none" else float(budget_ms),
+                cache_entries=int(os.getenv("RERANK_CACHE_SIZE", "10000")),
+            )
+        return _reranking_stage
@@ -0,0 +1,206 @@
+"""Segmenting transcription for long video and audio files.
+
+A recording is decoded once by ffmpeg, which in the same pass writes a compact mono
+16 kHz MP3 and reports the silences in the track. The MP3 is cut into segments of at
+most `max_segment_seconds`, preferably in the middle of a silence, by stream copy (no
+re-encode). Segments are transcribed concurrently and stitched back into one transcript
+with timestamps relative to the start of the recording.
+"""
+import os
+import re
+import subprocess
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import openai
+from dotenv import load_dotenv
+from moviepy.config import get_setting
+
+load_dotenv()
+openai.api_key = os.getenv("OPENAI_API_KEY")
+
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_BITRATE = "32k"  # ~14 MB per hour of speech, far below Whisper's 25 MB upload limit per segment
+DEFAULT_MAX_SEGMENT_SECONDS = 600
+SPLIT_MODES = ("silence", "fixed")
+
+_SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end: (-?[\d.]+)")
+_DURATION = re.compile(r"Duration: (\d+):(\d+):([\d.]+)")
+_PROGRESS_TIME = re.compile(r"time=(\d+):(\d+):([\d.]+)")
+
+
+class TranscriptionBackend(ABC):
+    """Base class for the services that turn an audio file into timed text segments."""
+
+    model = None
+
+    @abstractmethod
+    def transcribe(self, audio_path):
+        """Return [{"start", "end", "text"}] with times in seconds from the start of the file."""
+
+
+class WhisperTranscriptionBackend(TranscriptionBackend):
+    """Transcribes through the OpenAI Whisper endpoint, keeping its segment timestamps."""
+
+    def __init__(self, model="whisper-1"):
+        self.model = model
+
+    def transcribe(self, audio_path):
+        with open(audio_path, 'rb') as audio_file:
+            response = openai.audio.transcriptions.create(model=self.model, file=audio_file, response_format="verbose_json")
+        return self.parse_response(response)
+
+    @staticmethod
+    def parse_response(response):
+        segments = getattr(response, "segments", None)
+        if not segments:
+            return [{"start": 0.0, "end": getattr(response, "duration", None), "text": response.text.strip()}]
+        return [{"start": segment.start, "end": segment.end, "text": segment.text.strip()} for segment in segments]
+
+
+class LocalTranscriptionBackend(TranscriptionBackend):
+    """Returns one placeholder segment per audio file, naming the file and its size.
+
+    Lets the ffmpeg encoding, splitting and stitching run end to end without Whisper.
+    """
+
+    model = "local-placeholder"
+
+    def transcribe(self, audio_path):
+        size = os.path.getsize(audio_path)
+        return [{"start": 0.0, "end": None, "text": f"[audio segment {Path(audio_path).stem}, {size} bytes]"}]
+
+
+def get_transcription_backend(name=None):
+    """Build a backend by name ("whisper" or "local"); defaults to the TRANSCRIPTION_BACKEND env var."""
+    name = (name or os.getenv("TRANSCRIPTION_BACKEND", "whisper")).lower()
+    if name == "whisper":
+        return WhisperTranscriptionBackend()
+    if name == "local":
+        return LocalTranscriptionBackend()
+    raise ValueError(f"Unknown transcription backend: {name}")
+
+
+def _clock_seconds(match):
+    hours, minutes, seconds = match
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def encode_audio(media_path, audio_path, silence_db=-35, min_silence_seconds=0.5):
+    """Decode `media_path` once into a mono 16 kHz MP3, detecting silences in the same pass.
+
+    Returns (duration in seconds, [(silence start, silence end)]).
+    """
+    command = [
+        get_setting("FFMPEG_BINARY"), "-hide_banner", "-y", "-i", str(media_path),
+        "-vn", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE), "-b:a", AUDIO_BITRATE,
+        "-af", f"silencedetect=noise={silence_db}dB:d={min_silence_seconds}",
+        str(audio_path),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True, errors="replace")
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode {media_path}: {completed.stderr[-2000:]}")
+    log = completed.stderr
+
+    # The last progress time is the length actually encoded; the container header is the fallback
+    times = _PROGRESS_TIME.findall(log) or _DURATION.findall(log)
+    if not times:
+        raise RuntimeError(f"{media_path} has no audio track.")
+    duration = _clock_seconds(times[-1])
+
+    starts = [max(0.0, float(value)) for value in _SILENCE_START.findall(log)]
+    ends = [float(value) for value in _SILENCE_END.findall(log)]
+    ends += [duration] * (len(starts) - len(ends))  # A trailing silence has no end line
+    return duration, list(zip(starts, ends))
+
+
+def plan_segments(duration, silences=(), max_segment_seconds=DEFAULT_MAX_SEGMENT_SECONDS):
+    """Split [0, duration] into (start, end) windows of at most `max_segment_seconds`.
+
+    Each cut goes in the middle of the last silence in the second half of the window,
+    so words are not split; without such a silence the window is cut at its limit.
+    """
+    midpoints = sorted((start + end) / 2 for start, end in silences)
+    cuts, start = [], 0.0
+    while duration - start > max_segment_seconds:
+        limit = start + max_segment_seconds
+        candidates = [point for point in midpoints if start + max_segment_seconds / 2 <= point <= limit]
+        start = candidates[-1] if candidates else limit
+        cuts.append(start)
+    bounds = [0.0] + cuts + [duration]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def split_audio(audio_path, segments, directory):
+    """Cut the MP3 at the segment boundaries by stream copy; returns one file path per segment."""
+    if len(segments) == 1:
+        return [str(audio_path)]
+    command = [
+        get_setting("FFMPEG_BINARY"), "-hide_banner", "-loglevel", "error", "-y", "-i", str(audio_path),
+        "-f", "segment", "-segment_times", ",".join(f"{end:.3f}" for _, end in segments[:-1]),
+        "-reset_timestamps", "1", "-c", "copy", os.path.join(directory, "segment_%04d.mp3"),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True, errors="replace")
+    if completed.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not split {audio_path}: {completed.stderr[-2000:]}")
+    paths = sorted(str(path) for path in Path(directory).glob("segment_*.mp3"))
+    if len(paths) != len(segments):
+        # ffmpeg cuts at keyframes; a missing or extra file would shift every later timestamp
+        raise RuntimeError(f"ffmpeg split {audio_path} into {len(paths)} files, expected {len(segments)} segments")
+    return paths
+
+
+def stitch_transcript(segments, transcriptions):
+    """Merge per-segment transcriptions into recording-relative timed segments and text.
+
+    Returns {"text": one "[HH:MM:SS] ..." line per timed segment, "segments": [...]}.
+    """
+    if len(segments) != len(transcriptions):
+        raise ValueError(f"Got {len(transcriptions)} transcriptions for {len(segments)} segments")
+    timed = []
+    for (start, end), parts in zip(segments, transcriptions):
+        for part in parts:
+            if not part["text"]:
+                continue
+            part_end = start + part["end"] if part["end"] is not None else end
+            timed.append({"start": start + part["start"], "end": min(part_end, end), "text": part["text"]})
+    text = "\n".join(f"[{format_timestamp(part['start'])}] {part['text']}" for part in timed)
+    return {"text": text, "segments": timed}
+
+
+class SegmentedTranscriber:
+    """Transcribes recordings of any length: encode once, split, transcribe segments concurrently, stitch.
+
+    `split_on` is "silence" (cut inside pauses where possible) or "fixed" (plain windows).
+    """
+
+    def __init__(self, backend=None, max_segment_seconds=DEFAULT_MAX_SEGMENT_SECONDS, split_on="silence", concurrency=4):
+        if split_on not in SPLIT_MODES:
+            raise ValueError(f"split_on must be one of {SPLIT_MODES}, got {split_on!r}")
+        self.backend = backend or get_transcription_backend()
+        self.max_segment_seconds = max_segment_seconds
+        self.split_on = split_on
+        self.concurrency = concurrency
+
+    def prepare(self, media_path, directory):
+        """Encode and split `media_path` into `directory`; returns (duration, segments, segment paths)."""
+        audio_path = os.path.join(directory, "audio.mp3")
+        duration, silences = encode_audio(media_path, audio_path)
+        segments = plan_segments(duration, silences if self.split_on == "silence" else (), self.max_segment_seconds)
+        return duration, segments, split_audio(audio_path, segments, directory)
+
+    def transcribe(self, media_path):
+        """Return {"text", "segments", "duration_seconds"} for a video or audio file."""
+        with tempfile.TemporaryDirectory() as directory:
+            duration, segments, paths = self.prepare(media_path, directory)
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                transcriptions = list(pool.map(self.backend.transcribe, paths))
+        return dict(stitch_transcript(segments, transcriptions), duration_seconds=duration)
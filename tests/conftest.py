@@ -0,0 +1,11 @@
+import os
+
+# src.db.config builds the engine URL on import; the unit tests never connect
+for name, value in {
+    "DB_USERNAME": "postgres",
+    "DB_PASSWORD": "postgres",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "pgvector_test",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from src.batch_ingest import BatchIngestPipeline, ByteBudget, iter_sources
+
+
+def test_directory_items_are_identified_by_relative_path(tmp_path):
+    for directory in ("a", "b"):
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / "report.txt").write_text("text")
+
+    items = list(iter_sources(tmp_path, {"category_id": 1}))
+
+    assert [item["resource_path"] for item in items] == ["a/report.txt", "b/report.txt"]
+    assert items[0]["category_id"] == 1
+
+
+def test_manifest_items_default_to_their_path(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(json.dumps({"path": "docs/x.pdf"}) + "\n" + json.dumps({"path": "y.pdf", "resource_path": "y"}) + "\n")
+
+    assert [item["resource_path"] for item in iter_sources(manifest, {})] == ["docs/x.pdf", "y"]
+
+
+def test_exclusive_serializes_workers_sharing_a_key():
+    pipeline = BatchIngestPipeline.__new__(BatchIngestPipeline)  # Only the lock table is needed
+    pipeline._locks = {}
+    events = []
+
+    async def worker(name, *keys):
+        async with pipeline.exclusive(*keys):
+            events.append(f"{name} in")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} out")
+
+    async def main():
+        await asyncio.gather(worker("first", ("path", "a"), ("hash", "1")), worker("second", ("hash", "1"), ("path", "b")))
+
+    asyncio.run(main())
+
+    assert events == ["first in", "first out", "second in", "second out"]
+
+
+def test_byte_budget_waits_for_room_but_admits_an_oversized_item():
+    events = []
+
+    async def main():
+        budget = ByteBudget(10)
+        await budget.acquire(8)
+        waiting = asyncio.create_task(budget.acquire(5))
+        await asyncio.sleep(0.01)
+        events.append(waiting.done())
+        await budget.release(8)
+        await waiting
+        await budget.release(5)
+        await budget.acquire(50)  # Larger than the cap, but nothing else is in flight
+        events.append(budget.used)
+
+    asyncio.run(main())
+
+    assert events == [False, 50]
@@ -0,0 +1,92 @@
+import time
+
+from src.cache import ImageAnalysisCache, LRUCache, SearchResultCache, SQLiteCache, TieredCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.keys() == ["a", "c"]
+
+
+def test_lru_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = LRUCache(ttl_seconds=10)
+    cache.set("a", 1)
+
+    now[0] += 5
+    assert cache.get("a") == 1
+    now[0] += 6
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite"))
+    disk.set("summary:abc", "partial summary")
+    cache = TieredCache(LRUCache(), disk)
+
+    assert cache.get("summary:abc") == "partial summary"
+    assert cache.get("summary:abc") == "partial summary"
+    assert cache.get("missing") is None
+    assert cache.stats == {"memory_hits": 1, "disk_hits": 1, "misses": 1}
+    assert cache.hit_rate() == 2 / 3
+
+
+def test_get_or_compute_computes_once(tmp_path):
+    calls = []
+    cache = TieredCache(LRUCache(), SQLiteCache(str(tmp_path / "cache.sqlite")))
+
+    def compute():
+        calls.append(1)
+        return ["result"]
+
+    assert cache.get_or_compute("key", compute) == ["result"]
+    assert cache.get_or_compute("key", compute) == ["result"]
+    assert len(calls) == 1
+    assert TieredCache(LRUCache(), cache.disk).get("key") == ["result"]
+
+
+def test_image_cache_matches_exact_digests_by_default():
+    cache = ImageAnalysisCache()
+    cache.set("vision", "digest-1", "slide 1", 0b1011_0000)
+
+    assert cache.get("vision", "digest-1", 0b1011_0000) == "slide 1"
+    # A different page whose perceptual hash collides is not served the first page's analysis
+    assert cache.get("vision", "digest-2", 0b1011_0000) is None
+
+
+def test_image_cache_near_duplicates_are_opt_in():
+    cache = ImageAnalysisCache(max_distance=2)
+    cache.set("vision", "digest-1", "photo", 0b1011_0000)
+
+    assert cache.get("vision", "digest-2", 0b1011_0011) == "photo"
+    assert cache.get("vision", "digest-3", 0b1011_0111) is None
+    assert cache.get("other-model", "digest-1", 0b1011_0000) is None
+    assert cache.near_hits == 1
+
+
+def test_search_results_are_returned_as_copies():
+    cache = SearchResultCache()
+    embedding = [0.1, 0.2]
+    first = cache.get_or_search("sql", embedding, lambda: [{"id": 1, "similarity": 0.9}], limit=5)
+    first[0]["similarity"] = 0.0
+
+    second = cache.get_or_search("sql", embedding, lambda: [], limit=5)
+
+    assert second == [{"id": 1, "similarity": 0.9}]
+
+
+def test_bump_invalidates_search_results():
+    cache = SearchResultCache()
+    cache.get_or_search("sql", [0.1], lambda: ["before"])
+    cache.bump()
+
+    assert cache.get_or_search("sql", [0.1], lambda: ["after"]) == ["after"]
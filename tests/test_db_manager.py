@@ -0,0 +1,40 @@
+from src.db import db_manager
+from src.db.db_manager import DatabaseManager
+
+
+class FakeSession:
+    def __init__(self):
+        self.commits = 0
+
+    def execute(self, *args):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+
+def manager_with(monkeypatch, session, bumps):
+    monkeypatch.setattr(db_manager, "bump_corpus_version", lambda: bumps.append(session.commits))
+    manager = DatabaseManager.__new__(DatabaseManager)  # Skips ensure_schema
+    manager._session = session
+    return manager
+
+
+def test_uncommitted_chunks_do_not_bump_the_corpus_version(monkeypatch):
+    session, bumps = FakeSession(), []
+    manager = manager_with(monkeypatch, session, bumps)
+
+    manager.add_chunks(1, [], commit=False)
+    assert bumps == []
+
+    manager.add_chunks(1, [])
+    assert bumps == [1]  # After the commit
+
+
+def test_sync_bumps_after_its_commit(monkeypatch):
+    session, bumps = FakeSession(), []
+    manager = manager_with(monkeypatch, session, bumps)
+
+    manager.sync_resource_chunks(1, new_chunks=[], kept_chunks={}, stale_chunk_ids=[])
+
+    assert bumps == [1]
@@ -0,0 +1,48 @@
+import numpy as np
+
+from src.diversify import cap_per_resource, diversify, mmr
+
+
+def hit(chunk_id, resource_id, chunk_order):
+    return {"id": chunk_id, "resource_id": resource_id, "chunk_order": chunk_order,
+            "content": f"chunk {chunk_id}", "similarity": 1.0 - chunk_id / 10}
+
+
+QUERY = [1.0, 0.0]
+# Two near-duplicates of the query, then a less relevant but different direction
+EMBEDDINGS = np.array([[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]])
+
+
+def test_mmr_with_lambda_one_ranks_by_relevance():
+    assert mmr(QUERY, EMBEDDINGS, k=3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_mmr_skips_near_duplicates():
+    assert mmr(QUERY, EMBEDDINGS, k=2, lambda_mult=0.3) == [0, 2]
+
+
+def test_mmr_respects_group_caps_and_empty_input():
+    assert mmr(QUERY, EMBEDDINGS, k=3, lambda_mult=1.0, groups=["a", "a", "b"], max_per_group=1) == [0, 2]
+    assert mmr(QUERY, np.zeros((0, 2)), k=3) == []
+
+
+def test_cap_per_resource_preserves_order():
+    results = [hit(1, 10, 0), hit(2, 10, 1), hit(3, 20, 0), hit(4, 10, 2)]
+
+    assert [result["id"] for result in cap_per_resource(results, 2)] == [1, 2, 3]
+    assert [result["id"] for result in cap_per_resource(results, 1, limit=1)] == [1]
+
+
+def test_collapse_attaches_chunks_in_document_order():
+    results = [hit(1, 10, 5), hit(2, 20, 0), hit(3, 10, 2)]
+
+    collapsed = diversify(results, QUERY, limit=5, collapse=True)
+
+    assert [result["id"] for result in collapsed] == [1, 2]
+    assert [chunk["chunk_order"] for chunk in collapsed[0]["chunks"]] == [2, 5]
+
+
+def test_diversify_without_options_truncates():
+    results = [hit(1, 10, 0), hit(2, 10, 1)]
+
+    assert diversify(results, QUERY, limit=1) == results[:1]
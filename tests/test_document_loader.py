@@ -0,0 +1,78 @@
+import asyncio
+
+from langchain.docstore.document import Document
+
+from src.async_document_loader import AsyncUniversalDocumentProcessor
+from src.cache import LRUCache
+from src.document_loader import UniversalDocumentProcessor
+from src.embeddings import LocalEmbeddingBackend
+
+
+def units(*texts):
+    return (Document(page_content=text) for text in texts)
+
+
+def processor_with_fake_gpt(processor):
+    processor.count_tokens = lambda text: len(text.split())
+    processor.summary_cache = LRUCache()  # No partial summaries cached by earlier tests
+    processor.prompts = []
+
+    def ask_gpt(prompt, image=None, mime_type="image/jpeg"):
+        processor.prompts.append(prompt)
+        return f"summary {len(processor.prompts)}", 10, 1
+    return ask_gpt
+
+
+def sync_processor(**options):
+    processor = UniversalDocumentProcessor(embedding_backend=LocalEmbeddingBackend(dimensions=8), **options)
+    processor.ask_gpt = processor_with_fake_gpt(processor)
+    return processor
+
+
+def test_short_documents_are_summarized_in_one_request():
+    processor = sync_processor(summary_max_tokens=100, summary_group_tokens=10)
+
+    summary, prompt_tokens, _ = processor.summarize_units(units("one two", "three four"))
+
+    assert (summary, prompt_tokens) == ("summary 1", 10)
+    assert "one two\n\nthree four" in processor.prompts[0]
+
+
+def test_long_documents_are_summarized_window_by_window():
+    processor = sync_processor(summary_max_tokens=6, summary_group_tokens=4)
+
+    summary, prompt_tokens, completion_tokens = processor.summarize_units(units("a b c", "d e f", "g h i", "j"))
+
+    # Windows "a b c", "d e f", "g h i\n\nj", then one reduce over their summaries
+    assert len(processor.prompts) == 4
+    assert "g h i\n\nj" in processor.prompts[2]
+    assert (summary, prompt_tokens, completion_tokens) == ("summary 4", 40, 4)
+
+
+def test_units_are_read_lazily():
+    processor = sync_processor(summary_max_tokens=100, summary_group_tokens=2)
+    read = []
+
+    def lazy_units():
+        for text in ("a b", "c d", "e f"):
+            read.append(text)
+            yield Document(page_content=text)
+
+    windows = processor.iter_summary_windows(lazy_units())
+    next(windows)
+
+    assert read == ["a b", "c d"]
+
+
+def test_async_summary_matches_the_sync_one():
+    processor = AsyncUniversalDocumentProcessor(embedding_backend=LocalEmbeddingBackend(dimensions=8), client=object())
+    processor.summary_max_tokens, processor.summary_group_tokens = 6, 4
+    fake = processor_with_fake_gpt(processor)
+
+    async def ask_gpt(prompt, image=None, mime_type="image/jpeg"):
+        return fake(prompt)
+    processor.ask_gpt = ask_gpt
+
+    summary, prompt_tokens, _ = asyncio.run(processor.summarize_units(units("a b c", "d e f", "g h i", "j")))
+
+    assert (summary, prompt_tokens, len(processor.prompts)) == ("summary 4", 40, 4)
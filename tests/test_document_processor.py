@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from langchain.docstore.document import Document
+
+from src.document_processor import ChunkIndexer, hash_text
+
+
+class FakeDatabaseManager:
+    def __init__(self, chunk_hashes):
+        self.chunk_hashes = chunk_hashes
+        self.added = []
+        self.synced = None
+
+    def get_chunk_hashes(self, resource_id):
+        return self.chunk_hashes
+
+    def add_chunks(self, resource_id, chunks, commit=True):
+        self.added.extend(chunks)
+
+    def sync_resource_chunks(self, resource_id, **changes):
+        self.synced = changes
+
+
+def chunk(text, **metadata):
+    return Document(page_content=text, metadata=dict(metadata, summary=True))
+
+
+def test_reingest_updates_attributes_and_kept_chunk_metadata():
+    previous = SimpleNamespace(id=7, sub_section_id=1, learning_type_id=2, category_id=3, permissions_allowed="free")
+    db_manager = FakeDatabaseManager({(True, hash_text("kept")): [70]})
+    indexer = ChunkIndexer(db_manager, lambda texts: [[0.0]] * len(texts), "doc.pdf", previous, "hash", "sql",
+                           sub_section_id=1, learning_type_id=2, category_id=9, permissions_allowed="paid")
+
+    indexer.index_batch([chunk("new", category_id=9), chunk("kept", category_id=9)])
+    counts = indexer.finish()
+
+    assert db_manager.synced["resource_values"] == {"category_id": 9, "permissions_allowed": "paid"}
+    order, metadata = db_manager.synced["kept_chunks"][70]
+    assert (order, metadata["vector_order"], metadata["category_id"]) == (1, 1, 9)
+    assert [added["chunk_order"] for added in db_manager.added] == [0]
+    assert (counts["chunks_added"], counts["chunks_reused"], counts["chunks_removed"]) == (1, 1, 0)
@@ -0,0 +1,40 @@
+import numpy as np
+
+from src.embeddings import BatchEmbedder, LocalEmbeddingBackend
+
+
+class CountingBackend(LocalEmbeddingBackend):
+    def __init__(self):
+        super().__init__(dimensions=16)
+        self.requests = []
+
+    def embed(self, texts):
+        self.requests.append(list(texts))
+        return super().embed(texts)
+
+
+def test_each_text_is_embedded_once_in_order():
+    backend = CountingBackend()
+    texts = [f"chunk {i} about community health" for i in range(25)]
+
+    embeddings = BatchEmbedder(backend, batch_size=10).embed(texts)
+
+    assert [len(batch) for batch in backend.requests] == [10, 10, 5]
+    assert sum(backend.requests, []) == texts
+    assert embeddings == LocalEmbeddingBackend(dimensions=16).embed(texts)
+
+
+def test_batches_respect_the_token_budget():
+    embedder = BatchEmbedder(CountingBackend(), batch_size=100, max_batch_tokens=10)
+    embedder.count_tokens = len
+
+    batches = list(embedder.iter_batches(["aaaa", "bbbb", "cccc", "d" * 25, "e"]))
+
+    assert batches == [["aaaa", "bbbb"], ["cccc"], ["d" * 25], ["e"]]
+
+
+def test_local_backend_returns_unit_vectors():
+    vectors = np.array(LocalEmbeddingBackend(dimensions=32).embed(["diabetes care", ""]))
+
+    assert vectors.shape == (2, 32)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
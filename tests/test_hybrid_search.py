@@ -0,0 +1,46 @@
+import pytest
+
+from src.db.db_manager import fuse_results
+
+
+def vector_hit(chunk_id, distance):
+    return {"id": chunk_id, "content": f"chunk {chunk_id}", "resource_name": "doc.pdf", "resource_id": 1,
+            "chunk_order": chunk_id, "distance": distance, "similarity": 1 - distance}
+
+
+def text_hit(chunk_id, rank):
+    return {"id": chunk_id, "content": f"chunk {chunk_id}", "resource_name": "doc.pdf", "resource_id": 1,
+            "chunk_order": chunk_id, "rank": rank}
+
+
+def test_rrf_ranks_chunks_found_by_both_sides_first():
+    vector = [vector_hit(1, 0.1), vector_hit(2, 0.2), vector_hit(3, 0.3)]
+    lexical = [text_hit(3, 0.9), text_hit(4, 0.5)]
+
+    fused = fuse_results(vector, lexical, limit=3)
+
+    assert [entry["id"] for entry in fused] == [3, 1, 2]
+    assert fused[0]["score"] == pytest.approx(1 / 63 + 1 / 61)
+    assert (fused[0]["distance"], fused[0]["rank"]) == (0.3, 0.9)
+    assert (fused[1]["rank"], fused[1]["similarity"]) == (None, 0.9)
+
+
+def test_weighted_fusion_normalizes_each_side():
+    vector = [vector_hit(1, 0.1), vector_hit(2, 0.5)]
+    lexical = [text_hit(2, 4.0), text_hit(3, 2.0)]
+
+    fused = fuse_results(vector, lexical, limit=5, fusion="weighted", weights=(1.0, 2.0))
+
+    assert {entry["id"]: entry["score"] for entry in fused} == {2: 2.0, 1: 1.0, 3: 0.0}
+
+
+def test_one_sided_results_and_unknown_fusion():
+    assert [entry["id"] for entry in fuse_results([], [text_hit(7, 0.1)], limit=5)] == [7]
+    with pytest.raises(ValueError):
+        fuse_results([], [], limit=5, fusion="max")
+
+
+def test_fused_results_keep_the_search_result_keys():
+    fused = fuse_results([vector_hit(1, 0.1)], [text_hit(4, 0.5)], limit=5)
+
+    assert [(entry["resource_id"], entry["chunk_order"]) for entry in fused] == [(1, 1), (1, 4)]
@@ -0,0 +1,41 @@
+import hashlib
+
+import pytest
+from PIL import Image
+
+from src.image_preprocessor import dhash, prepare_image, target_size
+
+
+def test_low_detail_fits_512():
+    assert target_size(4000, 3000, "low") == (512, 384)
+    assert target_size(1000, 4000, "low") == (128, 512)
+
+
+def test_high_detail_fits_2048_then_768_short_side():
+    assert target_size(4000, 3000, "high") == (1024, 768)
+    assert target_size(8000, 2000, "high") == (2048, 512)
+    assert target_size(1600, 1200, "high") == (1024, 768)
+
+
+def test_small_images_are_not_upscaled():
+    assert target_size(300, 200, "low") == (300, 200)
+    assert target_size(700, 500, "high") == (700, 500)
+
+
+def test_unknown_detail_is_rejected():
+    with pytest.raises(ValueError):
+        target_size(100, 100, "auto")
+
+
+def test_prepare_image_downscales_and_keeps_hash(tmp_path):
+    path = tmp_path / "photo.png"
+    Image.linear_gradient("L").resize((2000, 1000)).convert("RGB").save(path)
+
+    prepared = prepare_image(path, detail="low")
+
+    assert prepared["size"] == (512, 256)
+    assert prepared["original_size"] == (2000, 1000)
+    assert prepared["mime_type"] == "image/jpeg"
+    with Image.open(path) as image:
+        assert prepared["hash"] == dhash(image)
+    assert prepared["digest"] == hashlib.sha256(path.read_bytes()).hexdigest()
@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from src import local_search
+from src.local_search import NULL_ID, LocalSearchIndex, _RowWriter
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LocalSearchIndex(str(tmp_path))
+
+
+@pytest.fixture
+def state():
+    return {
+        "manifest": {"permissions": ["free", "premium"]},
+        "live": np.array([True, True, True, True, False]),
+        "resource_ids": np.array([1, 1, 2, 2, 1]),
+        "permissions": np.array([0, 1, 0, NULL_ID, 0], dtype=np.int16),
+        "category_ids": np.array([5, 5, NULL_ID, 6, 5], dtype=np.int32),
+        "sub_section_ids": np.array([7, 7, 7, 7, 7], dtype=np.int32),
+        "learning_type_ids": np.array([3, NULL_ID, 3, 3, 3], dtype=np.int32),
+        "summary": np.array([True, False, True, False, True]),
+    }
+
+
+def mask(index, state, **filters):
+    arguments = dict(resource_id=None, permissions_allowed=None, category_id=None, sub_section_id=None,
+                     learning_type_id=None, chunk_type=None)
+    return np.flatnonzero(index._mask(state, **dict(arguments, **filters))).tolist()
+
+
+def test_no_filters_keeps_live_rows(index, state):
+    assert mask(index, state) == [0, 1, 2, 3]
+
+
+def test_filters_combine(index, state):
+    assert mask(index, state, resource_id=1) == [0, 1]
+    assert mask(index, state, resource_id=1, permissions_allowed="free") == [0]
+    assert mask(index, state, category_id=5, learning_type_id=3) == [0]
+    assert mask(index, state, sub_section_id=7, chunk_type="body") == [1, 3]
+
+
+def test_unknown_permission_matches_nothing(index, state):
+    assert mask(index, state, permissions_allowed="staff") == []
+
+
+def test_invalid_chunk_type_is_rejected(index, state):
+    with pytest.raises(ValueError):
+        mask(index, state, chunk_type="appendix")
+
+
+def test_row_writer_drops_bytes_past_the_committed_size(tmp_path):
+    vector_path, text_path = tmp_path / "vectors-1.bin", tmp_path / "texts-1.jsonl"
+    vector_path.write_bytes(np.ones((3, 2), dtype=np.float32).tobytes())
+    text_path.write_bytes(b"a\nb\ninterrupted\n")
+    manifest = {"count": 2, "dimensions": 2, "text_bytes": 4}
+
+    with _RowWriter((str(vector_path), str(text_path)), manifest, np.dtype(np.float32)) as writer:
+        writer.append({"ids": 3}, np.full(2, 2.0, dtype=np.float32), b"c\n")
+
+    assert text_path.read_bytes() == b"a\nb\nc\n"
+    assert np.fromfile(vector_path, dtype=np.float32).tolist() == [1, 1, 1, 1, 2, 2]
+    assert writer.rows["text_offsets"] == [4]
+
+
+class FakeResult(list):
+    def scalar(self):
+        return self[0]
+
+    def scalars(self):
+        return iter(self)
+
+
+class FakeConnection:
+    """Answers the snapshot queries from `rows`; `changed` ids count as updated since the last refresh."""
+
+    def __init__(self, rows, changed):
+        self.rows, self.changed = rows, changed
+
+    def execution_options(self, **options):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, statement, params=None):
+        statement = str(statement)
+        if "pg_stat_activity" in statement:
+            return FakeResult([datetime.now(timezone.utc)])
+        if statement.startswith("SELECT id"):
+            return FakeResult(sorted(self.rows))
+        if "updated_at" in statement:
+            return FakeResult([self.rows[i] for i in sorted(self.changed) if i in self.rows and i <= params["max_id"]])
+        return FakeResult([self.rows[i] for i in sorted(self.rows) if i > params["max_id"]])
+
+
+def fake_row(chunk_id):
+    vector = [float(chunk_id), 1.0] + [0.0] * (local_search.EMBEDDING_DIMENSIONS - 2)
+    return (chunk_id, 1, chunk_id, None, None, None, "free", True, vector, f"text {chunk_id}", "doc")
+
+
+def test_refresh_inserts_rows_committed_below_the_snapshot_max_id(tmp_path, monkeypatch):
+    rows, changed = {i: fake_row(i) for i in (1, 2, 4, 6)}, set()
+    monkeypatch.setattr(local_search, "engine", type("FakeEngine", (), {"connect": lambda self: FakeConnection(rows, changed)})())
+    index = LocalSearchIndex(str(tmp_path), block_rows=2)
+    index.export()
+
+    # 3 and 5 were inserted before 6 but committed after the export read it
+    rows.update({3: fake_row(3), 5: fake_row(5), 7: fake_row(7)})
+    changed.update({3, 5})
+    del rows[6]
+
+    assert index.refresh() == {"added": 3, "updated": 0, "removed": 1}
+    assert index._state["ids"].tolist() == [1, 2, 3, 4, 5, 7]
+    results = index.search(list(fake_row(3)[8]), limit=6)
+    assert sorted((result["id"], result["content"]) for result in results) == [(i, f"text {i}") for i in (1, 2, 3, 4, 5, 7)]
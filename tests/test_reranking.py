@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from src.reranking import LexicalOverlapReranker, Reranker, RerankingStage
+
+
+class CountingReranker(Reranker):
+    name = "counting"
+
+    def __init__(self, release=None):
+        self.calls = 0
+        self.release = release
+
+    def score(self, query, texts):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        return [float(len(text)) for text in texts]
+
+
+def candidates(*texts):
+    return [{"id": index, "content": text} for index, text in enumerate(texts)]
+
+
+def test_reranker_must_implement_score():
+    with pytest.raises(TypeError):
+        Reranker()
+
+
+def test_lexical_overlap_prefers_matching_terms():
+    scores = LexicalOverlapReranker().score("community health workers", ["health workers in the community", "weather report"])
+
+    assert scores[0] > scores[1] == 0.0
+
+
+def test_rerank_orders_by_score_and_caches():
+    reranker = CountingReranker()
+    stage = RerankingStage(reranker, budget_ms=None)
+
+    results, info = stage.rerank("q", candidates("a", "ccc", "bb"), k=2)
+    assert [result["content"] for result in results] == ["ccc", "bb"]
+    assert (info["scored"], info["fallback"]) == (3, False)
+
+    _, info = stage.rerank("q", candidates("a", "ccc", "bb"), k=2)
+    assert (info["cached"], reranker.calls) == (3, 1)
+
+
+def test_zero_budget_falls_back_without_waiting():
+    release = threading.Event()
+    stage = RerankingStage(CountingReranker(release), budget_ms=0)
+
+    results, info = stage.rerank("q", candidates("a", "ccc"), k=2)
+    release.set()
+
+    assert info["fallback"] is True
+    assert [result["content"] for result in results] == ["a", "ccc"]
+
+
+def test_negative_budget_is_rejected():
+    with pytest.raises(ValueError):
+        RerankingStage(CountingReranker(), budget_ms=-1)
@@ -0,0 +1,58 @@
+from unittest import mock
+
+import pytest
+
+from src.transcription import format_timestamp, plan_segments, split_audio, stitch_transcript
+
+
+def test_short_recording_is_one_segment():
+    assert plan_segments(300.0, [(100.0, 101.0)], max_segment_seconds=600) == [(0.0, 300.0)]
+
+
+def test_cuts_in_the_last_silence_of_the_second_half():
+    silences = [(100.0, 102.0), (400.0, 402.0), (500.0, 504.0), (700.0, 701.0)]
+
+    segments = plan_segments(1000.0, silences, max_segment_seconds=600)
+
+    assert segments == [(0.0, 502.0), (502.0, 1000.0)]
+
+
+def test_cuts_at_the_limit_without_a_usable_silence():
+    segments = plan_segments(1500.0, [(100.0, 101.0)], max_segment_seconds=600)
+
+    assert segments == [(0.0, 600.0), (600.0, 1200.0), (1200.0, 1500.0)]
+    assert all(end - start <= 600 for start, end in segments)
+
+
+def test_stitch_offsets_segment_times_and_skips_empty_text():
+    segments = [(0.0, 600.0), (600.0, 1200.0)]
+    transcriptions = [
+        [{"start": 0.0, "end": 5.0, "text": "Welcome."}, {"start": 5.0, "end": 6.0, "text": ""}],
+        [{"start": 65.0, "end": None, "text": "Second part."}],
+    ]
+
+    stitched = stitch_transcript(segments, transcriptions)
+
+    assert stitched["segments"] == [
+        {"start": 0.0, "end": 5.0, "text": "Welcome."},
+        {"start": 665.0, "end": 1200.0, "text": "Second part."},
+    ]
+    assert stitched["text"] == "[00:00:00] Welcome.\n[00:11:05] Second part."
+
+
+def test_stitch_rejects_a_transcription_count_mismatch():
+    with pytest.raises(ValueError):
+        stitch_transcript([(0.0, 600.0), (600.0, 1200.0)], [[{"start": 0.0, "end": 5.0, "text": "Only one."}]])
+
+
+def test_split_rejects_a_missing_segment_file(tmp_path):
+    def fake_ffmpeg(command, **kwargs):
+        (tmp_path / "segment_0000.mp3").write_bytes(b"")  # The second cut produced no file
+        return mock.Mock(returncode=0)
+
+    with mock.patch("src.transcription.subprocess.run", side_effect=fake_ffmpeg), pytest.raises(RuntimeError):
+        split_audio(tmp_path / "audio.mp3", [(0.0, 600.0), (600.0, 900.0)], str(tmp_path))
+
+
+def test_format_timestamp():
+    assert format_timestamp(3725.9) == "01:02:05"
@@ -0,0 +1,80 @@
+import pytest
+
+from src.db import vector_index
+from src.db.vector_index import VectorIndexManager
+
+
+class FakeConnection:
+    def __init__(self, statements, fail_on=None):
+        self.statements = statements
+        self.fail_on = fail_on
+
+    def execution_options(self, **options):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        if self.fail_on and self.fail_on in str(statement):
+            raise RuntimeError("statement failed")
+
+
+class FakeEngine:
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.fail_on = fail_on
+
+    def connect(self):
+        return FakeConnection(self.statements, self.fail_on)
+
+
+def test_session_settings_are_reset_even_when_the_build_fails(monkeypatch):
+    engine = FakeEngine(fail_on="CREATE INDEX")
+    monkeypatch.setattr(vector_index, "engine", engine)
+
+    with pytest.raises(RuntimeError):
+        VectorIndexManager().create_index(maintenance_work_mem="1GB")
+
+    assert engine.statements[-1] == "RESET maintenance_work_mem"
+
+
+def test_rebuild_and_drop_target_partial_indexes(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(vector_index, "engine", engine)
+    manager = VectorIndexManager()
+
+    manager.rebuild_index(metric="cosine", suffix="permissions_allowed_free")
+    manager.drop_index(metric="cosine", suffix="permissions_allowed_free")
+
+    assert engine.statements == [
+        "REINDEX INDEX embeddings_embedding_hnsw_cosine_permissions_allowed_free_idx",
+        "DROP INDEX IF EXISTS embeddings_embedding_hnsw_cosine_permissions_allowed_free_idx",
+    ]
+
+
+def test_partial_indexes_are_described_for_recreation(monkeypatch):
+    manager = VectorIndexManager()
+    monkeypatch.setattr(manager, "list_indexes", lambda: {
+        "embeddings_embedding_hnsw_cosine_idx":
+            "CREATE INDEX embeddings_embedding_hnsw_cosine_idx ON public.embeddings USING hnsw (embedding vector_cosine_ops)",
+        "embeddings_embedding_hnsw_cosine_permissions_allowed_free_idx":
+            "CREATE INDEX embeddings_embedding_hnsw_cosine_permissions_allowed_free_idx ON public.embeddings "
+            "USING hnsw (embedding vector_cosine_ops) WITH (m='24', ef_construction='100') "
+            "WHERE ((permissions_allowed)::text = 'free'::text)",
+        "embeddings_embedding_ivfflat_binary_category_id_5_idx":
+            "CREATE INDEX embeddings_embedding_ivfflat_binary_category_id_5_idx ON public.embeddings "
+            "USING ivfflat (((binary_quantize(embedding))::bit(1536)) bit_hamming_ops) WITH (lists='40') "
+            "WHERE (category_id = 5)",
+    })
+
+    assert manager.partial_indexes() == [
+        {"method": "hnsw", "metric": "cosine", "quantization": "none", "suffix": "permissions_allowed_free",
+         "where": "((permissions_allowed)::text = 'free'::text)", "m": 24, "ef_construction": 100},
+        {"method": "ivfflat", "metric": vector_index.DEFAULT_METRIC, "quantization": "binary", "suffix": "category_id_5",
+         "where": "(category_id = 5)", "lists": 40},
+    ]